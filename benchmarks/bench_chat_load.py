@@ -0,0 +1,539 @@
+"""
+Teste de carga do caminho de conversa (seleção de persona + chat) contra o fake_vertex.py.
+
+Nenhuma chamada gasta cota: o modelo é o fake_vertex.py rodando no mesmo
+processo, com latência (valor ou distribuição), ritmo de tokens, tamanho de
+resposta e taxa de erros configuráveis. Cada usuário simulado escolhe um
+cluster, uma persona da página e conversa por alguns turnos.
+
+Modos:
+    backend  usuários (asyncio) falando direto com o persona_service.py, em processo:
+             vazão, latência p50/p95/p99 do turno e do primeiro pedaço, memória por sessão
+             no serviço.
+    app      usuários no personas_app.py sem navegador (streamlit.testing AppTest), em modo
+             serviço (PERSONAS_API_URL, com o persona_service.py no uvicorn): as mesmas
+             métricas mais o custo de cada rerun do script e o tamanho do st.session_state.
+
+O cenário roda --runs vezes e cada métrica fica com a mediana das rodadas. O
+resultado é comparado com o baseline salvo em benchmarks/baselines/<cenário>.json
+(gravado do mesmo jeito); o script sai com código 1 se alguma métrica piorou além
+da tolerância (METRICAS), que é maior que a variação entre rodadas na mesma máquina.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_chat_load.py --users 200 --turns 3 --runs 5 --save-baseline
+    python benchmarks/bench_chat_load.py --users 200 --turns 3
+    python benchmarks/bench_chat_load.py --mode app --users 10 --latency lognormal:0.4:0.5 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import fake_vertex
+from cluster_profiles import CLUSTER_PROFILES
+from persona_store import PERSONAS_FILE
+
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Métrica: (maior é melhor?, tolerância relativa, tolerância absoluta mínima).
+# Uma métrica regrediu se piorou mais que max(relativa * baseline, absoluta).
+# As latências dependem do agendamento de ~100 corrotinas e threads: numa máquina
+# de 1 CPU uma rodada isolada varia até ~45% (selection_p95_ms) e a mediana de 3
+# rodadas, ~10-15%. Daí as margens largas: o teste pega regressões grosseiras,
+# não ajuste fino.
+METRICAS = {
+    "throughput_turns_per_s": (True, 0.25, 0.0),
+    "chat_p50_ms": (False, 0.30, 20.0),
+    "chat_p95_ms": (False, 0.40, 40.0),
+    "chat_p99_ms": (False, 0.50, 60.0),
+    "first_chunk_p50_ms": (False, 0.30, 20.0),
+    "first_chunk_p95_ms": (False, 0.40, 40.0),
+    "selection_p95_ms": (False, 0.50, 25.0),
+    "failure_rate": (False, 0.0, 0.02),
+    "rerun_p50_ms": (False, 0.30, 10.0),
+    "rerun_p95_ms": (False, 0.40, 20.0),
+    "memory_per_session_kb": (False, 0.20, 1.0),
+    "service_memory_per_session_kb": (False, 0.20, 1.0),
+}
+
+PERGUNTAS = [
+    "How do you feel about changing teams every year?",
+    "On a scale of 1 to 6, how much do you agree with: 'I prefer a stable job over a higher salary'?",
+    "If the company gave you $2,000 to invest in a new internal startup, how much would you put in?",
+    "What does a good work-life balance look like for you?",
+    "How do you react when your manager announces a big reorganization?",
+    "Would you volunteer to lead a risky new project? Why?",
+]
+
+
+class Medicoes:
+    """Tempos (s) e contadores coletados pelos usuários simulados."""
+
+    def __init__(self):
+        self.selecao = []
+        self.chat = []
+        self.primeiro_pedaco = []
+        self.rerun = []
+        self.turnos = 0
+        self.falhas = 0
+
+
+def percentil(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def tamanho_profundo(obj, vistos=None):
+    """
+    Bytes de 'obj' e de tudo que ele referencia (dicts, sequências, atributos e
+    __slots__). Passe o mesmo 'vistos' para várias sessões e o que é
+    compartilhado entre elas só é contado uma vez.
+    """
+    vistos = set() if vistos is None else vistos
+    total, pilha = 0, [obj]
+    while pilha:
+        item = pilha.pop()
+        if id(item) in vistos or isinstance(item, (type, types.ModuleType, types.FunctionType,
+                                                   types.BuiltinFunctionType, types.MethodType)):
+            continue
+        vistos.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pilha.extend(item.keys())
+            pilha.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)) or type(item).__name__ == "deque":
+            pilha.extend(item)
+        if hasattr(item, "__dict__"):
+            pilha.append(vars(item))
+        for cls in type(item).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot not in ("__dict__", "__weakref__") and hasattr(item, slot):
+                    pilha.append(getattr(item, slot))
+    return total
+
+
+def _rng(seed, user):
+    return random.Random(f"{seed}:{user}")
+
+
+def montar_catalogo(path, size, seed):
+    """
+    Catálogo sintético com 'size' personas (cópias das de 'path' com nome, idade e
+    cluster próprios), gravado num arquivo temporário. Retorna o caminho.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    rng = random.Random(seed)
+    clusters = list(CLUSTER_PROFILES)
+    personas = []
+    for i in range(size):
+        persona = dict(base[i % len(base)])
+        persona["name"] = f"{persona.get('name', 'Persona')} #{i}"
+        persona["Cluster"] = clusters[i % len(clusters)]
+        persona["age"] = rng.randint(22, 64)
+        personas.append(persona)
+    handle, catalog = tempfile.mkstemp(prefix="bench_personas_", suffix=".json")
+    with os.fdopen(handle, "w", encoding="utf-8") as f:
+        json.dump(personas, f, ensure_ascii=False)
+    return catalog
+
+
+def iniciar_fake(args):
+    """fake_vertex.py numa thread, numa porta livre. Retorna (servidor, URL)."""
+    server = fake_vertex.criar_servidor(
+        port=0, latency=args.latency, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, reply_words=args.reply_words, seed=args.seed,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def criar_servico(args, stub_url, catalog):
+    import persona_service
+
+    return persona_service.criar_app(
+        stub_url=stub_url, db_path=":memory:", personas_file=catalog,
+        endpoint_concurrency=args.endpoint_concurrency, response_cache=args.response_cache,
+    )
+
+
+def memoria_servico(service):
+    """KB por sessão guardada no serviço (históricos de conversa)."""
+    sessions = list(service._sessions.values())
+    return tamanho_profundo(sessions) / len(sessions) / 1024 if sessions else None
+
+
+# --- MODO BACKEND (ASGI em processo) ---
+
+def _eventos(body):
+    """Eventos (tipo, dados) de uma resposta em Server-Sent Events."""
+    events = []
+    for block in body.decode("utf-8").split("\n\n"):
+        kind, data = None, None
+        for line in block.split("\n"):
+            if line.startswith("event:"):
+                kind = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+        if kind:
+            events.append((kind, data))
+    return events
+
+
+async def _requisicao(app, method, path, body=None, query=None):
+    """Chama o app ASGI direto; retorna (status, corpo, segundos até o primeiro pedaço do stream)."""
+    start = time.perf_counter()
+    pedidos = [{"type": "http.request", "body": json.dumps(body).encode("utf-8") if body is not None else b"",
+                "more_body": False}]
+    terminou = asyncio.Event()
+    status, parts, first = None, [], None
+
+    async def receive():
+        if pedidos:
+            return pedidos.pop(0)
+        await terminou.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message.get("body"):
+            if first is None and message["body"].startswith(b"event: chunk"):
+                first = time.perf_counter() - start
+            parts.append(message["body"])
+
+    scope = {"type": "http", "method": method, "path": path,
+             "query_string": urllib.parse.urlencode(query or {}).encode("latin-1")}
+    try:
+        await app(scope, receive, send)
+    finally:
+        terminou.set()
+    return status, b"".join(parts), first
+
+
+@contextlib.asynccontextmanager
+async def _ciclo_de_vida(app):
+    """Startup/shutdown do ASGI (lifespan), como o uvicorn faria."""
+    mensagens = asyncio.Queue()
+    iniciado = asyncio.Event()
+
+    async def send(message):
+        if message["type"] == "lifespan.startup.complete":
+            iniciado.set()
+
+    await mensagens.put({"type": "lifespan.startup"})
+    task = asyncio.ensure_future(app({"type": "lifespan"}, mensagens.get, send))
+    await iniciado.wait()
+    try:
+        yield
+    finally:
+        await mensagens.put({"type": "lifespan.shutdown"})
+        await task
+
+
+async def usuario_backend(service, user, args, medicoes):
+    rng = _rng(args.seed, user)
+    think_time = fake_vertex.distribuicao(args.think_time)
+    await asyncio.sleep(args.ramp_up * user / args.users)
+
+    # Tela de seleção: filtros, uma página do cluster escolhido e a persona
+    start = time.perf_counter()
+    _, body, _ = await _requisicao(service, "GET", "/personas/filters")
+    cluster = rng.choice(json.loads(body)["Cluster"])
+    _, body, _ = await _requisicao(service, "GET", "/personas", query={"cluster": cluster, "limit": 20})
+    persona_id = rng.choice(json.loads(body)["items"])["persona_id"]
+    await _requisicao(service, "GET", f"/personas/{persona_id}")
+    medicoes.selecao.append(time.perf_counter() - start)
+
+    messages = []
+    for _ in range(args.turns):
+        messages.append({"role": "user", "content": rng.choice(PERGUNTAS)})
+        start = time.perf_counter()
+        status, body, first = await _requisicao(service, "POST", "/chat", {
+            "persona_id": persona_id, "messages": messages, "session_id": f"bench-{user}",
+        })
+        elapsed = time.perf_counter() - start
+        events = _eventos(body) if status == 200 else []
+        medicoes.turnos += 1
+        if not any(kind == "done" for kind, _ in events):
+            medicoes.falhas += 1
+            messages.pop()
+        else:
+            medicoes.chat.append(elapsed)
+            if first is not None:
+                medicoes.primeiro_pedaco.append(first)
+            messages.append({"role": "assistant", "content": "".join(d["text"] for k, d in events if k == "chunk")})
+        await asyncio.sleep(think_time(rng))
+
+
+def rodar_backend(args, stub_url, catalog):
+    service = criar_servico(args, stub_url, catalog)
+    medicoes = Medicoes()
+
+    async def rodar():
+        async with _ciclo_de_vida(service):
+            start = time.perf_counter()
+            await asyncio.gather(*[usuario_backend(service, user, args, medicoes) for user in range(args.users)])
+            return time.perf_counter() - start
+
+    wall = asyncio.run(rodar())
+    return medicoes, wall, {"service_memory_per_session_kb": memoria_servico(service)}
+
+
+# --- MODO APP (Streamlit sem navegador) ---
+
+def _widget(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Widget '{label}' não encontrado na tela.")
+
+
+def iniciar_servico_http(service):
+    """persona_service.py no uvicorn, numa thread, numa porta livre. Retorna (servidor, URL)."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(service, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def usuario_app(user, args, medicoes):
+    """Percorre seleção e chat do personas_app.py; cada at.run() é um rerun do script."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = _rng(args.seed, user)
+    think_time = fake_vertex.distribuicao(args.think_time)
+    time.sleep(args.ramp_up * user / args.users)
+    at = AppTest.from_file(os.path.join(ROOT, "personas_app.py"), default_timeout=args.timeout)
+
+    def rerun():
+        start = time.perf_counter()
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return time.perf_counter() - start
+
+    # Tela de seleção: primeira renderização, filtro de cluster e escolha da persona
+    selection_start = time.perf_counter()
+    medicoes.rerun.append(rerun())
+    cluster_box = _widget(at.selectbox, "Cluster")
+    cluster_box.select(rng.choice(cluster_box.options[1:]))
+    medicoes.rerun.append(rerun())
+    persona_box = _widget(at.selectbox, "Choose a Persona:")
+    persona_box.select_index(rng.randrange(len(persona_box.options)))
+    _widget(at.button, "Talk to this Persona").click()
+    medicoes.rerun.append(rerun())
+    medicoes.selecao.append(time.perf_counter() - selection_start)
+
+    for _ in range(args.turns):
+        at.chat_input[0].set_value(rng.choice(PERGUNTAS))
+        elapsed = rerun()
+        medicoes.turnos += 1
+        if at.session_state["last_error"]:
+            medicoes.falhas += 1
+        else:
+            medicoes.chat.append(elapsed)
+        time.sleep(think_time(rng))
+    return at
+
+
+def rodar_app(args, stub_url, catalog):
+    service = criar_servico(args, stub_url, catalog)
+    server, url = iniciar_servico_http(service)
+    os.environ["PERSONAS_API_URL"] = url
+    medicoes = Medicoes()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            sessions = list(pool.map(lambda user: usuario_app(user, args, medicoes), range(args.users)))
+        wall = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+
+    # st.session_state de cada sessão (o que é compartilhado entre sessões conta uma vez)
+    vistos = set()
+    total = sum(tamanho_profundo(dict(at.session_state.filtered_state), vistos) for at in sessions)
+    return medicoes, wall, {
+        "memory_per_session_kb": total / len(sessions) / 1024,
+        "service_memory_per_session_kb": memoria_servico(service),
+    }
+
+
+# --- RELATÓRIO E BASELINE ---
+
+def resumir(medicoes, wall, extra):
+    def ms(values, q):
+        return None if not values else round(percentil(values, q) * 1000, 1)
+
+    metrics = {
+        "turns": medicoes.turnos,
+        "wall_s": round(wall, 3),
+        "throughput_turns_per_s": round(len(medicoes.chat) / wall, 2) if wall else None,
+        "chat_p50_ms": ms(medicoes.chat, 50),
+        "chat_p95_ms": ms(medicoes.chat, 95),
+        "chat_p99_ms": ms(medicoes.chat, 99),
+        "first_chunk_p50_ms": ms(medicoes.primeiro_pedaco, 50),
+        "first_chunk_p95_ms": ms(medicoes.primeiro_pedaco, 95),
+        "selection_p95_ms": ms(medicoes.selecao, 95),
+        "failure_rate": round(medicoes.falhas / medicoes.turnos, 4) if medicoes.turnos else None,
+        "rerun_p50_ms": ms(medicoes.rerun, 50),
+        "rerun_p95_ms": ms(medicoes.rerun, 95),
+    }
+    metrics.update({k: None if v is None else round(v, 2) for k, v in extra.items()})
+    return metrics
+
+
+def mediana(rodadas):
+    """Mediana de cada métrica entre as rodadas, mais a variação relativa (máx - mín) / mediana."""
+    metrics, spread = {}, {}
+    for name in rodadas[0]:
+        values = [r[name] for r in rodadas if r[name] is not None]
+        if not values:
+            metrics[name] = None
+            continue
+        value = float(np.median(values))
+        metrics[name] = int(value) if all(isinstance(v, int) for v in values) else round(value, 4 if name == "failure_rate" else 2)
+        if len(values) > 1 and metrics[name]:
+            spread[name] = round((max(values) - min(values)) / abs(metrics[name]), 3)
+    return metrics, spread
+
+
+def comparar(metrics, baseline):
+    """Métricas que pioraram além da tolerância: lista de (nome, baseline, atual, limite)."""
+    regressions = []
+    for name, (higher_is_better, relative, absolute) in METRICAS.items():
+        old, new = baseline.get(name), metrics.get(name)
+        if old is None or new is None:
+            continue
+        margin = max(abs(old) * relative, absolute)
+        limit = old - margin if higher_is_better else old + margin
+        if (new < limit) if higher_is_better else (new > limit):
+            regressions.append((name, old, new, limit))
+    return regressions
+
+
+def caminho_baseline(scenario):
+    return os.path.join(BASELINE_DIR, f"{scenario}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da conversa com as personas (sem gastar cota).")
+    parser.add_argument("--mode", choices=["backend", "app"], default="backend")
+    parser.add_argument("--users", type=int, default=100, help="Usuários simulados simultâneos.")
+    parser.add_argument("--turns", type=int, default=3, help="Perguntas por usuário.")
+    parser.add_argument("--think-time", default="0", help="Pausa entre perguntas (s): valor ou distribuição.")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Segundos até todos os usuários começarem.")
+    parser.add_argument("--latency", default="lognormal:0.3:0.4", help="Latência do fake (s): valor ou distribuição.")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Ritmo do streaming do fake.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de chamadas que falham com 429/503.")
+    parser.add_argument("--reply-words", default="uniform:20:80", help="Tamanho das respostas do fake (palavras).")
+    parser.add_argument("--personas", default=os.path.join(ROOT, PERSONAS_FILE), help="Personas base do catálogo.")
+    parser.add_argument("--catalog-size", type=int, default=2000, help="Personas no catálogo sintético.")
+    parser.add_argument("--endpoint-concurrency", type=int, default=64)
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Liga o cache de respostas do serviço (desligado, cada turno vai ao modelo).")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Tempo máximo de cada rerun no modo app (s).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=3, help="Rodadas do cenário (vale a mediana de cada métrica).")
+    parser.add_argument("--scenario", default=None, help="Nome do baseline (padrão: modo, usuários e turnos).")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava o resultado como novo baseline.")
+    parser.add_argument("--output", default=None, help="Grava o resultado (JSON) neste arquivo.")
+    args = parser.parse_args()
+
+    # Retries e fallbacks esperados (--error-rate) não poluem o relatório
+    logging.getLogger().setLevel(logging.ERROR)
+    scenario = args.scenario or f"{args.mode}-u{args.users}-t{args.turns}"
+    config = {k: v for k, v in vars(args).items()
+              if k not in ("scenario", "save_baseline", "output", "personas", "runs")}
+
+    catalog = montar_catalogo(args.personas, args.catalog_size, args.seed)
+    run = rodar_app if args.mode == "app" else rodar_backend
+    rodadas = []
+    try:
+        for _ in range(args.runs):
+            # Fake novo a cada rodada: a mesma sequência de latências e respostas (--seed)
+            fake, stub_url = iniciar_fake(args)
+            try:
+                rodadas.append(resumir(*run(args, stub_url, catalog)))
+            finally:
+                fake.shutdown()
+    finally:
+        os.remove(catalog)
+
+    metrics, spread = mediana(rodadas)
+    wall = metrics["wall_s"]
+    result = {
+        "scenario": scenario,
+        "config": config,
+        "runs": args.runs,
+        "metrics": metrics,
+        "spread": spread,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    baseline = None
+    if os.path.exists(caminho_baseline(scenario)):
+        with open(caminho_baseline(scenario), "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"Cenário: {scenario} ({args.mode}, {args.users} usuários x {args.turns} turnos, "
+          f"mediana de {args.runs} rodadas de ~{wall:.2f} s)")
+    print()
+    print(f"{'métrica':<32}{'atual':>12}{'variação':>10}{'baseline':>12}")
+    for name, value in metrics.items():
+        old = baseline["metrics"].get(name) if baseline else None
+        variation = f"{spread[name]:.0%}" if name in spread else "-"
+        print(f"{name:<32}{'-' if value is None else value:>12}{variation:>10}{'-' if old is None else old:>12}")
+
+    exit_code = 0
+    if baseline is not None:
+        if baseline.get("config") != config:
+            print("\nAtenção: configuração diferente da do baseline; a comparação pode não valer.")
+        regressions = comparar(metrics, baseline["metrics"])
+        print()
+        for name, old, new, limit in regressions:
+            print(f"REGRESSÃO {name}: {old} -> {new} (limite {limit:.2f})")
+        print(f"{len(regressions)} regressões em relação ao baseline de {baseline.get('date')}.")
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(caminho_baseline(scenario), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f"Baseline gravado em {caminho_baseline(scenario)}")
+        exit_code = 0
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: construção do dataset de fine-tuning, row-wise (apply/iterrows) x vetorizado.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_fine_tuning_dataset.py --repeat 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fine_tuning_dataset as ftd
+from cluster_profiles import Security_Seeker
+from compact_dataset import normalizar_espacos
+
+
+def medir(func, repeat):
+    """Executa 'func' 'repeat' vezes e retorna o melhor tempo (s)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o builder row-wise com o vetorizado.")
+    parser.add_argument("--dataset", default=ftd.DATASET_FILE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dataset = ftd.carregar_dataset(args.dataset)
+    print(f"Dataset: {args.dataset} ({len(dataset)} linhas)")
+
+    dataset["expanded_answer"] = ftd.expandir_respostas(dataset)
+
+    # As frases são sorteadas: compara a faixa escolhida em cada linha com a função original do notebook
+    reference = ftd.expandir_respostas_apply(dataset)
+    same_buckets = all(
+        ftd.faixa_da_resposta(label, new) == ftd.faixa_da_resposta(label, old)
+        for label, new, old in zip(dataset["Q_label"], dataset["expanded_answer"], reference)
+    )
+
+    # O JSONL sai do formato compacto com os espaços do perfil normalizados: a versão
+    # iterrows recebe o mesmo texto para que os arquivos possam ser comparados byte a byte
+    profile = normalizar_espacos(Security_Seeker)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path_old = os.path.join(tmp_dir, "iterrows.jsonl")
+        path_new = os.path.join(tmp_dir, "vectorized.jsonl")
+
+        results = [
+            ("expanded_answer (apply)", medir(lambda: ftd.expandir_respostas_apply(dataset), args.repeat)),
+            ("expanded_answer (vetorizado)", medir(lambda: ftd.expandir_respostas(dataset), args.repeat)),
+            ("jsonl (iterrows)", medir(lambda: ftd.write_jsonl_file_iterrows(profile, dataset, path_old), args.repeat)),
+            ("jsonl (vetorizado)", medir(lambda: ftd.write_jsonl_file(profile, dataset, path_new), args.repeat)),
+        ]
+
+        with open(path_old, "rb") as f_old, open(path_new, "rb") as f_new:
+            identical = f_old.read() == f_new.read()
+
+    print()
+    print(f"{'etapa':<32}{'melhor (s)':>12}")
+    for name, seconds in results:
+        print(f"{name:<32}{seconds:>12.4f}")
+    print()
+    print(f"Speedup expanded_answer: {results[0][1] / results[1][1]:.1f}x")
+    print(f"Speedup jsonl:           {results[2][1] / results[3][1]:.1f}x")
+    print(f"Faixas iguais às do notebook: {same_buckets}")
+    print(f"Arquivos JSONL idênticos: {identical}")
+
+
+if __name__ == "__main__":
+    main()
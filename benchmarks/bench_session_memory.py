@@ -0,0 +1,115 @@
+"""
+Memória por sessão em conversas longas (estado do chat no st.session_state).
+
+Simula uma conversa de N turnos como o personas_app.py faz: as mensagens num
+HistoricoSessao (buffer circular, as antigas vão para a transcrição em SQLite),
+o HistoryManager montando o 'contents' de cada turno e um sumarizador falso
+(sem Vertex AI). Em cada ponto de medição mostra o tamanho (tamanho_profundo)
+do estado da sessão, comparado com o formato antigo (lista de dicts + tokens de
+cada turno), e o tempo médio do build_contents.
+
+Falha (código 1) se a memória da sessão crescer mais que --tolerance depois que
+o buffer enche: ela deve ficar plana, por mais longa que seja a conversa.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_session_memory.py
+    python benchmarks/bench_session_memory.py --turns 5000 --capacity 32 --reply-words 200
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_chat_load import tamanho_profundo
+from chat_history import DEFAULT_MAX_MESSAGES, HistoricoSessao, HistoryManager, TranscriptStore
+
+CHECKPOINTS = (10, 50, 100, 500, 1000, 2000, 5000)
+# Tamanho máximo do resumo falso (o real é limitado pelo max_output_tokens do sumarizador)
+SUMMARY_MAX_CHARS = 1200
+WORDS = ("family", "stability", "career", "startup", "team", "budget", "weekend", "market",
+         "manager", "project", "learning", "travel", "health", "savings", "deadline", "office")
+
+
+def texto(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def sumarizador_falso(summary, messages):
+    novo = " ".join(msg["content"][:40] for msg in messages)
+    return (summary + " " + novo).strip()[-SUMMARY_MAX_CHARS:]
+
+
+def simular(turns, capacity, question_words, reply_words, transcript, seed=0):
+    """Gera (turno, bytes da sessão, bytes no formato antigo, ms médio do build_contents) nos pontos de medição."""
+    rng = random.Random(seed)
+    messages = HistoricoSessao(capacity=capacity, transcript=transcript, session_id="bench")
+    history = HistoryManager()
+    legacy_messages, legacy_turn_tokens = [], []
+    checkpoints = sorted({c for c in CHECKPOINTS if c < turns} | {turns})
+    build_seconds, built = 0.0, 0
+
+    for turn in range(1, turns + 1):
+        question = {"role": "user", "content": texto(rng, question_words)}
+        messages.append(question)
+        legacy_messages.append(question)
+
+        start = time.perf_counter()
+        history.build_contents(messages, summarizer=sumarizador_falso)
+        build_seconds += time.perf_counter() - start
+        built += 1
+        legacy_turn_tokens.append(history.last_prompt_tokens)
+
+        answer = {"role": "assistant", "content": texto(rng, reply_words)}
+        messages.append(answer)
+        legacy_messages.append(answer)
+
+        if turn in checkpoints:
+            # A transcrição é do processo (compartilhada), não da sessão
+            session_bytes = tamanho_profundo((messages, history), vistos={id(transcript)})
+            legacy_bytes = tamanho_profundo((legacy_messages, legacy_turn_tokens, history), vistos={id(transcript)})
+            yield turn, session_bytes, legacy_bytes, build_seconds / built * 1000
+            build_seconds, built = 0.0, 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a memória por sessão em conversas longas.")
+    parser.add_argument("--turns", type=int, default=2000, help="Turnos da conversa simulada.")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_MAX_MESSAGES, help="Mensagens no buffer da sessão.")
+    parser.add_argument("--question-words", type=int, default=20, help="Palavras por pergunta.")
+    parser.add_argument("--reply-words", type=int, default=120, help="Palavras por resposta.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Crescimento máximo (relativo) da memória depois que o buffer enche.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        transcript = TranscriptStore(db_path=os.path.join(tmp, "transcripts.sqlite"))
+        full_at = args.capacity // 2  # turno em que o buffer enche (pergunta + resposta por turno)
+        plateau = None
+        ok = True
+
+        print(f"{'turno':>7}{'sessão (KiB)':>15}{'formato antigo (KiB)':>23}{'build_contents (ms)':>22}")
+        for turn, session_bytes, legacy_bytes, build_ms in simular(
+                args.turns, args.capacity, args.question_words, args.reply_words, transcript):
+            print(f"{turn:>7}{session_bytes / 1024:>15.1f}{legacy_bytes / 1024:>23.1f}{build_ms:>22.3f}")
+            if turn < full_at:
+                continue
+            if plateau is None:
+                plateau = session_bytes
+            elif session_bytes > plateau * (1 + args.tolerance):
+                ok = False
+
+        spilled = len(transcript.ler("bench"))
+        print(f"Mensagens na transcrição (SQLite): {spilled}; em memória: até {args.capacity}")
+        if not ok:
+            print(f"FALHOU: a memória da sessão cresceu mais de {args.tolerance:.0%} depois do buffer cheio")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
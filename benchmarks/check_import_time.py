@@ -0,0 +1,107 @@
+"""
+Orçamento de import dos apps do Streamlit (cold start), medido com python -X importtime.
+
+Num processo novo, importa o streamlit e depois exatamente os imports do topo do
+script do app (o que roda antes da tela de seleção aparecer). Falha (código 1) se:
+    - algum módulo de FORBIDDEN_MODULES (SDK do Vertex AI, google.auth) for
+      importado nesse caminho: ele deve carregar em segundo plano (aquecer_vertexai);
+    - o tempo somado desses imports passar do orçamento (--budget-ms).
+
+O streamlit entra antes e fica fora da conta: é custo fixo do runtime, já pago
+quando o script do app roda.
+
+Uso (na raiz do projeto):
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --app personas_app.py --budget-ms 300 --sdk
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = ["app.py", "personas_app.py"]
+# Não podem ser importados antes da primeira tela
+FORBIDDEN_MODULES = ("vertexai", "google.cloud.aiplatform", "google.auth", "google.oauth2")
+IMPORT_BUDGET_MS = 400
+# Módulos mais lentos mostrados no relatório
+TOP_N = 10
+
+
+def imports_do_topo(app_file):
+    """Instruções de import no nível do módulo do script (as de dentro de funções ficam de fora)."""
+    with open(app_file, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=app_file)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def medir_imports(statements, preload=("streamlit",)):
+    """
+    Roda os imports com -X importtime num processo novo. Retorna a lista de
+    (módulo, profundidade, cumulativo em ms) do que foi importado depois de 'preload'.
+    """
+    code = "\n".join([f"import {name}" for name in preload] + ["import sys", "print('--', file=sys.stderr)"] + statements)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "falha no import")
+
+    entries, started = [], False
+    for line in result.stderr.splitlines():
+        if line == "--":
+            started = True
+            continue
+        if not started or not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # cabeçalho
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(cumulative) / 1000))
+    return entries
+
+
+def proibidos(entries):
+    return sorted({name for name, _, _ in entries
+                   if any(name == module or name.startswith(module + ".") for module in FORBIDDEN_MODULES)})
+
+
+def verificar(app, budget_ms):
+    """Mede um app e imprime o relatório. Retorna True se passou."""
+    entries = medir_imports(imports_do_topo(os.path.join(ROOT, app)))
+    top_level = [(name, ms) for name, depth, ms in entries if depth == 0]
+    total_ms = sum(ms for _, ms in top_level)
+    forbidden = proibidos(entries)
+
+    print(f"{app}: {total_ms:.1f} ms de imports antes da primeira tela (orçamento {budget_ms} ms)")
+    for name, ms in sorted(top_level, key=lambda item: -item[1])[:TOP_N]:
+        print(f"    {name:<40}{ms:>10.1f} ms")
+    for name in forbidden:
+        print(f"    PROIBIDO: '{name}' é importado antes da tela de seleção")
+    ok = total_ms <= budget_ms and not forbidden
+    print(f"    {'OK' if ok else 'FALHOU'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica o orçamento de import (cold start) dos apps.")
+    parser.add_argument("--app", nargs="+", default=APPS, help="Scripts do Streamlit a verificar.")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="Tempo máximo dos imports (ms).")
+    parser.add_argument("--sdk", action="store_true",
+                        help="Mostra também quanto o SDK do Vertex AI leva para importar (o que sai do caminho).")
+    args = parser.parse_args()
+
+    results = [verificar(app, args.budget_ms) for app in args.app]
+    if args.sdk:
+        sdk_ms = sum(ms for _, depth, ms in medir_imports(["import vertexai.generative_models"]) if depth == 0)
+        print(f"SDK do Vertex AI (carregado em segundo plano): {sdk_ms:.1f} ms")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from telemetry import generate_content_instrumentado
+
+
+# Orçamento padrão de tokens do histórico enviado ao endpoint
+DEFAULT_TOKEN_BUDGET = 6000
+# Quantidade de turnos (pergunta + resposta) mantidos sem resumo
+DEFAULT_KEEP_LAST_TURNS = 6
+# Quantos turnos antigos acumular antes de refazer o resumo
+DEFAULT_SUMMARY_STEP = 3
+# Mensagens mantidas em memória por sessão (buffer circular); folga acima da janela recente
+# (2 * DEFAULT_KEEP_LAST_TURNS + 1) e do que espera pelo próximo resumo (2 * DEFAULT_SUMMARY_STEP)
+DEFAULT_MAX_MESSAGES = 64
+DEFAULT_TRANSCRIPT_PATH = "cache/transcripts.sqlite"
+
+SUMMARY_PROMPT = """
+Summarize the earlier part of our conversation below so you can keep talking in character.
+Write at most 150 words, in the first person, keeping names, numbers, opinions and anything you promised.
+
+{previous_summary}--- CONVERSATION ---
+{transcript}
+
+Respond with ONLY the summary.
+"""
+
+
+def estimar_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (~4 caracteres por token), sem chamar a API."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class Mensagem:
+    """
+    Uma mensagem da conversa. O conteúdo no formato do Vertex AI e a estimativa de
+    tokens são montados uma vez, na criação, e reaproveitados em todos os turnos
+    seguintes. Aceita msg["role"] / msg["content"], como os dicts {'role', 'content'}.
+    """
+    __slots__ = ("role", "content", "tokens", "vertex")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.tokens = estimar_tokens(content)
+        self.vertex = {"role": "user" if role == "user" else "model", "parts": [{"text": content}]}
+
+    def __getitem__(self, key):
+        if key not in ("role", "content"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def para_dict(self):
+        return {"role": self.role, "content": self.content}
+
+
+def para_conteudo_vertex(messages):
+    """Converte as mensagens da sessão ({'role', 'content'} ou Mensagem) para o formato do Vertex AI."""
+    return [
+        msg.vertex if isinstance(msg, Mensagem)
+        else {"role": "user" if msg["role"] == "user" else "model", "parts": [{"text": msg["content"]}]}
+        for msg in messages
+    ]
+
+
+class TranscriptStore:
+    """
+    Transcrição completa das conversas em SQLite. Recebe as mensagens que saem do
+    buffer das sessões (HistoricoSessao): a memória fica limitada sem perder o
+    registro. Pode ser usado por várias threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_TRANSCRIPT_PATH):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " session_id TEXT NOT NULL, position INTEGER NOT NULL, role TEXT NOT NULL,"
+            " content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, position))"
+        )
+        self._db.commit()
+
+    def gravar(self, session_id, position, message):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcripts (session_id, position, role, content, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (session_id, position, message["role"], message["content"], time.time())
+            )
+            self._db.commit()
+
+    def ler(self, session_id, start=0, end=None):
+        """Mensagens ({'role', 'content'}) gravadas da sessão, nas posições [start, end)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content FROM transcripts WHERE session_id = ? AND position >= ? AND position < ?"
+                " ORDER BY position",
+                (session_id, start, end if end is not None else 2 ** 62)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+
+class HistoricoSessao:
+    """
+    Mensagens de uma sessão num buffer circular de tamanho fixo ('capacity').
+
+    Os índices são absolutos, contados desde o início da conversa (len() é o total
+    de mensagens), como o summarized_count do HistoryManager. Com o buffer cheio,
+    cada mensagem nova tira a mais antiga da memória, que vai para o 'transcript'
+    (se houver). Iteração e fatias só alcançam o que está no buffer, a partir de
+    'primeiro'.
+    """
+    __slots__ = ("capacity", "session_id", "transcript", "_buffer", "_total", "_count")
+
+    def __init__(self, capacity=DEFAULT_MAX_MESSAGES, transcript=None, session_id=None):
+        self.capacity = capacity
+        self.session_id = session_id
+        self.transcript = transcript
+        self._buffer = [None] * capacity
+        self._total = 0  # mensagens já adicionadas na conversa
+        self._count = 0  # quantas delas ainda estão no buffer
+
+    @property
+    def primeiro(self):
+        """Posição da mensagem mais antiga ainda em memória."""
+        return self._total - self._count
+
+    def __len__(self):
+        return self._total
+
+    def __iter__(self):
+        for position in range(self.primeiro, self._total):
+            yield self._buffer[position % self.capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self._total)
+            return [self._buffer[i % self.capacity] for i in range(max(start, self.primeiro), stop)]
+        if index < 0:
+            index += self._total
+        if not self.primeiro <= index < self._total:
+            raise IndexError(f"Mensagem {index} fora do buffer (em memória: {self.primeiro} a {self._total - 1}).")
+        return self._buffer[index % self.capacity]
+
+    def append(self, message):
+        if not isinstance(message, Mensagem):
+            message = Mensagem(message["role"], message["content"])
+        slot = self._total % self.capacity
+        if self._count == self.capacity:
+            if self.transcript is not None:
+                self.transcript.gravar(self.session_id, self.primeiro, self._buffer[slot])
+        else:
+            self._count += 1
+        self._buffer[slot] = message
+        self._total += 1
+        return message
+
+    def pop(self):
+        if not self._count:
+            raise IndexError("pop de um histórico vazio")
+        self._total -= 1
+        self._count -= 1
+        slot = self._total % self.capacity
+        message, self._buffer[slot] = self._buffer[slot], None
+        return message
+
+    def dicts(self):
+        """Mensagens em memória como {'role', 'content'} (para JSON)."""
+        return [message.para_dict() for message in self]
+
+
+class JanelaMensagens:
+    """
+    Trecho final de uma conversa com os índices absolutos do HistoricoSessao:
+    'primeiro' é a posição da primeira mensagem recebida. É o que o serviço recebe
+    do app (só o que está no buffer), para o HistoryManager seguir resumindo.
+    """
+    __slots__ = ("primeiro", "_messages")
+
+    def __init__(self, messages, primeiro=0):
+        self.primeiro = primeiro
+        self._messages = list(messages)
+
+    def __len__(self):
+        return self.primeiro + len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            return self._messages[max(start, self.primeiro) - self.primeiro:max(stop, self.primeiro) - self.primeiro]
+        if index < 0:
+            index += len(self)
+        if not self.primeiro <= index < len(self):
+            raise IndexError(f"Mensagem {index} fora da janela (recebidas: {self.primeiro} a {len(self) - 1}).")
+        return self._messages[index - self.primeiro]
+
+
+def criar_sumarizador(model, generation_config=None, endpoint=None, persona=None):
+    """
+    Cria a função de resumo que usa o próprio endpoint da persona.
+    Recebe (resumo anterior, mensagens antigas) e devolve o novo resumo.
+    """
+    def sumarizar(previous_summary, messages):
+        transcript = "\n".join(
+            f"{'Interviewer' if msg['role'] == 'user' else 'Me'}: {msg['content']}"
+            for msg in messages
+        )
+        previous = f"--- PREVIOUS SUMMARY ---\n{previous_summary}\n\n" if previous_summary else ""
+        response = generate_content_instrumentado(
+            model,
+            SUMMARY_PROMPT.format(previous_summary=previous, transcript=transcript),
+            endpoint=endpoint or "-",
+            persona=f"{persona or '-'} (summary)",
+            generation_config=generation_config
+        )
+        return response.text.strip()
+
+    return sumarizar
+
+
+class HistoryManager:
+    """
+    Monta o histórico enviado ao Vertex AI respeitando um orçamento de tokens.
+
+    Os últimos 'keep_last_turns' turnos vão sempre na íntegra. Quando o histórico
+    passa do orçamento, os turnos mais antigos são resumidos pelo endpoint da
+    persona e o resumo fica guardado, sendo refeito apenas a cada 'summary_step'
+    turnos novos (e não a cada pergunta).
+
+    Com um HistoricoSessao, as mensagens já vêm no formato do Vertex AI (Mensagem.vertex)
+    e o 'contents' de cada turno só junta referências a elas, sem remontar os dicts.
+    """
+    __slots__ = ("token_budget", "keep_last_turns", "summary_step", "summary", "summarized_count",
+                 "turns", "last_prompt_tokens", "_summary_contents")
+
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, keep_last_turns=DEFAULT_KEEP_LAST_TURNS,
+                 summary_step=DEFAULT_SUMMARY_STEP):
+        self.token_budget = token_budget
+        self.keep_last_turns = keep_last_turns
+        self.summary_step = summary_step
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self.summarized_count = 0  # quantas mensagens já estão dentro do resumo
+        self.turns = 0
+        self.last_prompt_tokens = 0  # tokens estimados do histórico enviado no último turno
+        self._summary_contents = []
+
+    def _tokens(self, messages):
+        return sum(msg.tokens if isinstance(msg, Mensagem) else estimar_tokens(msg["content"]) for msg in messages)
+
+    def _definir_resumo(self, summary):
+        self.summary = summary
+        self._summary_contents = [
+            {"role": "user", "parts": [{"text": f"Summary of our earlier conversation:\n{summary}"}]},
+            {"role": "model", "parts": [{"text": "Got it, I remember."}]},
+        ] if summary else []
+
+    def build_contents(self, messages, summarizer=None):
+        """
+        Recebe todas as mensagens da sessão (a última é a pergunta atual)
+        e retorna o 'contents' a ser enviado ao endpoint.
+        """
+        # Tudo o que está fora da janela recente pode ir para o resumo
+        window = 2 * self.keep_last_turns + 1
+        target = max(0, len(messages) - window)
+        # O que já saiu do buffer da sessão (HistoricoSessao) sem entrar no resumo é
+        # relido do transcript para o próximo resumo; sem transcript, fica de fora
+        primeiro = getattr(messages, "primeiro", 0)
+        lacuna = []
+        if self.summarized_count < primeiro:
+            transcript = getattr(messages, "transcript", None)
+            if summarizer is not None and transcript is not None:
+                lacuna = transcript.ler(messages.session_id, self.summarized_count, primeiro)
+            if len(lacuna) < primeiro - self.summarized_count:
+                logging.warning(
+                    f"Mensagens {self.summarized_count} a {primeiro - 1} saíram do buffer sem entrar no resumo "
+                    f"e ficam fora do histórico."
+                )
+                self.summarized_count = primeiro
+                lacuna = []
+        pending = target - self.summarized_count
+
+        # Primeira mensagem enviada na íntegra neste turno
+        start = max(self.summarized_count, primeiro)
+        recent_tokens = self._tokens(messages[start:])
+        over_budget = estimar_tokens(self.summary) + recent_tokens > self.token_budget
+
+        if summarizer is not None and pending > 0 and (over_budget or pending >= 2 * self.summary_step):
+            try:
+                self._definir_resumo(summarizer(self.summary, lacuna + messages[start:target]))
+                self.summarized_count = start = max(target, primeiro)
+                logging.info(f"Histórico resumido até a mensagem {self.summarized_count} ({estimar_tokens(self.summary)} tokens).")
+            except Exception as e:
+                logging.warning(f"Não foi possível resumir o histórico, mantendo o resumo anterior: {e}")
+                if over_budget:
+                    # Sem resumo novo, só este pedido deixa os turnos antigos de fora para não estourar
+                    # o orçamento; eles continuam pendentes e entram no próximo resumo
+                    start = max(start, target)
+                    logging.warning(
+                        f"Mensagens {self.summarized_count} a {target - 1} fora deste pedido (ainda não resumidas)."
+                    )
+
+        recent = messages[start:]
+        contents = self._summary_contents + para_conteudo_vertex(recent)
+
+        self.turns += 1
+        self.last_prompt_tokens = estimar_tokens(self.summary) + self._tokens(recent)
+        logging.info(
+            f"Turno {self.turns}: ~{self.last_prompt_tokens} tokens de histórico "
+            f"({len(messages) - start} mensagens na íntegra)."
+        )
+        return contents
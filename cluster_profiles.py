@@ -0,0 +1,51 @@
+# Perfis dos clusters (Kmeans_pca) usados no fine-tuning e na geração de personas.
+# Mesmo texto de data_quality.ipynb / genarative_persona.ipynb.
+
+# Cluster 0
+Pragmatic_Guardian = """Is composed of individuals who combine a concern for personal security and benevolence with a strong preference for stability and job security. 
+                            They exhibit cooperative behavior (contributing substantially to the common good and being relatively generous when sharing money), but they also demand a reasonable return when others make proposals. 
+                            There is a paradox: despite risk aversion in abstract beliefs, in concrete choices, they accept moderate risk—suggesting pragmatic and conditional behavior: they take risks when the reward is attractive."""
+
+# Cluster 1
+Ambitious_Innovator = """Is the most creative, curious people who enjoy challenges, but also possess a strong sense of sacrifice for the future (a willingness to invest in long-term goals) with strong preferences for a competitive salary and opportunities for rapid career growth. 
+                          Socially, they show moderate altruism and prefer environments that support work-life balance and clear feedback. 
+                          Financially, they contribute high percentages to collective projects (high cooperativism) and accept risk when a potential return exists."""
+
+# CLuster 2
+Disciplined_Traditionalist = """Is conservative and disciplined: they value security, rules, meritocracy, and the stability of institutions. 
+                          Paradoxically, in practical monetary contexts, they show a great willingness to cooperate and share resources (high contributions and donations in the scenarios), which indicates a high trust in the norms of reciprocity (they believe that cooperation pays off). 
+                          They prioritize competitive salary and job stability and security, maintaining a conservative bias regarding novelty and risks."""
+
+# CLuster 3
+Security_Seeker = """Is the most risk-averse and least open to novelty and challenge. 
+                          They prefer stable and predictable environments, and they choose the safe option when confronted with probabilities. 
+                          The strong value placed on job stability and security, along with a strong emphasis on work-life balance, reinforces their preference for safe options and an aversion to experimental environments. 
+                          Financially, they demonstrate defensive and self-interested behavior in resource-sharing games."""
+
+# Nome do cluster -> texto do perfil (mesmos nomes do campo "Cluster" das personas)
+CLUSTER_PROFILES = {
+    "Pragmatic_Guardian": Pragmatic_Guardian,
+    "Ambitious_Innovator": Ambitious_Innovator,
+    "Disciplined_Traditionalist": Disciplined_Traditionalist,
+    "Security_Seeker": Security_Seeker,
+}
+
+# Nome do cluster -> número do cluster na coluna 'Kmeans_pca' do df_fine_tuning.xlsx
+CLUSTER_NUMBERS = {
+    "Pragmatic_Guardian": 0,
+    "Ambitious_Innovator": 1,
+    "Disciplined_Traditionalist": 2,
+    "Security_Seeker": 3,
+}
+
+ALLOWED_DEPARTMENTS = [
+    "Technology", "Sales", "Customer Insights", "Marketing",
+    "Business Intelligence & Strategy", "Logistics", "Finance",
+    "Human Resources (HR)", "Legal & Compliance", "Trade Marketing",
+    "Investors Relation", "Factory"
+]
+
+
+def nome_arquivo_cluster(cluster_name: str) -> str:
+    """Nome usado nos arquivos JSONL (ex.: 'Security_Seeker' -> 'security_seeker')."""
+    return cluster_name.lower()
@@ -0,0 +1,249 @@
+"""
+Formato compacto do dataset de fine-tuning.
+
+Em vez de repetir o perfil do cluster em toda linha do JSONL, o dataset fica em
+uma pasta com dois arquivos:
+    profiles.json     -> cada perfil de cluster uma única vez (profile_id, cluster_name, profile)
+    records.parquet   -> uma linha por pergunta/resposta, apontando para o profile_id
+
+É esse o formato guardado no repositório (dados/compact_train, dados/compact_validation:
+a divisão com que os endpoints foram treinados). O JSONL no formato do Gemini só é
+gerado na exportação (exportar_gemini_jsonl), com os espaços do perfil normalizados,
+e não é versionado.
+
+JSONL importados não trazem a pessoa nem a resposta original; o Q_label vem do
+json/survey_questions.json e 'complete' recupera 'person' e 'answer' da planilha.
+
+Exemplos:
+    python compact_dataset.py import json/validation_cluster_*_gemini.jsonl --out dados/compact_validation
+    python compact_dataset.py complete dados/compact_validation --dataset dados/df_fine_tuning.xlsx
+    python compact_dataset.py export dados/compact_validation --cluster Security_Seeker --out json/x.jsonl
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from cluster_profiles import CLUSTER_PROFILES, CLUSTER_NUMBERS
+from jsonl_io import JsonlWriter, ler_jsonl
+from survey import QUESTIONS_FILE, carregar_perguntas, perguntas_por_texto
+
+
+PROFILES_FILE = "profiles.json"
+RECORDS_FILE = "records.parquet"
+QUESTION_SEPARATOR = "\n\nQuestion: "
+
+RECORD_COLUMNS = ["profile_id", "person", "Q_label", "Question", "answer", "expanded_answer"]
+
+
+def normalizar_espacos(text: str) -> str:
+    """Remove a indentação e as quebras de linha herdadas das strings do notebook."""
+    return " ".join(text.split())
+
+
+def _tipar_registros(records):
+    """Aplica os tipos compactos (categorias para colunas repetitivas)."""
+    records = records.reindex(columns=RECORD_COLUMNS)
+    return records.astype({
+        "profile_id": "int8",
+        "person": "string",
+        "Q_label": "category",
+        "Question": "category",
+        "answer": "string",
+        "expanded_answer": "string",
+    })
+
+
+def montar_compacto(dataset, cluster_profiles=CLUSTER_PROFILES, cluster_numbers=CLUSTER_NUMBERS):
+    """
+    Converte o DataFrame do pipeline (com 'Kmeans_pca' e 'expanded_answer')
+    para o formato compacto. Retorna (profiles, records).
+    """
+    profiles = pd.DataFrame([
+        {"profile_id": cluster_numbers[name], "cluster_name": name, "profile": normalizar_espacos(text)}
+        for name, text in cluster_profiles.items()
+    ]).sort_values("profile_id", ignore_index=True)
+
+    records = pd.DataFrame({
+        "profile_id": dataset["Kmeans_pca"],
+        "person": dataset["person"],
+        "Q_label": dataset["Q_label"],
+        "Question": dataset["Question"],
+        "answer": dataset["answer"].astype(str),
+        "expanded_answer": dataset["expanded_answer"],
+    })
+    return profiles, _tipar_registros(records)
+
+
+def compactar_perfil(profile_text, dataset, profile_id=0, cluster_name=None):
+    """Formato compacto de um único perfil, para um dataset sem a coluna 'Kmeans_pca'."""
+    profiles = pd.DataFrame([
+        {"profile_id": profile_id, "cluster_name": cluster_name, "profile": normalizar_espacos(profile_text)}
+    ])
+    records = pd.DataFrame({column: dataset[column] for column in RECORD_COLUMNS[1:] if column in dataset})
+    records.insert(0, "profile_id", profile_id)
+    if "answer" in records:
+        records["answer"] = records["answer"].astype(str)
+    return profiles, _tipar_registros(records)
+
+
+def importar_jsonl(paths, questions_file=QUESTIONS_FILE):
+    """
+    Lê arquivos JSONL no formato do Gemini (gerados pelo write_jsonl_file) e separa
+    perfil e pergunta. Perfis iguais (após normalizar espaços) viram um único profile_id.
+    O Q_label vem do texto da pergunta; 'person' e 'answer' ficam vazios (ver completar_pessoas).
+    """
+    labels = {text: q["Q_label"] for text, q in perguntas_por_texto(carregar_perguntas(questions_file)).items()}
+    profile_ids = {}
+    profile_names = {}
+    names_by_text = {normalizar_espacos(text): name for name, text in CLUSTER_PROFILES.items()}
+    rows = []
+
+    for path in paths:
+        for record in ler_jsonl(path):
+            user, model = record["contents"]
+            profile, _, question = user["parts"][0]["text"].partition(QUESTION_SEPARATOR)
+            profile = normalizar_espacos(profile)
+
+            if profile not in profile_ids:
+                name = names_by_text.get(profile, f"profile_{len(profile_ids)}")
+                profile_ids[profile] = CLUSTER_NUMBERS.get(name, len(CLUSTER_NUMBERS) + len(profile_ids))
+                profile_names[profile] = name
+
+            rows.append({
+                "profile_id": profile_ids[profile],
+                "Q_label": labels.get(question),
+                "Question": question,
+                "expanded_answer": model["parts"][0]["text"],
+            })
+
+    profiles = pd.DataFrame(
+        [{"profile_id": pid, "cluster_name": profile_names[text], "profile": text} for text, pid in profile_ids.items()],
+        columns=["profile_id", "cluster_name", "profile"]
+    ).sort_values("profile_id", ignore_index=True)
+    return profiles, _tipar_registros(pd.DataFrame(rows))
+
+
+def completar_pessoas(records, dataset):
+    """
+    Preenche 'person', 'answer' e 'Q_label' de registros importados de JSONL a partir
+    do dataset ('Kmeans_pca', 'person', 'Q_label', 'Question', 'answer').
+
+    O write_jsonl_file grava as linhas na ordem do dataset, onde as respostas de cada
+    pessoa são contíguas: os registros de um perfil são os blocos de algumas pessoas,
+    na mesma ordem. Cada pessoa cujas perguntas (na ordem) coincidem com o próximo
+    bloco é atribuída a ele. ValueError se sobrar registro sem pessoa.
+    """
+    records = records.copy()
+    person = records["person"].astype(object).to_numpy(copy=True)
+    answer = records["answer"].astype(object).to_numpy(copy=True)
+    q_label = records["Q_label"].astype(object).to_numpy(copy=True)
+    questions = records["Question"].astype(str).to_numpy()
+
+    for profile_id, positions in records.groupby("profile_id", sort=False).indices.items():
+        next_pos = 0
+        for name, rows in dataset[dataset["Kmeans_pca"] == profile_id].groupby("person", sort=False):
+            block = positions[next_pos:next_pos + len(rows)]
+            if len(block) == len(rows) and (questions[block] == rows["Question"].astype(str).to_numpy()).all():
+                person[block] = name
+                answer[block] = rows["answer"].astype(str).to_numpy()
+                q_label[block] = rows["Q_label"].to_numpy()
+                next_pos += len(rows)
+        if next_pos != len(positions):
+            raise ValueError(f"Perfil {profile_id}: {len(positions) - next_pos} registros sem pessoa no dataset.")
+
+    records["person"], records["answer"], records["Q_label"] = person, answer, q_label
+    return _tipar_registros(records)
+
+
+def salvar_compacto(profiles, records, folder):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, PROFILES_FILE), "w", encoding="utf-8") as f:
+        json.dump(profiles.to_dict(orient="records"), f, indent=4, ensure_ascii=False)
+    records.to_parquet(os.path.join(folder, RECORDS_FILE), index=False, compression="zstd")
+
+
+def carregar_compacto(folder, columns=None):
+    """Retorna (profiles, records). 'columns' permite ler só as colunas necessárias do Parquet."""
+    with open(os.path.join(folder, PROFILES_FILE), "r", encoding="utf-8") as f:
+        profiles = pd.DataFrame(json.load(f))
+    records = pd.read_parquet(os.path.join(folder, RECORDS_FILE), columns=columns)
+    return profiles, records
+
+
+def montar_linhas_gemini(profiles, records):
+    """
+    Linhas JSONL de fine-tuning do Gemini (uma por registro) a partir do formato compacto.
+    Cada perfil, pergunta e resposta distinta é serializado uma única vez.
+    """
+    profile_text = dict(zip(profiles["profile_id"], profiles["profile"]))
+    # Prefixo de cada perfil serializado uma vez só (sem as aspas do final)
+    prefixes = {
+        pid: json.dumps(f"{text}{QUESTION_SEPARATOR}", ensure_ascii=False)[:-1]
+        for pid, text in profile_text.items()
+    }
+    questions = {q: json.dumps(q, ensure_ascii=False)[1:] for q in pd.unique(records["Question"].astype(str))}
+    answers = {a: json.dumps(a, ensure_ascii=False) for a in pd.unique(records["expanded_answer"].dropna())}
+
+    return (
+        '{"contents": [{"role": "user", "parts": [{"text": '
+        + records["profile_id"].map(prefixes).astype(str)
+        + records["Question"].astype(str).map(questions)
+        + '}]}, {"role": "model", "parts": [{"text": '
+        + records["expanded_answer"].astype(object).map(answers).fillna("null")
+        + '}]}]}'
+    )
+
+
+def exportar_gemini_jsonl(profiles, records, output_file_name):
+    """Gera o JSONL de fine-tuning do Gemini a partir do formato compacto."""
+    lines = montar_linhas_gemini(profiles, records)
+    with JsonlWriter(output_file_name) as writer:
+        writer.write_lines(lines)
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte entre JSONL do Gemini e o formato compacto.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="JSONL do Gemini -> pasta compacta")
+    p_import.add_argument("paths", nargs="+")
+    p_import.add_argument("--out", required=True)
+
+    p_complete = sub.add_parser("complete", help="Preenche pessoa e resposta de uma pasta importada")
+    p_complete.add_argument("folder")
+    p_complete.add_argument("--dataset", required=True, help="Planilha (df_fine_tuning.xlsx) de onde vieram os JSONL.")
+
+    p_export = sub.add_parser("export", help="Pasta compacta -> JSONL do Gemini")
+    p_export.add_argument("folder")
+    p_export.add_argument("--cluster", default=None, help="Exporta só este cluster (ex.: Security_Seeker).")
+    p_export.add_argument("--out", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        profiles, records = importar_jsonl(args.paths)
+        salvar_compacto(profiles, records, args.out)
+        original = sum(os.path.getsize(p) for p in args.paths)
+        compact = sum(os.path.getsize(os.path.join(args.out, f)) for f in (PROFILES_FILE, RECORDS_FILE))
+        print(f"{len(records)} registros, {len(profiles)} perfis: {original / 1e6:.2f} MB -> {compact / 1e6:.2f} MB")
+    elif args.command == "complete":
+        from fine_tuning_dataset import carregar_dataset  # (fine_tuning_dataset importa este módulo)
+
+        profiles, records = carregar_compacto(args.folder)
+        records = completar_pessoas(records, carregar_dataset(args.dataset))
+        salvar_compacto(profiles, records, args.folder)
+        print(f"{len(records)} registros de {records['person'].nunique()} pessoas em {args.folder}")
+    else:
+        profiles, records = carregar_compacto(args.folder)
+        if args.cluster:
+            profile_id = profiles.loc[profiles["cluster_name"] == args.cluster, "profile_id"]
+            records = records[records["profile_id"].isin(profile_id)]
+        count = exportar_gemini_jsonl(profiles, records, args.out)
+        print(f"{count} registros exportados para {args.out}")
+
+
+if __name__ == "__main__":
+    main()
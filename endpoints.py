@@ -0,0 +1,24 @@
+"""
+Constantes do projeto no Vertex AI e endpoints fine-tuned de cada cluster,
+compartilhadas pelos apps, pelo persona_service.py e pelos scripts de linha de comando.
+"""
+
+PROJECT_ID = "syntheticpersonasfinetuning"
+PROJECT_NUMBER = "541997184461"
+REGION = "us-central1"
+
+# Mapeia o 'Cluster' da persona para o ID numérico do endpoint fine-tuned
+ENDPOINT_MAP = {
+    "Security_Seeker": "6954726605520371712",
+}
+
+
+def caminho_endpoint(endpoint_id) -> str:
+    """Caminho completo do endpoint: projects/{project_number}/locations/{region}/endpoints/{id}"""
+    return f"projects/{PROJECT_NUMBER}/locations/{REGION}/endpoints/{endpoint_id}"
+
+
+def endpoint_do_cluster(cluster_name):
+    """Retorna o caminho do endpoint do cluster, ou None se o cluster não tiver endpoint."""
+    endpoint_id = ENDPOINT_MAP.get(cluster_name)
+    return caminho_endpoint(endpoint_id) if endpoint_id else None
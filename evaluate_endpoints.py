@@ -0,0 +1,307 @@
+"""
+Avaliação offline dos endpoints fine-tuned com os arquivos de validação.
+
+Lê os json/validation_cluster_*_gemini.jsonl em streaming (não versionados: gere-os
+a partir de dados/compact_validation com python export_fine_tuning.py --from-compact), envia as perguntas
+em paralelo (thread pool + limite de requisições por segundo) e compara a
+resposta do modelo com a esperada: acurácia e MAE por cluster e por pergunta
+(Q1–Q28), além de latência p50/p95 e throughput.
+
+Exemplos:
+    python evaluate_endpoints.py --workers 8 --rps 5
+    python evaluate_endpoints.py --stub-url http://127.0.0.1:8808 --limit 50   # contra o fake_vertex.py
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from cluster_profiles import CLUSTER_PROFILES, nome_arquivo_cluster
+from endpoints import PROJECT_ID, REGION, caminho_endpoint, endpoint_do_cluster
+from jsonl_io import ler_jsonl
+from telemetry import generate_content_instrumentado
+from survey import carregar_perguntas, perguntas_por_texto, extrair_resposta, eh_numerica
+
+
+logging.basicConfig(level=logging.INFO)
+
+VALIDATION_GLOB = "json/validation_cluster_*_gemini.jsonl"
+QUESTION_SEPARATOR = "\n\nQuestion: "
+
+
+# --- BACKENDS (onde as perguntas são enviadas) ---
+
+class VertexBackend:
+    """Envia as perguntas para os endpoints reais do Vertex AI."""
+
+    def __init__(self, temperature=0.0):
+        import vertexai
+        from vertexai.generative_models import GenerativeModel, GenerationConfig
+
+        vertexai.init(project=PROJECT_ID, location=REGION)
+        self._model_class = GenerativeModel
+        self._config = GenerationConfig(temperature=temperature, max_output_tokens=256)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, endpoint_path):
+        with self._lock:
+            if endpoint_path not in self._models:
+                self._models[endpoint_path] = self._model_class(model_name=endpoint_path)
+            return self._models[endpoint_path]
+
+    def generate(self, endpoint_path, contents, system_instruction=None, persona="evaluation"):
+        if system_instruction:
+            # Um modelo por (endpoint, persona), reaproveitado pelo pool LRU do processo
+            from vertex_pool import get_model_pool
+            model = get_model_pool().get(endpoint_path, system_instruction)
+        else:
+            model = self._model(endpoint_path)
+        response = generate_content_instrumentado(
+            model, contents, endpoint=endpoint_path,
+            persona=persona, generation_config=self._config
+        )
+        return response.text
+
+
+class HttpBackend:
+    """
+    Envia as perguntas para um servidor com a API REST do generateContent
+    (ex.: fake_vertex.py na CI).
+    """
+
+    def __init__(self, base_url, timeout=60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def generate(self, endpoint_path, contents, system_instruction=None, persona=None):
+        body = {"contents": contents}
+        if system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+        body = json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}/v1/{endpoint_path}:generateContent",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read())
+        return payload["candidates"][0]["content"]["parts"][0]["text"]
+
+
+class RateLimiter:
+    """Limita a quantidade de requisições por segundo entre todas as threads."""
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+# --- MÉTRICAS ---
+
+def percentil(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class Metricas:
+    """
+    Acumula acertos, erro absoluto e latências por cluster e por pergunta (thread-safe).
+    O erro absoluto fica separado por tipo de pergunta numérica: pontos da escala 1-6
+    e dólares não entram na mesma média.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_key = defaultdict(lambda: {"n": 0, "correct": 0, "parse_errors": 0, "errors": 0,
+                                           "abs_error": defaultdict(float), "numeric": defaultdict(int)})
+        self.latencies = defaultdict(list)
+
+    def registrar(self, cluster, q_label, question_type, expected, predicted, latency, error=False):
+        with self._lock:
+            for key in ((cluster, q_label), (cluster, "*"), ("*", q_label)):
+                m = self.by_key[key]
+                m["n"] += 1
+                if error:
+                    m["errors"] += 1
+                    continue
+                if predicted is None:
+                    m["parse_errors"] += 1
+                    continue
+                m["correct"] += int(predicted == expected)
+                if eh_numerica(question_type) and expected is not None:
+                    m["numeric"][question_type] += 1
+                    m["abs_error"][question_type] += abs(predicted - expected)
+            if latency is not None:
+                self.latencies[cluster].append(latency)
+                self.latencies["*"].append(latency)
+
+    def resumo(self, key):
+        m = self.by_key[key]
+
+        def mae(question_type):
+            n = m["numeric"][question_type]
+            return m["abs_error"][question_type] / n if n else None
+
+        return {
+            "n": m["n"],
+            "accuracy": m["correct"] / m["n"] if m["n"] else None,
+            "mae_scale": mae("scale"),
+            "mae_monetary": mae("monetary"),
+            "parse_errors": m["parse_errors"],
+            "errors": m["errors"],
+        }
+
+
+# --- EXECUÇÃO ---
+
+def cluster_do_arquivo(path):
+    slugs = {nome_arquivo_cluster(name): name for name in CLUSTER_PROFILES}
+    match = re.search(r"validation_cluster_(.+)_gemini\.jsonl$", os.path.basename(path))
+    return slugs.get(match.group(1)) if match else None
+
+
+def avaliar(paths, backend, workers=8, rps=None, limit=None, allow_missing_endpoints=False):
+    """Roda todos os arquivos de validação e retorna (métricas, duração em segundos)."""
+    questions = perguntas_por_texto(carregar_perguntas())
+    metrics = Metricas()
+    limiter = RateLimiter(rps)
+    # Limita as tarefas em andamento para não carregar o arquivo inteiro na fila
+    in_flight = threading.BoundedSemaphore(workers * 4)
+
+    def executar(cluster, endpoint_path, question, expected_text, user_turn):
+        try:
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                reply = backend.generate(endpoint_path, [user_turn])
+            except Exception as e:
+                logging.warning(f"[{cluster}] Erro ao chamar o endpoint: {e}")
+                metrics.registrar(cluster, question["Q_label"], question["type"], None, None, None, error=True)
+                return
+            latency = time.perf_counter() - start
+            expected = extrair_resposta(question["type"], expected_text)
+            predicted = extrair_resposta(question["type"], reply)
+            metrics.registrar(cluster, question["Q_label"], question["type"], expected, predicted, latency)
+        finally:
+            in_flight.release()
+
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            cluster = cluster_do_arquivo(path)
+            endpoint_path = endpoint_do_cluster(cluster)
+            if endpoint_path is None:
+                if not allow_missing_endpoints:
+                    logging.warning(f"Sem endpoint para o cluster '{cluster}' ({path}). Pulando.")
+                    continue
+                # Com o backend HTTP (fake) qualquer caminho serve
+                endpoint_path = caminho_endpoint(nome_arquivo_cluster(cluster or "unknown"))
+
+            for i, record in enumerate(ler_jsonl(path)):
+                if limit is not None and i >= limit:
+                    break
+                user_turn, model_turn = record["contents"]
+                question_text = user_turn["parts"][0]["text"].partition(QUESTION_SEPARATOR)[2]
+                question = questions.get(question_text)
+                if question is None:
+                    logging.warning(f"Pergunta não encontrada em survey_questions.json: {question_text[:60]!r}")
+                    continue
+                in_flight.acquire()
+                futures.append(pool.submit(executar, cluster, endpoint_path, question,
+                                           model_turn["parts"][0]["text"], user_turn))
+
+    # Erros na avaliação (não na chamada ao endpoint, que vira métrica) não podem sumir
+    for future in futures:
+        future.result()
+    return metrics, time.perf_counter() - start
+
+
+def relatorio(metrics, duration):
+    clusters = sorted({c for c, _ in metrics.by_key if c != "*"})
+    q_labels = sorted({q for _, q in metrics.by_key if q != "*"}, key=lambda q: int(q[1:]))
+    n_total = sum(metrics.resumo((c, "*"))["n"] for c in clusters)
+
+    report = {"duration_s": duration, "throughput_rps": n_total / duration if duration else None,
+              "clusters": {}, "questions": {}}
+    for cluster in clusters:
+        lat = metrics.latencies[cluster]
+        report["clusters"][cluster] = {
+            **metrics.resumo((cluster, "*")),
+            "latency_p50_s": percentil(lat, 50),
+            "latency_p95_s": percentil(lat, 95),
+        }
+    for q_label in q_labels:
+        report["questions"][q_label] = metrics.resumo(("*", q_label))
+    return report
+
+
+def _fmt(value, pattern="{:.3f}"):
+    return "-" if value is None else pattern.format(value)
+
+
+def imprimir_relatorio(report):
+    print(f"\nDuração: {report['duration_s']:.1f}s | Throughput: {_fmt(report['throughput_rps'], '{:.2f}')} req/s\n")
+    print(f"{'cluster':<28}{'n':>6}{'acc':>8}{'mae 1-6':>9}{'mae US$':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'erros':>7}")
+    for cluster, m in report["clusters"].items():
+        print(f"{cluster:<28}{m['n']:>6}{_fmt(m['accuracy']):>8}{_fmt(m['mae_scale'], '{:.2f}'):>9}"
+              f"{_fmt(m['mae_monetary'], '{:.1f}'):>10}"
+              f"{_fmt(m['latency_p50_s']):>10}{_fmt(m['latency_p95_s']):>10}{m['errors']:>7}")
+    print(f"\n{'pergunta':<10}{'n':>6}{'acc':>8}{'mae 1-6':>9}{'mae US$':>10}{'não lidas':>11}")
+    for q_label, m in report["questions"].items():
+        print(f"{q_label:<10}{m['n']:>6}{_fmt(m['accuracy']):>8}{_fmt(m['mae_scale'], '{:.2f}'):>9}"
+              f"{_fmt(m['mae_monetary'], '{:.1f}'):>10}{m['parse_errors']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avalia os endpoints fine-tuned com os arquivos de validação.")
+    parser.add_argument("paths", nargs="*", help=f"Arquivos de validação (padrão: {VALIDATION_GLOB}).")
+    parser.add_argument("--workers", type=int, default=8, help="Chamadas simultâneas.")
+    parser.add_argument("--rps", type=float, default=None, help="Limite de requisições por segundo.")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de registros por arquivo.")
+    parser.add_argument("--stub-url", default=None, help="URL de um servidor fake (ex.: fake_vertex.py) no lugar do Vertex AI.")
+    parser.add_argument("--report", default=None, help="Salva o relatório em JSON neste caminho.")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(VALIDATION_GLOB))
+    if not paths:
+        parser.error(f"Nenhum arquivo em {VALIDATION_GLOB}. Gere-os com: python export_fine_tuning.py --from-compact")
+    backend = HttpBackend(args.stub_url) if args.stub_url else VertexBackend()
+
+    metrics, duration = avaliar(paths, backend, workers=args.workers, rps=args.rps, limit=args.limit,
+                                allow_missing_endpoints=bool(args.stub_url))
+    report = relatorio(metrics, duration)
+    imprimir_relatorio(report)
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
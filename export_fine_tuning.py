@@ -0,0 +1,272 @@
+"""
+Exportação do dataset de fine-tuning: treino e validação de todos os clusters.
+
+Substitui o format_data() do data_quality.ipynb (chamado uma vez por cluster).
+
+A divisão com que os endpoints foram treinados fica guardada (e versionada) no
+formato compacto, em dados/compact_train e dados/compact_validation (ver
+compact_dataset.py). Ela é a referência: quem já está numa das pastas continua
+na mesma divisão, para a validação nunca incluir alguém que o endpoint viu no
+treino. Só respondentes novos são sorteados, pelo hash (com semente) do seu
+identificador, que não depende da ordem das linhas.
+
+A exportação grava as divisões que monta em dados/export (não versionada); as
+pastas de referência só são regravadas com --overwrite.
+
+Os 8 arquivos JSONL do Gemini são gerados a partir do formato compacto, em
+paralelo (um processo por arquivo), e o manifest.json registra linhas, pessoas
+e o sha256 de cada um. Arquivos cujo conteúdo não mudou desde o último manifest
+não são regravados. Os JSONL não são versionados.
+
+Exemplos:
+    python export_fine_tuning.py --out json --seed 42
+    python export_fine_tuning.py --from-compact          # só gera os JSONL a partir de dados/compact_*
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cluster_profiles import CLUSTER_PROFILES, CLUSTER_NUMBERS, nome_arquivo_cluster
+from compact_dataset import carregar_compacto, montar_compacto, montar_linhas_gemini, salvar_compacto
+from fine_tuning_dataset import DATASET_FILE, carregar_dataset, expandir_respostas
+
+
+logging.basicConfig(level=logging.INFO)
+
+OUTPUT_DIR = "json"
+# Formato compacto de cada divisão (o artefato versionado): dados/compact_train, dados/compact_validation
+COMPACT_DIR = "dados"
+# Onde a exportação grava as divisões que monta (fora das pastas versionadas)
+EXPORT_COMPACT_DIR = os.path.join(COMPACT_DIR, "export")
+SPLITS = ("train", "validation")
+MANIFEST_FILE = "manifest.json"
+TRAIN_FRACTION = 0.8
+DEFAULT_SEED = 42
+
+# Colunas que os processos de escrita precisam (o resto não é serializado para eles)
+EXPORT_COLUMNS = ["profile_id", "person", "Question", "expanded_answer"]
+
+
+def pasta_compacta(split, compact_dir=COMPACT_DIR):
+    return os.path.join(compact_dir, f"compact_{split}")
+
+
+def nome_arquivo(split, cluster_name):
+    """Mesmo padrão de nome do notebook: '<split>_cluster_<cluster>_gemini.jsonl'."""
+    return f"{split}_cluster_{nome_arquivo_cluster(cluster_name)}_gemini.jsonl"
+
+
+def fracao_hash(people, seed=DEFAULT_SEED):
+    """Número em [0, 1) estável para cada pessoa (sha256 de 'semente:pessoa')."""
+    values = np.empty(len(people), dtype=np.float64)
+    for i, person in enumerate(people):
+        digest = hashlib.sha256(f"{seed}:{person}".encode("utf-8")).digest()
+        values[i] = int.from_bytes(digest[:8], "big") / 2 ** 64
+    return values
+
+
+def divisao_guardada(compact_dir=COMPACT_DIR):
+    """Divisão de cada pessoa nas pastas compactas de 'compact_dir' ({pessoa: 'train' | 'validation'})."""
+    splits = {}
+    for split in SPLITS:
+        folder = pasta_compacta(split, compact_dir)
+        if os.path.exists(folder):
+            _, records = carregar_compacto(folder, columns=["person"])
+            splits.update(dict.fromkeys(records["person"].dropna().astype(str), split))
+    return splits
+
+
+def dividir_pessoas(people, train_fraction=TRAIN_FRACTION, seed=DEFAULT_SEED, anteriores=None):
+    """
+    Separa as pessoas em (treino, validação), como conjuntos. Quem está em 'anteriores'
+    ({pessoa: divisão}) fica onde estava; as demais vão para o treino se o seu hash
+    ficar abaixo de 'train_fraction' (proporção próxima, não exata, em grupos pequenos).
+    """
+    anteriores = anteriores or {}
+    people = pd.unique(pd.Series(people).astype(str))
+    known = np.array([person in anteriores for person in people], dtype=bool)
+    in_train = fracao_hash(people, seed) < train_fraction
+    in_train[known] = [anteriores[person] == "train" for person in people[known]]
+    return set(people[in_train]), set(people[~in_train])
+
+
+def _carregar(filename):
+    if filename.endswith(".parquet"):
+        return pd.read_parquet(filename)
+    if filename.endswith(".csv"):
+        return pd.read_csv(filename)
+    return carregar_dataset(filename)
+
+
+def _manifest_anterior(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {entry["file"]: entry for entry in json.load(f).get("files", [])}
+
+
+def _escrever_arquivo(profiles, records, path, previous_sha256=None):
+    """
+    Monta o JSONL a partir do formato compacto em um processo separado e grava se o
+    conteúdo mudou. Retorna (linhas, sha256, bytes, regravado).
+    """
+    lines = montar_linhas_gemini(profiles, records)
+    payload = ("\n".join(lines) + "\n").encode("utf-8") if len(lines) else b""
+    sha256 = hashlib.sha256(payload).hexdigest()
+    if sha256 == previous_sha256 and os.path.exists(path) and os.path.getsize(path) == len(payload):
+        return len(lines), sha256, len(payload), False
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(lines), sha256, len(payload), True
+
+
+def compactar(dataset, compact_dir=EXPORT_COMPACT_DIR, seed=DEFAULT_SEED, train_fraction=TRAIN_FRACTION,
+              reference_dir=COMPACT_DIR, overwrite=False):
+    """
+    Divide o dataset ('Kmeans_pca', 'person', 'Question', 'expanded_answer'...) em treino
+    e validação, mantendo quem já está nas pastas de 'reference_dir', e grava o formato
+    compacto de cada divisão em 'compact_dir'. Retorna quantas pessoas novas foram sorteadas.
+    FileExistsError se 'compact_dir' for a referência e 'overwrite' não for pedido.
+    """
+    if (not overwrite and os.path.abspath(compact_dir) == os.path.abspath(reference_dir)
+            and any(os.path.exists(pasta_compacta(split, compact_dir)) for split in SPLITS)):
+        raise FileExistsError(f"{compact_dir} guarda a divisão de referência; use outra pasta ou overwrite=True.")
+
+    anteriores = divisao_guardada(reference_dir)
+    new_people = set(dataset["person"].astype(str)) - set(anteriores)
+    if new_people:
+        logging.info(f"{len(new_people)} pessoas fora de {reference_dir}: divisão sorteada pelo hash.")
+    train_people, _ = dividir_pessoas(dataset["person"], train_fraction, seed, anteriores)
+    in_train = dataset["person"].astype(str).isin(train_people)
+    for split, mask in (("train", in_train), ("validation", ~in_train)):
+        profiles, records = montar_compacto(dataset[mask])
+        salvar_compacto(profiles, records, pasta_compacta(split, compact_dir))
+        logging.info(f"{pasta_compacta(split, compact_dir)}: {len(records)} registros")
+    return len(new_people)
+
+
+def exportar_jsonl(compact_dir=COMPACT_DIR, output_dir=OUTPUT_DIR, clusters=None, max_workers=None, **info):
+    """
+    Gera o JSONL de treino/validação de cada cluster a partir do formato compacto
+    guardado em 'compact_dir'. Retorna o manifest (dict), que inclui 'info'.
+    """
+    clusters = clusters or list(CLUSTER_PROFILES)
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _manifest_anterior(output_dir)
+
+    jobs = []
+    source_rows = 0
+    for split in SPLITS:
+        folder = pasta_compacta(split, compact_dir)
+        if not os.path.exists(folder):
+            logging.warning(f"{folder} não existe, pulando a divisão '{split}'.")
+            continue
+        profiles, records = carregar_compacto(folder, columns=EXPORT_COLUMNS)
+        source_rows += len(records)
+        # Um único groupby para todos os clusters (em vez de um filtro por cluster)
+        groups = dict(tuple(records.groupby("profile_id", sort=False)))
+        for cluster_name in clusters:
+            number = CLUSTER_NUMBERS[cluster_name]
+            rows = groups.get(number, records.iloc[:0])
+            jobs.append((cluster_name, split, nome_arquivo(split, cluster_name),
+                         profiles[profiles["profile_id"] == number], rows))
+
+    with ProcessPoolExecutor(max_workers=max_workers or min(len(jobs), os.cpu_count() or 1) or 1) as pool:
+        futures = [
+            pool.submit(_escrever_arquivo, profiles, rows,
+                        os.path.join(output_dir, file_name), previous.get(file_name, {}).get("sha256"))
+            for cluster_name, split, file_name, profiles, rows in jobs
+        ]
+        results = [future.result() for future in futures]
+
+    files = []
+    for (cluster_name, split, file_name, _, rows), (n_lines, sha256, size, written) in zip(jobs, results):
+        files.append({
+            "file": file_name,
+            "cluster": cluster_name,
+            "Kmeans_pca": CLUSTER_NUMBERS[cluster_name],
+            "split": split,
+            "rows": n_lines,
+            # JSONL importados sem a pessoa (ver compact_dataset.completar_pessoas) não contam pessoas
+            "people": int(rows["person"].nunique()) if rows["person"].notna().all() else None,
+            "bytes": size,
+            "sha256": sha256,
+        })
+        logging.info(f"{file_name}: {n_lines} linhas{'' if written else ' (sem mudanças)'}")
+
+    manifest = {
+        **info,
+        "compact_dir": compact_dir,
+        "source_rows": source_rows,
+        "files": files,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return manifest
+
+
+def exportar(dataset, output_dir=OUTPUT_DIR, seed=DEFAULT_SEED, train_fraction=TRAIN_FRACTION,
+             clusters=None, max_workers=None, compact_dir=EXPORT_COMPACT_DIR, reference_dir=COMPACT_DIR,
+             overwrite=False):
+    """
+    Divide o dataset (mantendo a divisão de referência), grava o formato compacto de cada
+    divisão em 'compact_dir' e gera os JSONL a partir dele. Retorna o manifest (dict),
+    com a semente, a fração de treino e as pessoas novas.
+    """
+    new_people = compactar(dataset, compact_dir, seed=seed, train_fraction=train_fraction,
+                           reference_dir=reference_dir, overwrite=overwrite)
+    return exportar_jsonl(compact_dir, output_dir, clusters=clusters, max_workers=max_workers,
+                          seed=seed, train_fraction=train_fraction, reference_dir=reference_dir,
+                          new_people=new_people)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta treino/validação de fine-tuning de todos os clusters.")
+    parser.add_argument("--dataset", default=DATASET_FILE, help="Planilha (ou .parquet/.csv) com as respostas.")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Pasta dos JSONL e do manifest.json.")
+    parser.add_argument("--compact-dir", default=None,
+                        help="Pasta das divisões no formato compacto (compact_train, compact_validation). Padrão: "
+                             f"{EXPORT_COMPACT_DIR} ao exportar, {COMPACT_DIR} com --from-compact.")
+    parser.add_argument("--reference-dir", default=COMPACT_DIR,
+                        help="Divisão de referência (versionada): quem está nela não muda de divisão.")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Permite gravar as divisões novas por cima da referência (--compact-dir igual a ela).")
+    parser.add_argument("--from-compact", action="store_true",
+                        help="Não relê o dataset: só gera os JSONL a partir do formato compacto já gravado.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Semente da divisão e das frases expandidas.")
+    parser.add_argument("--train-fraction", type=float, default=TRAIN_FRACTION)
+    parser.add_argument("--clusters", nargs="+", default=list(CLUSTER_PROFILES), choices=list(CLUSTER_PROFILES))
+    parser.add_argument("--workers", type=int, default=None, help="Processos de escrita (padrão: um por arquivo).")
+    args = parser.parse_args()
+
+    if args.from_compact:
+        manifest = exportar_jsonl(args.compact_dir or COMPACT_DIR, args.out, clusters=args.clusters,
+                                  max_workers=args.workers)
+    else:
+        dataset = _carregar(args.dataset)
+        if "expanded_answer" not in dataset.columns:
+            dataset["expanded_answer"] = expandir_respostas(dataset, seed=args.seed)
+        try:
+            manifest = exportar(dataset, args.out, seed=args.seed, train_fraction=args.train_fraction,
+                                clusters=args.clusters, max_workers=args.workers,
+                                compact_dir=args.compact_dir or EXPORT_COMPACT_DIR,
+                                reference_dir=args.reference_dir, overwrite=args.overwrite)
+        except FileExistsError as e:
+            parser.error(f"{e} (passe --overwrite para regravar a referência)")
+    for entry in manifest["files"]:
+        people = "-" if entry["people"] is None else entry["people"]
+        print(f"{entry['file']:<55}{entry['rows']:>8} linhas{people:>6} pessoas  {entry['sha256'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Servidor HTTP local que imita o generateContent do Vertex AI.
+
+Serve para rodar a avaliação e os testes de carga sem gastar cota:
+    python fake_vertex.py --port 8808
+
+Responde a POST .../{endpoint}:generateContent com o mesmo formato JSON da API
+REST do Vertex AI (candidates / finishReason / usageMetadata) e a
+POST .../{endpoint}:streamGenerateContent?alt=sse em pedaços (Server-Sent
+Events), com atraso opcional antes do primeiro pedaço e entre eles:
+    python fake_vertex.py --port 8808 --latency 0.3 --chunk-delay 0.05
+
+Para os testes de carga (benchmarks/bench_chat_load.py) a latência pode ser
+uma distribuição, o streaming pode seguir uma taxa de tokens por segundo e uma
+fração das chamadas pode falhar com 429/503, como o endpoint de verdade:
+    python fake_vertex.py --latency lognormal:0.4:0.5 --tokens-per-second 60 \
+        --error-rate 0.05 --reply-words uniform:20:120 --seed 1
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logging.basicConfig(level=logging.INFO)
+
+# Status HTTP simulados e o "status" que a API REST do Vertex AI devolve para cada um
+ERROR_STATUS = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE", 500: "INTERNAL"}
+# Frases usadas para alongar a resposta até o tamanho sorteado (--reply-words)
+FILLER = (
+    "I usually think about how this affects my team and my own routine before deciding anything, "
+    "and honestly that has worked well for me over the years."
+)
+
+
+def distribuicao(spec):
+    """
+    Converte uma especificação em uma função rng -> valor:
+        "0.3"                  valor fixo
+        "uniform:a:b"          uniforme entre a e b
+        "normal:media:desvio"  normal (truncada em zero)
+        "lognormal:mediana:s"  log-normal com essa mediana e sigma s (cauda longa, como latência de rede)
+        "exp:media"            exponencial
+    """
+    if callable(spec):
+        return spec
+    kind, *params = str(spec).split(":")
+    try:
+        if not params:
+            value = float(kind)
+            return lambda rng: value
+        params = [float(p) for p in params]
+    except ValueError:
+        raise ValueError(f"Distribuição inválida: '{spec}'") from None
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(*params)
+    if kind == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(*params))
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    if kind == "exp" and len(params) == 1:
+        return lambda rng: rng.expovariate(1 / params[0])
+    raise ValueError(f"Distribuição inválida: '{spec}'")
+
+
+def resposta_fake(contents, rng=random):
+    """Gera uma resposta plausível para a última pergunta do usuário."""
+    last_text = ""
+    for item in reversed(contents):
+        if item.get("role") == "user":
+            last_text = " ".join(part.get("text", "") for part in item.get("parts", []))
+            break
+
+    if "scale of 1 to 6" in last_text:
+        return f"{rng.randint(1, 6)} indicates moderate alignment with the described behavior."
+    if re.search(r"\$\s?[\d,]+", last_text):
+        return f"Invested US${rng.choice([0, 500, 1000, 1500, 2000])}, I put in a modest amount."
+    return "Well, I think I'd rather keep things stable and predictable, you know?"
+
+
+def montar_resposta(text, prompt_tokens=0, final=True):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if not final:
+        return {"candidates": [candidate]}
+    candidate["finishReason"] = "STOP"
+    return {
+        "candidates": [candidate],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": max(1, len(text) // 4),
+            "totalTokenCount": prompt_tokens + max(1, len(text) // 4),
+        },
+    }
+
+
+def alongar(text, words):
+    """Completa a resposta com frases genéricas até ter 'words' palavras."""
+    missing = words - len(text.split(" "))
+    if missing <= 0:
+        return text
+    filler = FILLER.split(" ")
+    return " ".join([text] + (filler * (missing // len(filler) + 1))[:missing])
+
+
+def pedacos(text, words_per_chunk=4):
+    """Divide a resposta em pedaços de algumas palavras, como o streaming do Gemini."""
+    words = text.split(" ")
+    return [" ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+            for i in range(0, len(words), words_per_chunk)]
+
+
+class FakeVertexHandler(BaseHTTPRequestHandler):
+    # Perfil simulado, configurado pelo criar_servidor(): latência antes da resposta (s),
+    # atraso fixo entre pedaços (s), ritmo do streaming, fração de erros e tamanho da resposta
+    latency = 0.0
+    chunk_delay = 0.0
+    tokens_per_second = None
+    error_rate = 0.0
+    error_statuses = (429, 503)
+    reply_words = None
+    rng = random.Random()
+
+    def _erro_simulado(self, status):
+        payload = json.dumps({"error": {
+            "code": status, "message": "Simulated error (fake_vertex.py)", "status": ERROR_STATUS.get(status, "UNKNOWN"),
+        }}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        method = self.path.split("?", 1)[0].rsplit(":", 1)[-1]
+        if method not in ("generateContent", "streamGenerateContent"):
+            self.send_error(404, "Use .../{endpoint}:generateContent ou :streamGenerateContent")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400, "JSON inválido")
+            return
+
+        contents = body.get("contents", [])
+        prompt_tokens = sum(len(p.get("text", "")) for c in contents for p in c.get("parts", [])) // 4
+        text = resposta_fake(contents, self.rng)
+        if self.reply_words is not None:
+            text = alongar(text, int(self.reply_words(self.rng)))
+        latency = self.latency(self.rng) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self._erro_simulado(self.rng.choice(self.error_statuses))
+            return
+        if method == "streamGenerateContent":
+            self._responder_stream(text, prompt_tokens)
+            return
+        payload = json.dumps(montar_resposta(text, prompt_tokens)).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _responder_stream(self, text, prompt_tokens):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunks = pedacos(text)
+        for i, chunk in enumerate(chunks):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            if self.tokens_per_second:
+                # ~4 caracteres por token, como no usageMetadata
+                time.sleep(max(1, len(chunk) // 4) / self.tokens_per_second)
+            event = montar_resposta(chunk, prompt_tokens, final=i == len(chunks) - 1)
+            self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\r\n\r\n")
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class FakeVertexServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fila maior que o padrão (5) para aguentar muitas conexões simultâneas
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Cliente que desistiu da chamada (hedge que perdeu, timeout) não é erro do servidor
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            logging.debug(f"Conexão encerrada pelo cliente {client_address}.")
+            return
+        super().handle_error(request, client_address)
+
+
+def criar_servidor(host="127.0.0.1", port=8808, latency=0.0, chunk_delay=0.0, tokens_per_second=None,
+                   error_rate=0.0, error_statuses=(429, 503), reply_words=None, seed=None):
+    """
+    Servidor com o perfil dado ('latency' e 'reply_words' aceitam as especificações
+    do distribuicao()). Cada servidor tem o próprio handler, então vários perfis
+    podem rodar no mesmo processo; port=0 escolhe uma porta livre.
+    """
+    handler = type("FakeVertexHandler", (FakeVertexHandler,), {
+        "latency": staticmethod(distribuicao(latency)),
+        "chunk_delay": chunk_delay,
+        "tokens_per_second": tokens_per_second,
+        "error_rate": error_rate,
+        "error_statuses": tuple(error_statuses),
+        "reply_words": staticmethod(distribuicao(reply_words)) if reply_words is not None else None,
+        "rng": random.Random(seed),
+    })
+    return FakeVertexServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor fake do Vertex AI (generateContent).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", default="0", help="Atraso antes da resposta (s): valor fixo ou distribuição, "
+                                                           "ex.: 'uniform:0.2:0.6', 'lognormal:0.4:0.5', 'exp:0.3'.")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Atraso entre os pedaços do streaming (s).")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Ritmo do streaming (tokens/s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das chamadas que falham (0 a 1).")
+    parser.add_argument("--error-status", type=int, nargs="+", default=[429, 503], choices=sorted(ERROR_STATUS),
+                        help="Status HTTP sorteados para as falhas.")
+    parser.add_argument("--reply-words", default=None, help="Tamanho da resposta (palavras): valor ou distribuição.")
+    parser.add_argument("--seed", type=int, default=None, help="Semente do sorteio (latência, erros, respostas).")
+    args = parser.parse_args()
+
+    server = criar_servidor(
+        args.host, args.port, latency=args.latency, chunk_delay=args.chunk_delay,
+        tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        error_statuses=args.error_status, reply_words=args.reply_words, seed=args.seed,
+    )
+    logging.info(f"Fake Vertex AI ouvindo em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Cliente do fake_vertex.py: GenerativeModel mínimo que fala com o servidor fake
+(generateContent / streamGenerateContent no formato da API REST do Vertex AI),
+sem o SDK.
+
+Tem a mesma interface usada pelo resto do projeto (generate_content e
+generate_content_async, com ou sem stream, chunks com .text / .usage_metadata /
+.candidates[0].finish_reason), então entra no ModelPool no lugar do
+GenerativeModel. Serve para rodar o persona_service.py e os testes de carga
+contra o fake_vertex.py:
+    pool = ModelPool(factory=functools.partial(FakeVertexModel, base_url="http://127.0.0.1:8808"))
+
+Não serve para o Vertex AI de verdade: só HTTP sem TLS, sem autenticação e sem
+Transfer-Encoding chunked (o fake responde em HTTP/1.0 e fecha a conexão no
+fim). A versão assíncrona fala HTTP/1.1 direto com asyncio (uma conexão por
+chamada), sem dependências extras.
+"""
+import asyncio
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from google.api_core import exceptions as api_exceptions
+
+
+# Campos do GenerationConfig (snake_case do SDK) -> nomes da API REST
+_CONFIG_FIELDS = {
+    "temperature": "temperature",
+    "top_p": "topP",
+    "top_k": "topK",
+    "candidate_count": "candidateCount",
+    "max_output_tokens": "maxOutputTokens",
+    "stop_sequences": "stopSequences",
+    "presence_penalty": "presencePenalty",
+    "frequency_penalty": "frequencyPenalty",
+    "response_mime_type": "responseMimeType",
+    "seed": "seed",
+}
+
+# Status HTTP -> exceção equivalente do google.api_core (as mesmas que o SDK levanta)
+_HTTP_ERRORS = {
+    400: api_exceptions.InvalidArgument,
+    404: api_exceptions.NotFound,
+    429: api_exceptions.TooManyRequests,
+    503: api_exceptions.ServiceUnavailable,
+    504: api_exceptions.DeadlineExceeded,
+}
+
+
+class _Valor:
+    """Objeto simples com os atributos que o resto do código lê das respostas do SDK."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _chunk(payload):
+    candidates = []
+    for candidate in payload.get("candidates", []):
+        finish = candidate.get("finishReason")
+        candidates.append(_Valor(finish_reason=_Valor(name=finish) if finish else None))
+    usage = payload.get("usageMetadata")
+    if usage:
+        usage = _Valor(
+            prompt_token_count=usage.get("promptTokenCount", 0),
+            candidates_token_count=usage.get("candidatesTokenCount", 0),
+            total_token_count=usage.get("totalTokenCount", 0),
+        )
+    texts = [
+        part.get("text", "")
+        for candidate in payload.get("candidates", [])[:1]
+        for part in candidate.get("content", {}).get("parts", [])
+    ]
+    return _Valor(text="".join(texts), candidates=candidates, usage_metadata=usage)
+
+
+def _config_rest(generation_config):
+    if generation_config is None:
+        return None
+    if not isinstance(generation_config, dict):
+        generation_config = generation_config.to_dict()
+    return {_CONFIG_FIELDS.get(k, k): v for k, v in generation_config.items() if v is not None}
+
+
+def _conteudos(contents):
+    if isinstance(contents, str):
+        return [{"role": "user", "parts": [{"text": contents}]}]
+    return contents
+
+
+def _erro_http(status, message):
+    return _HTTP_ERRORS.get(status, api_exceptions.GoogleAPICallError)(f"HTTP {status}: {message}")
+
+
+class FakeVertexModel:
+    """Modelo de um endpoint (ou modelo base) do fake, com a system instruction fixa, como o GenerativeModel."""
+
+    def __init__(self, model_name, system_instruction=None, base_url="http://127.0.0.1:8808", timeout=60.0):
+        if urllib.parse.urlsplit(base_url).scheme != "http":
+            raise ValueError(f"FakeVertexModel só fala HTTP com o fake_vertex.py (base_url={base_url!r}).")
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _corpo(self, contents, generation_config):
+        body = {"contents": _conteudos(contents)}
+        if self.system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": self.system_instruction}]}
+        config = _config_rest(generation_config)
+        if config:
+            body["generationConfig"] = config
+        return json.dumps(body).encode("utf-8")
+
+    def _url(self, method):
+        return f"{self.base_url}/v1/{self.model_name}:{method}"
+
+    def _abrir(self, method, body, query=""):
+        request = urllib.request.Request(
+            self._url(method) + query, data=body,
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise _erro_http(e.code, e.reason) from e
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        body = self._corpo(contents, generation_config)
+        if not stream:
+            with self._abrir("generateContent", body) as response:
+                return _chunk(json.loads(response.read()))
+        # A conexão é aberta aqui (erros HTTP saem na chamada, como no SDK); os pedaços vêm ao iterar
+        return self._ler_sse_sync(self._abrir("streamGenerateContent", body, query="?alt=sse"))
+
+    @staticmethod
+    def _ler_sse_sync(response):
+        with response:
+            for line in response:
+                if line.startswith(b"data:"):
+                    yield _chunk(json.loads(line[5:]))
+
+    async def _post(self, method, body, query=""):
+        url = urllib.parse.urlsplit(self._url(method) + query)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(url.hostname, url.port or 80), timeout=self.timeout
+        )
+        path = url.path + (f"?{url.query}" if url.query else "")
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout=self.timeout)
+        status = int(status_line.split()[1])
+        while (await reader.readline()).strip():
+            pass  # cabeçalhos
+        if status != 200:
+            message = (await reader.read()).decode("utf-8", "replace")[:200]
+            writer.close()
+            raise _erro_http(status, message)
+        return reader, writer
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        body = self._corpo(contents, generation_config)
+        if not stream:
+            reader, writer = await self._post("generateContent", body)
+            try:
+                return _chunk(json.loads(await reader.read()))
+            finally:
+                writer.close()
+        reader, writer = await self._post("streamGenerateContent", body, query="?alt=sse")
+        return self._ler_sse(reader, writer)
+
+    async def _ler_sse(self, reader, writer):
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=self.timeout)
+                if not line:
+                    break
+                if line.startswith(b"data:"):
+                    yield _chunk(json.loads(line[5:]))
+        finally:
+            writer.close()
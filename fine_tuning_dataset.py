@@ -0,0 +1,492 @@
+"""
+Montagem do dataset de fine-tuning (Gemini) a partir do df_fine_tuning.xlsx.
+
+Versão importável do pipeline de data_quality.ipynb. As funções row-wise
+originais (generate_expansive_response_scale / _monetary) continuam aqui como
+referência; o caminho usado no pipeline é o vetorizado (expandir_respostas /
+write_jsonl_file), que trabalha com colunas inteiras em vez de linha a linha.
+"""
+import json
+import random
+
+import numpy as np
+import pandas as pd
+
+from compact_dataset import compactar_perfil, exportar_gemini_jsonl
+
+
+DATASET_FILE = "dados/df_fine_tuning.xlsx"
+
+# Perguntas Q1-Q19, Q27-Q28 (1 a 6)
+STANDARD_QUESTIONS = [
+    'Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7', 'Q8', 'Q9',
+    'Q10', 'Q11', 'Q12', 'Q13', 'Q14', 'Q15', 'Q16', 'Q17', 'Q18', 'Q19', 'Q27', 'Q28'
+]
+MONETARY_QUESTIONS = ['Q20', 'Q21', 'Q22', 'Q23']
+
+# Frases por faixa de intensidade: baixa (1-2), média (3-4), alta (5-6)
+SCALE_PHRASES = [
+    [
+        "shows low alignment with the described behavior",
+        "indicates a tendency not to see themselves this way",
+        "reflects limited identification with this trait"
+    ],
+    [
+        "indicates moderate alignment with the described behavior",
+        "reflects a balanced view between agreement and disagreement",
+        "suggests a neutral or ambivalent stance"
+    ],
+    [
+        "demonstrates strong alignment with the described behavior",
+        "shows high affinity for this characteristic",
+        "indicates a clear tendency to see themselves this way"
+    ],
+]
+
+# Pergunta -> (prefixo, valor máximo, limites das faixas, frases de cada faixa).
+# Os limites são o limite inferior de cada faixa, exceto no Q20: o notebook compara
+# valores exatos (value in [0, 499], [500, 999], ...), então lá é um dict valor -> faixa
+# e qualquer outro valor de 0 a 2000 (ex.: 1800, 250) cai na última faixa ("fully invest").
+# Mantido assim para o dataset continuar igual ao usado no fine-tuning dos endpoints.
+MONETARY_BUCKETS = {
+    "Q20": ("Invested", 2000, {0: 0, 499: 0, 500: 1, 999: 1, 1000: 2, 1499: 2, 1500: 3, 1999: 3}, [
+        [
+            "I prefer not to invest in the project, keeping all of my bonus for myself.",
+            "I contribute with nothing, prioritizing personal gain over team benefit.",
+            "I decide to invest nothing, focusing on my own outcome."
+        ],
+        [
+            "I contribute a small portion, showing some willingness to support the team.",
+            "I invest a moderate amount, balancing personal gain and team benefit.",
+            "I put in a modest amount, demonstrating limited cooperation."
+        ],
+        [
+            "I invest around half, balancing personal gain and team improvement.",
+            "I contribute a significant portion, showing moderate trust in colleagues.",
+            "I split my bonus to equally value my own and the team's benefit."
+        ],
+        [
+            "I invest most of my bonus, prioritizing team benefit over personal gain.",
+            "I contribute a large amount, showing strong cooperation and trust in the team.",
+            "I put in a significant sum, valuing collective success."
+        ],
+        [
+            "I fully invest my bonus, showing complete trust and commitment to the team's success.",
+            "I contribute everything, prioritizing the common good.",
+            "I invest the maximum, demonstrating maximum collaboration and confidence in colleagues."
+        ],
+    ]),
+    "Q21": ("Gaved", 1000, [0, 100, 300, 600, 900], [
+        [
+            "I keep the entire amount, prioritizing my own gain over fairness.",
+            "I prefer to retain all the money, showing little concern for the colleagues share.",
+            "I decide not to give anything, focusing solely on my own outcome."
+        ],
+        [
+            "I give a small portion, showing minimal generosity.",
+            "I share a little, but still prioritize myself over the colleague.",
+            "I offer a small amount, reflecting limited fairness."
+        ],
+        [
+            "I offer a fair share, balancing self-interest with a sense of justice.",
+            "I split the money moderately, showing balanced generosity.",
+            "I choose a middle ground, demonstrating fairness without full equality."
+        ],
+        [
+            "I offer a large portion, showing strong fairness and generosity.",
+            "I prioritize equality, giving the colleague almost as much as myself.",
+            "I value fairness highly, sharing most of the bonus."
+        ],
+        [
+            "I give nearly everything, showing complete fairness and altruism.",
+            "I prioritize my colleague entirely, demonstrating extreme generosity.",
+            "I share the maximum possible, fully trusting and valuing fairness."
+        ],
+    ]),
+    # Q22 – Proposal fairness under acceptance/rejection (0–1000)
+    "Q22": ("Gaved", 1000, [0, 100, 300, 600, 900], [
+        [
+            "I propose giving almost nothing, prioritizing personal profit over fairness.",
+            "I make a selfish proposal, expecting the colleague to accept minimal gain.",
+            "I offer an unfair split, assuming power in negotiation."
+        ],
+        [
+            "I offer a small amount, testing how much I can keep while avoiding rejection.",
+            "I share minimally, prioritizing self-interest with some awareness of fairness.",
+            "I give a limited offer, aiming to keep most of the money."
+        ],
+        [
+            "I propose a balanced division, showing moderate fairness and strategy.",
+            "I make a fair offer that is likely to be accepted.",
+            "I split the amount reasonably, balancing fairness with self-interest."
+        ],
+        [
+            "I make a generous proposal, showing strong fairness and empathy.",
+            "I offer most of the money, prioritizing a good outcome for both.",
+            "I value fairness highly, proposing a near-equal split."
+        ],
+        [
+            "I propose giving nearly everything, showing extreme generosity.",
+            "I prioritize fairness completely, putting the colleague’s gain above my own.",
+            "I demonstrate full altruism, offering the maximum possible amount."
+        ],
+    ]),
+    # Q23 – Minimum acceptable amount (0–1000)
+    "Q23": ("Would accepted", 1000, [0, 100, 300, 701, 900], [
+        [
+            "I would accept almost any offer, showing very low concern for fairness.",
+            "I am willing to accept minimal gains, indicating high tolerance for inequality.",
+            "I have very low expectations, accepting even unfair offers."
+        ],
+        [
+            "I would accept small offers, showing limited insistence on fairness.",
+            "I am modest in my expectations, accepting somewhat low amounts.",
+            "I demonstrate flexibility by accepting less than equal splits."
+        ],
+        [
+            "I expect a fair portion, showing balanced concern for fairness and realism.",
+            "I would accept a moderately fair offer, neither too generous nor too strict.",
+            "I show a reasonable expectation for equitable treatment."
+        ],
+        [
+            "I would only accept a high offer.",
+            "I expect substantial compensation, valuing my own gain.",
+            "I demonstrate assertiveness in ensuring a big part of the amount"
+        ],
+        [
+            "I would only accept almost all the amount, rejecting anything else.",
+            "I show very high standards, demanding almost all the amount.",
+            "I am firm in expecting  full amount , prioritizing my personal gain."
+        ],
+    ]),
+}
+
+
+def carregar_dataset(filename=DATASET_FILE):
+    """Carrega o df_fine_tuning.xlsx, removendo a coluna de índice exportada."""
+    dataset = pd.read_excel(filename)
+    return dataset.drop(columns=["Unnamed: 0"], errors="ignore")
+
+
+# --- VERSÃO ROW-WISE (ORIGINAL DO NOTEBOOK) ---
+
+# Cópia literal das funções do data_quality.ipynb (não editar: é a referência do benchmark e dos testes)
+
+def generate_expansive_response_scale(question_id, value):
+    """
+    Generates coherent explanations for numeric/text responses.
+
+    Parameters:
+        question_id (str): 'Q1' to 'Q28'
+        value (int or float): Numeric answer or score
+    Returns:
+        str: Expanded, human-readable explanation
+    """
+
+    # Perguntas Q1-Q19, Q27-Q28 (1 a 6)
+    standard_questions = [
+        'Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7', 'Q8', 'Q9',
+        'Q10', 'Q11', 'Q12', 'Q13', 'Q14', 'Q15', 'Q16', 'Q17', 'Q18', 'Q19', 'Q27', 'Q28'
+    ]
+
+    if question_id in standard_questions:
+        if isinstance(value, int) and 1 <= value <= 6:
+            # Low score
+            if value <= 2:
+                intensity = random.choice([
+                    "shows low alignment with the described behavior",
+                    "indicates a tendency not to see themselves this way",
+                    "reflects limited identification with this trait"
+                ])
+            # Medium score
+            elif value in [3, 4]:
+                intensity = random.choice([
+                    "indicates moderate alignment with the described behavior",
+                    "reflects a balanced view between agreement and disagreement",
+                    "suggests a neutral or ambivalent stance"
+                ])
+            # High score
+            else:
+                intensity = random.choice([
+                    "demonstrates strong alignment with the described behavior",
+                    "shows high affinity for this characteristic",
+                    "indicates a clear tendency to see themselves this way"
+                ])
+            return f"{value} {intensity}."
+
+
+def generate_expansive_response_monetary(question_id, value):
+    """
+    Generates coherent explanations for numeric/text responses.
+
+    Parameters:
+        question_id (str): 'Q20' to 'Q23'
+        value (int or float): Numeric answer or score
+    Returns:
+        str: Expanded, human-readable explanation
+    """
+
+
+    if question_id == "Q20":
+        if isinstance(value, int) and 0 <= value <= 2000:
+
+            if value in [0,499]:
+                intensity = random.choice([
+                    "I prefer not to invest in the project, keeping all of my bonus for myself.",
+                    "I contribute with nothing, prioritizing personal gain over team benefit.",
+                    "I decide to invest nothing, focusing on my own outcome."
+                ])
+            elif value in [500, 999]:
+                intensity = random.choice([
+                    "I contribute a small portion, showing some willingness to support the team.",
+                    "I invest a moderate amount, balancing personal gain and team benefit.",
+                    "I put in a modest amount, demonstrating limited cooperation."
+                ])
+
+            elif value in [1000, 1499]:
+                intensity = random.choice([
+                        "I invest around half, balancing personal gain and team improvement.",
+                        "I contribute a significant portion, showing moderate trust in colleagues.",
+                        "I split my bonus to equally value my own and the team's benefit."
+                ])
+
+            elif value in [1500, 1999]:
+                intensity = random.choice([
+                        "I invest most of my bonus, prioritizing team benefit over personal gain.",
+                        "I contribute a large amount, showing strong cooperation and trust in the team.",
+                        "I put in a significant sum, valuing collective success."
+                ])
+
+
+            else:
+                intensity = random.choice([
+                        "I fully invest my bonus, showing complete trust and commitment to the team's success.",
+                        "I contribute everything, prioritizing the common good.",
+                        "I invest the maximum, demonstrating maximum collaboration and confidence in colleagues."
+                ])
+            return f"Invested US${value}, {intensity}"
+
+
+    if question_id == "Q21":
+        if isinstance(value, int) and 0 <= value <= 1000:
+            if 0 <= value <= 99:
+                intensity = random.choice([
+                    "I keep the entire amount, prioritizing my own gain over fairness.",
+                    "I prefer to retain all the money, showing little concern for the colleagues share.",
+                    "I decide not to give anything, focusing solely on my own outcome."
+                ])
+            elif 100 <= value <= 299:
+                intensity = random.choice([
+                    "I give a small portion, showing minimal generosity.",
+                    "I share a little, but still prioritize myself over the colleague.",
+                    "I offer a small amount, reflecting limited fairness."
+                ])
+            elif 300 <= value <= 599:
+                intensity = random.choice([
+                    "I offer a fair share, balancing self-interest with a sense of justice.",
+                    "I split the money moderately, showing balanced generosity.",
+                    "I choose a middle ground, demonstrating fairness without full equality."
+                ])
+            elif 600 <= value <= 899:
+                intensity = random.choice([
+                    "I offer a large portion, showing strong fairness and generosity.",
+                    "I prioritize equality, giving the colleague almost as much as myself.",
+                    "I value fairness highly, sharing most of the bonus."
+                ])
+            else:  # 900–1000
+                intensity = random.choice([
+                    "I give nearly everything, showing complete fairness and altruism.",
+                    "I prioritize my colleague entirely, demonstrating extreme generosity.",
+                    "I share the maximum possible, fully trusting and valuing fairness."
+                ])
+            return f"Gaved US${value}, {intensity}"
+
+    # Q22 – Proposal fairness under acceptance/rejection (0–1000)
+    if question_id == "Q22":
+        if isinstance(value, int) and 0 <= value <= 1000:
+            if 0 <= value <= 99:
+                intensity = random.choice([
+                    "I propose giving almost nothing, prioritizing personal profit over fairness.",
+                    "I make a selfish proposal, expecting the colleague to accept minimal gain.",
+                    "I offer an unfair split, assuming power in negotiation."
+                ])
+            elif 100 <= value <= 299:
+                intensity = random.choice([
+                    "I offer a small amount, testing how much I can keep while avoiding rejection.",
+                    "I share minimally, prioritizing self-interest with some awareness of fairness.",
+                    "I give a limited offer, aiming to keep most of the money."
+                ])
+            elif 300 <= value <= 599:
+                intensity = random.choice([
+                    "I propose a balanced division, showing moderate fairness and strategy.",
+                    "I make a fair offer that is likely to be accepted.",
+                    "I split the amount reasonably, balancing fairness with self-interest."
+                ])
+            elif 600 <= value <= 899:
+                intensity = random.choice([
+                    "I make a generous proposal, showing strong fairness and empathy.",
+                    "I offer most of the money, prioritizing a good outcome for both.",
+                    "I value fairness highly, proposing a near-equal split."
+                ])
+            else:  # 900–1000
+                intensity = random.choice([
+                    "I propose giving nearly everything, showing extreme generosity.",
+                    "I prioritize fairness completely, putting the colleague’s gain above my own.",
+                    "I demonstrate full altruism, offering the maximum possible amount."
+                ])
+            return f"Gaved US${value}, {intensity}"
+
+    # Q23 – Minimum acceptable amount (0–1000)
+    if question_id == "Q23":
+        if isinstance(value, int) and 0 <= value <= 1000:
+            if 0 <= value <= 99:
+                intensity = random.choice([
+                    "I would accept almost any offer, showing very low concern for fairness.",
+                    "I am willing to accept minimal gains, indicating high tolerance for inequality.",
+                    "I have very low expectations, accepting even unfair offers."
+                ])
+            elif 100 <= value <= 299:
+                intensity = random.choice([
+                    "I would accept small offers, showing limited insistence on fairness.",
+                    "I am modest in my expectations, accepting somewhat low amounts.",
+                    "I demonstrate flexibility by accepting less than equal splits."
+                ])
+            elif 300 <= value <= 700:
+                intensity = random.choice([
+                    "I expect a fair portion, showing balanced concern for fairness and realism.",
+                    "I would accept a moderately fair offer, neither too generous nor too strict.",
+                    "I show a reasonable expectation for equitable treatment."
+                ])
+            elif 701 <= value <= 899:
+                intensity = random.choice([
+                    "I would only accept a high offer.",
+                    "I expect substantial compensation, valuing my own gain.",
+                    "I demonstrate assertiveness in ensuring a big part of the amount"
+                ])
+            else:  # 900–1000
+                intensity = random.choice([
+                    "I would only accept almost all the amount, rejecting anything else.",
+                    "I show very high standards, demanding almost all the amount.",
+                    "I am firm in expecting  full amount , prioritizing my personal gain."
+                ])
+            return f"Would accepted US${value}, {intensity}"
+
+
+def expandir_respostas_apply(dataset):
+    """Versão original (DataFrame.apply linha a linha), mantida para comparação no benchmark."""
+    return dataset.apply(
+        lambda row: (
+            generate_expansive_response_scale(row['Q_label'], row['answer'])
+            if row['Q_label'] in STANDARD_QUESTIONS else (
+                generate_expansive_response_monetary(row['Q_label'], row['answer'])
+                if row['Q_label'] in MONETARY_QUESTIONS
+                else row['answer']
+            )
+        ),
+        axis=1
+    )
+
+
+def write_jsonl_file_iterrows(cluster_profile, dataset, output_file_name):
+    """Versão original (iterrows), mantida para comparação no benchmark."""
+    with open(output_file_name, 'w', encoding='utf-8') as f:
+        for index, row in dataset.iterrows():
+            json_line_data = {
+                "contents": [
+                    {"role": "user", "parts": [{"text": f"{cluster_profile}\n\nQuestion: {row['Question']}"}]},
+                    {"role": "model", "parts": [{"text": row['expanded_answer']}]}
+                ]
+            }
+            f.write(json.dumps(json_line_data, ensure_ascii=False) + "\n")
+
+
+# --- VERSÃO VETORIZADA ---
+
+def _valores_inteiros(answers):
+    """Retorna (valores int64, máscara dos que são inteiros de verdade), como o isinstance(value, int) original."""
+    is_int = answers.map(lambda v: isinstance(v, (int, np.integer)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    values = pd.to_numeric(answers.where(is_int), errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    return values, is_int
+
+
+def _faixas_monetarias(values, limits, n_buckets):
+    """Faixa de cada valor: por limite inferior (lista) ou por valor exato (dict, os demais vão para a última)."""
+    if isinstance(limits, dict):
+        return pd.Series(values).map(limits).fillna(n_buckets - 1).to_numpy(dtype=np.int64)
+    return np.searchsorted(limits, values, side="right") - 1
+
+
+def expandir_respostas(dataset, seed=42):
+    """
+    Gera a coluna 'expanded_answer' de forma vetorizada.
+
+    As faixas de intensidade são calculadas com arrays NumPy e a frase de cada
+    linha é sorteada por um gerador com semente, então a mesma semente sempre
+    gera o mesmo dataset. Perguntas fora de Q1-Q23/Q27-Q28 mantêm a resposta
+    original; valores fora da escala ficam como None (igual à versão row-wise).
+    """
+    rng = np.random.default_rng(seed)
+    labels = dataset['Q_label'].to_numpy()
+    answers = dataset['answer']
+    values, is_int = _valores_inteiros(answers)
+
+    # Sorteia uma das 3 frases para todas as linhas de uma vez
+    choice = rng.integers(0, 3, size=len(dataset))
+
+    result = answers.to_numpy(dtype=object).copy()
+
+    # Escala 1 a 6
+    mask = np.isin(labels, STANDARD_QUESTIONS)
+    valid = mask & is_int & (values >= 1) & (values <= 6)
+    result[mask & ~valid] = None
+    if valid.any():
+        bucket = np.select([values <= 2, values <= 4], [0, 1], default=2)[valid]
+        phrases = np.array(SCALE_PHRASES, dtype=object)[bucket, choice[valid]]
+        result[valid] = (pd.Series(values[valid]).astype(str) + " " + phrases + ".").to_numpy(dtype=object)
+
+    # Perguntas monetárias
+    for question_id, (prefix, max_value, limits, phrases_table) in MONETARY_BUCKETS.items():
+        mask = labels == question_id
+        if not mask.any():
+            continue
+        valid = mask & is_int & (values >= 0) & (values <= max_value)
+        result[mask & ~valid] = None
+        if valid.any():
+            bucket = _faixas_monetarias(values[valid], limits, len(phrases_table))
+            phrases = np.array(phrases_table, dtype=object)[bucket, choice[valid]]
+            texts = f"{prefix} US$" + pd.Series(values[valid]).astype(str) + ", " + phrases
+            result[valid] = texts.to_numpy(dtype=object)
+
+    return pd.Series(result, index=dataset.index, name="expanded_answer")
+
+
+def faixa_da_resposta(question_id, text):
+    """
+    Faixa de intensidade (índice) cuja frase aparece na resposta expandida, ou None.
+    As frases são sorteadas, então é assim que as duas versões são comparadas.
+    """
+    if question_id in STANDARD_QUESTIONS:
+        table = SCALE_PHRASES
+    elif question_id in MONETARY_BUCKETS:
+        table = MONETARY_BUCKETS[question_id][3]
+    else:
+        return None
+    if not isinstance(text, str):
+        return None
+    for bucket, phrases in enumerate(table):
+        if any(phrase in text for phrase in phrases):
+            return bucket
+    return None
+
+
+def write_jsonl_file(cluster_profile, dataset, output_file_name):
+    """
+    Create jsonl file for Gemini fine-tuning format.
+
+    O JSONL é exportado a partir do formato compacto (compact_dataset), como no
+    export_fine_tuning.py: o perfil entra com os espaços normalizados.
+    """
+    print(f"Criando o arquivo {output_file_name}...")
+    profiles, records = compactar_perfil(cluster_profile, dataset)
+    exportar_gemini_jsonl(profiles, records, output_file_name)
+    print("Arquivo .jsonl created!")
@@ -0,0 +1,245 @@
+"""
+Geração de personas em lote, em paralelo, para todos os clusters.
+
+Substitui o loop sequencial de personas_generation() do genarative_persona.ipynb.
+Para usar, autentique antes pelo terminal:
+    gcloud auth application-default login
+
+Exemplo:
+    python generate_personas.py --per-cluster 50 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+
+import vertexai
+from vertexai.generative_models import GenerativeModel, GenerationConfig
+from google.api_core import exceptions as api_exceptions
+
+from cluster_profiles import CLUSTER_PROFILES, ALLOWED_DEPARTMENTS
+from endpoints import PROJECT_ID, REGION, endpoint_do_cluster
+from persona_diversity import DiversityIndex
+from telemetry import generate_content_async_instrumentado
+
+
+logging.basicConfig(level=logging.INFO)
+
+PERSONAS_FILE = "json/personas_gemini.json"
+# O arquivo JSON é regravado inteiro: grava a cada N personas aceitas (e no fim / no cancelamento)
+SAVE_EVERY = 25
+
+PROMPT = """
+Act as an experienced screenwriter and social psychologist.
+Based *only* on the system profile, generate a fictional persona.
+
+Output Requirements:
+1.  Return ONLY a single, valid JSON object. No other text or markdown.
+2.  The JSON object must have these exact keys: "name", "age" (choose an integer 25-65), "department" (choose one from: [Technology, Sales, Customer Insights, Marketing, Business Intelligence & Strategy, Logistics, Finance, Human Resources (HR), Legal & Compliance, Trade Marketing, Investors Relation, Factory]), and "narrative_persona".
+3.  The "narrative_persona" must be a complete, first-person biography of around 150 words that demonstrates the persona's attitudinal behaviors from their life experiences.
+
+Respond with ONLY the JSON.
+"""
+
+# Erros de cota/disponibilidade que valem uma nova tentativa
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+)
+
+
+def validar_persona(data) -> list:
+    """Valida a persona contra o esquema esperado. Retorna a lista de erros (vazia se válida)."""
+    if not isinstance(data, dict):
+        return ["a resposta não é um objeto JSON"]
+
+    errors = []
+    for key in ("name", "age", "department", "narrative_persona"):
+        if key not in data:
+            errors.append(f"campo '{key}' ausente")
+
+    name = data.get("name")
+    if "name" in data and (not isinstance(name, str) or not name.strip()):
+        errors.append("'name' deve ser um texto não vazio")
+
+    age = data.get("age")
+    if "age" in data and (isinstance(age, bool) or not isinstance(age, int) or not 25 <= age <= 65):
+        errors.append(f"'age' deve ser um inteiro entre 25 e 65 (recebido {age!r})")
+
+    department = data.get("department")
+    if "department" in data and department not in ALLOWED_DEPARTMENTS:
+        errors.append(f"'department' inválido: {department!r}")
+
+    narrative = data.get("narrative_persona")
+    if "narrative_persona" in data and (not isinstance(narrative, str) or not narrative.strip()):
+        errors.append("'narrative_persona' deve ser um texto não vazio")
+
+    return errors
+
+
+def carregar_arquivo_personas(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_arquivo_personas(personas, filename):
+    """Grava o arquivo de forma atômica, para não corromper o JSON se o processo cair."""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        json.dump(personas, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_filename, filename)
+
+
+async def gerar_persona(model, model_name, generation_config, semaphore, cluster_name, max_retries=5, base_delay=1.0):
+    """Gera uma persona, com novas tentativas (backoff exponencial com jitter) em erros de cota."""
+    for attempt in range(max_retries + 1):
+        try:
+            async with semaphore:
+                response = await generate_content_async_instrumentado(
+                    model, PROMPT, endpoint=model_name, persona=f"{cluster_name} (generation)",
+                    retries=attempt, generation_config=generation_config
+                )
+            return cluster_name, response.text
+
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, base_delay * 2 ** attempt)
+            logging.warning(f"[{cluster_name}] Erro de cota ({e.__class__.__name__}), tentando de novo em {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+
+async def gerar_lote(clusters, per_cluster, output_file, concurrency=8, base_model=None, max_retries=5,
+                     dedup=True, similarity_threshold=None, save_every=SAVE_EVERY):
+    """
+    Gera 'per_cluster' personas para cada cluster, gravando as válidas no arquivo a cada 'save_every'
+    aceitas e no fim (também se o lote for interrompido).
+    Com 'dedup', quase-duplicatas de personas do mesmo cluster são descartadas e, quando um cluster
+    satura (a maioria das últimas saiu repetida), as chamadas que faltam dele são canceladas.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    personas = carregar_arquivo_personas(output_file)
+
+    index = None
+    if dedup:
+        index = DiversityIndex(threshold=similarity_threshold)
+        index.carregar(personas)
+        logging.info(f"Deduplicação ativa ({index.embedder.kind}, limite {index.threshold:.2f}).")
+
+    generation_config = GenerationConfig(
+        temperature=0.8,
+        top_k=60,
+        response_mime_type="application/json"
+    )
+
+    tasks = {}
+    for cluster_name in clusters:
+        model_name = endpoint_do_cluster(cluster_name) or base_model
+        if not model_name:
+            logging.warning(f"Sem endpoint para o cluster '{cluster_name}' (use --base-model). Pulando.")
+            continue
+
+        model = GenerativeModel(model_name=model_name, system_instruction=CLUSTER_PROFILES[cluster_name])
+        tasks[cluster_name] = [
+            asyncio.create_task(gerar_persona(model, model_name, generation_config, semaphore, cluster_name, max_retries))
+            for _ in range(per_cluster)
+        ]
+
+    valid, invalid, duplicates, failed, unsaved = 0, 0, 0, 0, 0
+    restantes = {t for cluster_tasks in tasks.values() for t in cluster_tasks}
+    try:
+        while restantes:
+            # Se o próprio lote for cancelado (Ctrl+C, timeout de fora), o CancelledError sai daqui
+            done, restantes = await asyncio.wait(restantes, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    # Cancelada porque o cluster saturou
+                    continue
+                try:
+                    cluster_name, text = task.result()
+                except Exception as e:
+                    failed += 1
+                    logging.error(f"Falha ao gerar persona: {e}")
+                    continue
+
+                try:
+                    data = json.loads(text)
+                except json.JSONDecodeError:
+                    data = None
+                errors = validar_persona(data)
+                if errors:
+                    invalid += 1
+                    logging.warning(f"[{cluster_name}] Persona rejeitada: {'; '.join(errors)}")
+                    continue
+
+                persona = {"Cluster": cluster_name, **{k: data[k] for k in ("name", "age", "department", "narrative_persona")}}
+                if index is not None:
+                    accepted, similarity, nearest = index.avaliar(persona)
+                    if not accepted:
+                        duplicates += 1
+                        logging.warning(f"[{cluster_name}] Persona '{persona['name']}' descartada: "
+                                        f"similaridade {similarity:.2f} com '{nearest}'.")
+                        if index.saturado(cluster_name):
+                            pending = [t for t in tasks[cluster_name] if not t.done()]
+                            if pending:
+                                logging.warning(f"[{cluster_name}] Cluster saturado, cancelando {len(pending)} chamadas restantes.")
+                                for t in pending:
+                                    t.cancel()
+                        continue
+
+                personas.append(persona)
+                valid += 1
+                unsaved += 1
+                if unsaved >= save_every:
+                    salvar_arquivo_personas(personas, output_file)
+                    unsaved = 0
+                logging.info(f"[{cluster_name}] Persona '{persona['name']}' aceita ({valid} novas).")
+    finally:
+        for task in restantes:
+            task.cancel()
+        # Não perde as personas já aceitas se o lote for cancelado (Ctrl+C) ou falhar
+        if unsaved:
+            salvar_arquivo_personas(personas, output_file)
+
+    logging.info(f"Lote finalizado: {valid} válidas, {invalid} rejeitadas, {duplicates} duplicadas, {failed} com erro.")
+    if index is not None:
+        for cluster_name, stats in index.estatisticas().items():
+            if stats["diversity"] is not None:
+                logging.info(f"[{cluster_name}] {stats['n']} personas, diversidade {stats['diversity']:.3f}, "
+                             f"vizinho mais próximo {stats['mean_nearest_similarity']:.3f} (média).")
+    return valid, invalid, duplicates, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera personas em lote para os clusters.")
+    parser.add_argument("--clusters", nargs="+", default=list(CLUSTER_PROFILES),
+                        choices=list(CLUSTER_PROFILES), help="Clusters a gerar (padrão: todos).")
+    parser.add_argument("--per-cluster", type=int, default=10, help="Quantidade de personas por cluster.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Máximo de chamadas simultâneas ao Vertex AI.")
+    parser.add_argument("--max-retries", type=int, default=5, help="Tentativas extras em erros de cota.")
+    parser.add_argument("--base-model", default=None,
+                        help="Modelo base (ex.: gemini-2.0-flash-001) para clusters sem endpoint fine-tuned.")
+    parser.add_argument("--output", default=PERSONAS_FILE, help="Arquivo JSON de personas.")
+    parser.add_argument("--similarity-threshold", type=float, default=None,
+                        help="Similaridade de cosseno a partir da qual a persona é considerada duplicata.")
+    parser.add_argument("--save-every", type=int, default=SAVE_EVERY,
+                        help="Grava o arquivo de personas a cada N personas aceitas.")
+    parser.add_argument("--no-dedup", action="store_true", help="Não descarta personas quase duplicadas.")
+    args = parser.parse_args()
+
+    vertexai.init(project=PROJECT_ID, location=REGION)
+    asyncio.run(gerar_lote(
+        args.clusters, args.per_cluster, args.output,
+        concurrency=args.concurrency, base_model=args.base_model, max_retries=args.max_retries,
+        dedup=not args.no_dedup, similarity_threshold=args.similarity_threshold, save_every=args.save_every
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Leitura e escrita de arquivos JSONL em streaming (memória constante).
+
+- ler_jsonl: gerador que decodifica uma linha por vez (usa orjson se estiver instalado).
+- JsonlIndex: índice de offsets em bytes para acessar qualquer registro sem reler o arquivo.
+- JsonlWriter: escrita com buffer, gravando em blocos grandes.
+"""
+import json
+import logging
+import os
+from array import array
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional, só deixa a decodificação mais rápida
+    orjson = None
+
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024  # 1 MiB
+
+
+def _decodificar(line: bytes):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def ler_jsonl(filepath, skip_errors=True):
+    """
+    Lê um arquivo JSONL registro a registro, sem carregar o arquivo inteiro.
+    Linhas inválidas são registradas no log e puladas (ou levantam erro se skip_errors=False).
+    """
+    with open(filepath, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield _decodificar(line)
+            except ValueError as e:
+                if not skip_errors:
+                    raise
+                logging.warning(f"Erro ao decodificar JSON na linha {line_number} de '{filepath}': {e}")
+
+
+class JsonlIndex:
+    """
+    Índice de offsets (em bytes) das linhas de um arquivo JSONL.
+
+    O índice é salvo ao lado do arquivo ('<arquivo>.idx') e reaproveitado
+    enquanto o tamanho e a data de modificação do JSONL não mudarem.
+    """
+
+    def __init__(self, filepath, persist=True):
+        self.filepath = filepath
+        self.index_path = f"{filepath}.idx"
+        self.persist = persist
+        self.offsets = self._carregar_ou_construir()
+
+    def _assinatura(self):
+        stat = os.stat(self.filepath)
+        return array("q", [stat.st_size, stat.st_mtime_ns])
+
+    def _carregar_ou_construir(self):
+        signature = self._assinatura()
+        if self.persist and os.path.exists(self.index_path):
+            stored = array("q")
+            with open(self.index_path, "rb") as f:
+                stored.frombytes(f.read())
+            if stored[:2] == signature:
+                return stored[2:]
+
+        offsets = array("q")
+        position = 0
+        with open(self.filepath, "rb") as f:
+            for line in f:
+                if line.strip():
+                    offsets.append(position)
+                position += len(line)
+
+        if self.persist:
+            with open(self.index_path, "wb") as f:
+                f.write((signature + offsets).tobytes())
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """Lê apenas o registro 'i' (aceita índices negativos)."""
+        offset = self.offsets[i]
+        with open(self.filepath, "rb") as f:
+            f.seek(offset)
+            return _decodificar(f.readline())
+
+    def ler_varios(self, indices):
+        """Lê vários registros reaproveitando o mesmo arquivo aberto."""
+        with open(self.filepath, "rb") as f:
+            for i in indices:
+                f.seek(self.offsets[i])
+                yield _decodificar(f.readline())
+
+
+class JsonlWriter:
+    """
+    Escreve registros JSONL acumulando-os em memória e gravando em blocos
+    de 'buffer_size' bytes. Use como context manager para garantir o flush final.
+    """
+
+    def __init__(self, filepath, mode="w", buffer_size=DEFAULT_BUFFER_SIZE):
+        self.filepath = filepath
+        self.buffer_size = buffer_size
+        self._file = open(filepath, mode + "b")
+        self._buffer = []
+        self._buffered_bytes = 0
+        self.count = 0
+
+    def write(self, record):
+        """Serializa e adiciona um registro (dict) ao buffer."""
+        # json.dumps (e não orjson) para manter o mesmo formato dos arquivos existentes
+        self.write_line(json.dumps(record, ensure_ascii=False))
+
+    def write_line(self, line):
+        """Adiciona uma linha já serializada (str ou bytes, sem o '\\n')."""
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self._buffer.append(line)
+        self._buffer.append(b"\n")
+        self._buffered_bytes += len(line) + 1
+        self.count += 1
+        if self._buffered_bytes >= self.buffer_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered_bytes = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def validar_jsonl(filepath):
+    """
+    Confere, em streaming, se cada registro segue o formato de fine-tuning do Gemini
+    (um turno 'user' seguido de um turno 'model'). Retorna um resumo com contagens.
+    """
+    summary = {"records": 0, "invalid": 0, "user_chars": 0, "model_chars": 0}
+    for record in ler_jsonl(filepath):
+        summary["records"] += 1
+        try:
+            user, model = record["contents"]
+            if user["role"] != "user" or model["role"] != "model":
+                raise ValueError("ordem de roles inesperada")
+            summary["user_chars"] += len(user["parts"][0]["text"])
+            summary["model_chars"] += len(str(model["parts"][0]["text"]))
+        except (KeyError, IndexError, TypeError, ValueError):
+            summary["invalid"] += 1
+    return summary
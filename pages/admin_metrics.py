@@ -0,0 +1,73 @@
+"""
+Página de admin com as métricas das chamadas ao generate_content e os contadores dos caches
+(pool de modelos, cache de contexto).
+Só aparece com PERSONAS_ADMIN=1 no ambiente (ou admin = true no secrets.toml).
+
+Sem PERSONAS_API_URL as chamadas saem deste processo (registry local); com ele,
+quem chama o modelo é o persona_service.py e as métricas são lidas de lá.
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from persona_api import ApiError, PersonaApi
+from telemetry import registry
+
+PERSONAS_API_URL = os.environ.get("PERSONAS_API_URL")
+
+
+def admin_habilitado():
+    if os.environ.get("PERSONAS_ADMIN") == "1":
+        return True
+    try:
+        return bool(st.secrets.get("admin", False))
+    except Exception:
+        return False
+
+
+st.set_page_config(page_title="Métricas", layout="wide")
+st.title("📈 Métricas dos endpoints")
+
+if not admin_habilitado():
+    st.info("Página disponível apenas para administradores (defina PERSONAS_ADMIN=1).")
+    st.stop()
+
+if PERSONAS_API_URL:
+    api = PersonaApi(PERSONAS_API_URL)
+    st.caption(f"Métricas do serviço de personas em {PERSONAS_API_URL}.")
+    try:
+        rows = api.metricas()
+        prometheus = api.metricas_prometheus()
+        caches = api.get_json("/health").get("caches", {})
+    except ApiError as e:
+        st.error(f"Não foi possível ler as métricas do serviço: {e}")
+        st.stop()
+else:
+    rows = registry.resumo()
+    prometheus = registry.prometheus_text()
+    caches = registry.caches()
+
+if not rows:
+    st.caption("Nenhuma chamada registrada ainda.")
+else:
+    df = pd.DataFrame(rows)
+    total_calls = int(df["calls"].sum())
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Chamadas", total_calls)
+    col2.metric("Erros", int(df["errors"].sum()))
+    col3.metric("Retries", int(df["retries"].sum()))
+    df["finish_reasons"] = df["finish_reasons"].astype(str)
+    st.dataframe(df, use_container_width=True)
+
+if caches:
+    st.subheader("Caches")
+    st.dataframe(pd.DataFrame.from_dict(caches, orient="index"), use_container_width=True)
+
+with st.expander("Formato Prometheus (/metrics)"):
+    st.code(prometheus, language="text")
+
+# As métricas do serviço são zeradas quando ele reinicia
+if not PERSONAS_API_URL and st.button("Zerar métricas"):
+    registry.limpar()
+    st.rerun()
@@ -0,0 +1,85 @@
+"""
+Modo painel: a mesma pergunta enviada a várias personas ao mesmo tempo.
+
+Cada persona vai para o endpoint do seu cluster (pelo cliente resiliente, com
+fallback para o modelo base) em uma thread própria e os pedaços de texto
+chegam, conforme são gerados, em uma fila única. Quem consome
+(a tela do Streamlit) só precisa ler os eventos e atualizar a coluna certa,
+então o tempo total fica próximo ao da persona mais lenta, e não à soma de todas.
+"""
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_history import para_conteudo_vertex
+
+
+# Máximo de chamadas simultâneas por pergunta do painel
+PANEL_MAX_WORKERS = 8
+
+# Tipos de evento devolvidos por perguntar_ao_painel
+CHUNK = "chunk"
+DONE = "done"
+ERROR = "error"
+
+
+def montar_tarefa(persona, endpoint_path, system_instruction, generation_values, prompt):
+    """Prepara (na thread principal) tudo o que a thread da persona precisa para responder."""
+    # Import tardio: o SDK do Vertex AI só carrega quando alguém pergunta algo ao painel
+    from vertexai.generative_models import GenerationConfig
+
+    return {
+        "persona": persona.get("name"),
+        "endpoint": endpoint_path,
+        "system_instruction": system_instruction,
+        "contents": para_conteudo_vertex([{"role": "user", "content": prompt}]),
+        "generation_config": GenerationConfig(**generation_values),
+    }
+
+
+def _texto_do_chunk(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks finais podem vir sem texto (apenas metadados)
+        return ""
+
+
+def _responder(index, tarefa, client, events):
+    try:
+        model_used, responses = client.generate(
+            tarefa["endpoint"],
+            tarefa["system_instruction"],
+            tarefa["contents"],
+            generation_config=tarefa["generation_config"],
+            persona=tarefa["persona"],
+            stream=True,
+        )
+        for chunk in responses:
+            text = _texto_do_chunk(chunk)
+            if text:
+                events.put((index, CHUNK, text))
+        events.put((index, DONE, model_used))
+    except Exception as e:
+        logging.warning(f"[painel] Erro ao chamar o endpoint de '{tarefa['persona']}': {e}")
+        events.put((index, ERROR, e))
+
+
+def perguntar_ao_painel(tarefas, client, max_workers=PANEL_MAX_WORKERS):
+    """
+    Dispara as tarefas em paralelo pelo 'client' (ResilientClient) e gera eventos
+    (índice da tarefa, tipo, conteúdo) na ordem em que chegam. Cada tarefa termina
+    com exatamente um DONE (conteúdo = modelo que respondeu) ou ERROR.
+    """
+    if not tarefas:
+        return
+    events = queue.Queue()
+    pending = len(tarefas)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tarefas))) as pool:
+        for index, tarefa in enumerate(tarefas):
+            pool.submit(_responder, index, tarefa, client, events)
+        while pending:
+            index, kind, payload = events.get()
+            if kind != CHUNK:
+                pending -= 1
+            yield index, kind, payload
@@ -0,0 +1,170 @@
+"""
+Cliente do persona_service.py para o Streamlit (só biblioteca padrão).
+
+Com PERSONAS_API_URL definido, app.py / personas_app.py não chamam o Vertex AI:
+    - ApiPersonaStore tem a mesma interface do PersonaStore (buscar, get,
+      valores, faixa_idade), então a tela de seleção não muda;
+    - PersonaApi.chat devolve os pedaços de texto conforme chegam (serve
+      direto para o st.write_stream);
+    - PersonaApi.painel gera os mesmos eventos (índice, CHUNK/DONE/ERROR) do
+      panel.perguntar_ao_painel.
+"""
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from panel import CHUNK, DONE, ERROR
+
+
+DEFAULT_TIMEOUT_SECONDS = 120
+# Por quanto tempo os valores dos filtros (clusters, departamentos, idades) são reaproveitados
+FILTERS_TTL_SECONDS = 30
+
+
+class ApiError(Exception):
+    """Erro devolvido pelo serviço (HTTP 4xx/5xx ou evento 'error' no stream)."""
+
+
+def _eventos_sse(response):
+    """Lê um stream de Server-Sent Events e gera (evento, dados)."""
+    kind, data = "message", []
+    for raw in response:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield kind, json.loads("\n".join(data))
+            kind, data = "message", []
+        elif line.startswith("event:"):
+            kind = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+
+class RespostaStream:
+    """
+    Pedaços de texto de uma resposta do /chat. Depois de consumida, 'model',
+    'fallback' e 'cached' dizem quem respondeu.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.model = None
+        self.fallback = False
+        self.cached = False
+
+    def __iter__(self):
+        try:
+            for kind, data in _eventos_sse(self._response):
+                if kind == "chunk":
+                    yield data["text"]
+                elif kind == "done":
+                    self.model = data.get("model")
+                    self.fallback = data.get("fallback", False)
+                    self.cached = data.get("cached", False)
+                elif kind == "error":
+                    raise ApiError(data.get("error"))
+        finally:
+            self._response.close()
+
+
+class PersonaApi:
+    """Cliente síncrono (urllib) do serviço; um por processo do Streamlit."""
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.store = ApiPersonaStore(self)
+
+    def _abrir(self, method, path, body=None, query=None):
+        url = f"{self.base_url}{path}"
+        if query:
+            url += "?" + urllib.parse.urlencode({k: v for k, v in query.items() if v is not None})
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise ApiError(f"HTTP {e.code}: {message}") from e
+        except urllib.error.URLError as e:
+            raise ApiError(f"Serviço de personas indisponível em '{self.base_url}': {e.reason}") from e
+
+    def get_json(self, path, query=None):
+        with self._abrir("GET", path, query=query) as response:
+            return json.loads(response.read())
+
+    def metricas(self):
+        """Resumo das métricas do serviço, nas mesmas linhas do registry.resumo()."""
+        return self.get_json("/metrics/summary")
+
+    def metricas_prometheus(self):
+        with self._abrir("GET", "/metrics") as response:
+            return response.read().decode("utf-8")
+
+    def chat(self, persona_id, messages, session_id=None, style=None, generation=None, offset=0) -> RespostaStream:
+        """'offset': posição de messages[0] na conversa (HistoricoSessao.primeiro)."""
+        body = {"persona_id": persona_id, "messages": messages, "offset": offset, "session_id": session_id,
+                "style": style, "generation": generation}
+        return RespostaStream(self._abrir("POST", "/chat", body))
+
+    def painel(self, persona_ids, prompt, style=None, generation=None):
+        """Mesma pergunta para várias personas; eventos (índice, tipo, conteúdo) como no panel.py."""
+        body = {"persona_ids": persona_ids, "prompt": prompt, "style": style, "generation": generation}
+        with self._abrir("POST", "/batch", body) as response:
+            for kind, data in _eventos_sse(response):
+                if kind == "chunk":
+                    yield data["index"], CHUNK, data["text"]
+                elif kind == "done":
+                    yield data["index"], DONE, data.get("model")
+                elif kind == "error":
+                    yield data["index"], ERROR, ApiError(data.get("error"))
+
+
+class ApiPersonaStore:
+    """Catálogo de personas lido do serviço, com a interface do PersonaStore."""
+
+    def __init__(self, api):
+        self._api = api
+        self._filters = None
+        self._filters_at = 0.0
+
+    def sincronizar(self, force=False):
+        # O serviço mantém o próprio catálogo em dia
+        return False
+
+    def _valores_filtros(self):
+        if self._filters is None or time.monotonic() - self._filters_at > FILTERS_TTL_SECONDS:
+            self._filters = self._api.get_json("/personas/filters")
+            self._filters_at = time.monotonic()
+        return self._filters
+
+    def get(self, persona_id):
+        try:
+            return self._api.get_json(f"/personas/{urllib.parse.quote(str(persona_id), safe='')}")
+        except ApiError as e:
+            if str(e).startswith("HTTP 404"):
+                return None
+            raise
+
+    def buscar(self, cluster=None, department=None, age_min=None, age_max=None, text=None, limit=20, offset=0):
+        result = self._api.get_json("/personas", query=dict(
+            cluster=cluster, department=department, age_min=age_min, age_max=age_max,
+            text=text or None, limit=limit, offset=offset,
+        ))
+        return result["items"], result["total"]
+
+    def valores(self, column):
+        if column not in ("Cluster", "department"):
+            raise ValueError(f"Coluna sem filtro: {column}")
+        return self._valores_filtros()[column]
+
+    def faixa_idade(self):
+        return tuple(self._valores_filtros()["age"])
+
+    def __len__(self):
+        return self._valores_filtros()["count"]
@@ -0,0 +1,341 @@
+"""
+Deduplicação semântica e diversidade das personas geradas.
+
+As narrativas (narrative_persona) viram vetores normalizados, calculados em
+lotes, com um modelo local de embeddings (sentence-transformers, se estiver
+instalado) ou, sem ele, com TF-IDF por hashing feito só com NumPy. Os vetores
+de cada cluster ficam em uma matriz NumPy e a persona nova é comparada com
+todas as do mesmo cluster de uma vez (similaridade de cosseno = produto
+escalar). Acima do limite ela é marcada como quase-duplicata.
+
+O índice também acompanha a taxa de rejeição recente de cada cluster: quando
+quase tudo o que chega é clone, o cluster está saturado e o generate_personas.py
+para de gastar chamadas com ele.
+
+Relatório de diversidade do arquivo atual:
+    python persona_diversity.py
+    python persona_diversity.py --threshold 0.6 --write-dedup json/personas_dedup.json
+"""
+import argparse
+import json
+import logging
+import re
+import zlib
+from collections import deque
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # modelo local é opcional
+    SentenceTransformer = None
+
+
+logging.basicConfig(level=logging.INFO)
+
+PERSONAS_FILE = "json/personas_gemini.json"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+HASH_DIM = 2048
+BATCH_SIZE = 256
+# TF-IDF: com pelo menos esse número de narrativas o IDF fica fixo; antes disso, cada
+# atualização do IDF reembeda o índice, para comparar vetores sempre com o mesmo IDF
+IDF_MIN_DOCS = 50
+
+# Similaridade a partir da qual duas narrativas do mesmo cluster são consideradas clones
+DEFAULT_THRESHOLDS = {"sentence": 0.9, "tfidf": 0.6}
+
+# Cluster saturado: pelo menos SATURATION_WINDOW personas recentes e essa fração rejeitada
+SATURATION_WINDOW = 10
+SATURATION_REJECT_RATE = 0.7
+
+_TOKEN_RE = re.compile(r"[a-z][a-z']+")
+_STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being but by can could
+did do does doing don't down during each even ever for from further had has have having he her here hers
+him his how i i'm i've if in into is it it's its just me more most my no nor not now of off on once only or
+other our out over own really same she should so some such than that the their them then there these they
+this those through to too under until up very was we were what when where which while who why will with
+would you your
+""".split())
+
+
+class HashingTfidfEmbedder:
+    """TF-IDF com hashing dos termos (dimensão fixa, sem vocabulário), só com NumPy."""
+
+    kind = "tfidf"
+
+    def __init__(self, dim=HASH_DIM):
+        self.dim = dim
+        self.doc_freq = np.zeros(dim, dtype=np.float64)
+        self.n_docs = 0
+
+    def _termos(self, text):
+        tokens = [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOP_WORDS]
+        # Unigramas + bigramas, para pegar também a "forma" das frases
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return [zlib.crc32(term.encode("utf-8")) % self.dim for term in terms]
+
+    def _tf(self, texts):
+        tf = np.zeros((len(texts), self.dim), dtype=np.float32)
+        rows, cols = [], []
+        for i, text in enumerate(texts):
+            buckets = self._termos(text or "")
+            rows.extend([i] * len(buckets))
+            cols.extend(buckets)
+        np.add.at(tf, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+        np.log1p(tf, out=tf)  # tf sublinear
+        return tf
+
+    def fit(self, texts):
+        """Atualiza as frequências de documento (IDF) com o corpus."""
+        for start in range(0, len(texts), BATCH_SIZE):
+            tf = self._tf(texts[start:start + BATCH_SIZE])
+            self.doc_freq += (tf > 0).sum(axis=0)
+            self.n_docs += tf.shape[0]
+
+    def embed(self, texts, batch_size=BATCH_SIZE):
+        idf = (np.log((1.0 + self.n_docs) / (1.0 + self.doc_freq)) + 1.0).astype(np.float32)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            block = self._tf(texts[start:start + batch_size]) * idf
+            out[start:start + block.shape[0]] = block
+        return _normalizar(out)
+
+
+class SentenceEmbedder:
+    """Embeddings de um modelo local do sentence-transformers."""
+
+    kind = "sentence"
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def fit(self, texts):
+        pass
+
+    def embed(self, texts, batch_size=64):
+        vectors = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return vectors.astype(np.float32)
+
+
+def criar_embedder(use_local_model=True):
+    """Modelo local quando disponível, senão TF-IDF."""
+    if use_local_model and SentenceTransformer is not None:
+        try:
+            return SentenceEmbedder()
+        except Exception as e:
+            logging.warning(f"Não foi possível carregar '{EMBEDDING_MODEL}', usando TF-IDF: {e}")
+    return HashingTfidfEmbedder()
+
+
+def _normalizar(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class DiversityIndex:
+    """
+    Vetores das personas aceitas, em uma matriz NumPy por cluster (capacidade
+    dobra conforme cresce), e o histórico recente de aceitas/rejeitadas.
+
+    Com TF-IDF, o IDF é ajustado com as narrativas até o corpus ter IDF_MIN_DOCS
+    (o carregar() de um arquivo existente normalmente já basta) e depois fica fixo,
+    para o limite de similaridade não mudar de escala durante a geração.
+    """
+
+    def __init__(self, embedder=None, threshold=None):
+        self.embedder = embedder or criar_embedder()
+        self.threshold = threshold if threshold is not None else DEFAULT_THRESHOLDS[self.embedder.kind]
+        self._vectors = {}
+        self._counts = {}
+        self._labels = {}
+        self._recent = {}
+        # Narrativas indexadas, guardadas só enquanto o IDF ainda pode mudar (para reembedar)
+        self._texts = {} if hasattr(self.embedder, "n_docs") else None
+
+    @property
+    def idf_fixo(self):
+        return self._texts is None
+
+    def _ajustar_idf(self, texts):
+        """Atualiza o IDF com 'texts' e reembeda o índice com ele (até o IDF ficar fixo)."""
+        if self.idf_fixo:
+            return
+        self.embedder.fit(texts)
+        for cluster, cluster_texts in self._texts.items():
+            self._vectors[cluster][:self._counts[cluster]] = self.embedder.embed(cluster_texts)
+        if self.embedder.n_docs >= IDF_MIN_DOCS:
+            self._texts = None
+            logging.info(f"IDF fixo com {self.embedder.n_docs} narrativas.")
+
+    def _adicionar(self, cluster, vectors, labels, texts):
+        matrix = self._vectors.get(cluster)
+        count = self._counts.get(cluster, 0)
+        needed = count + len(vectors)
+        if matrix is None or needed > matrix.shape[0]:
+            capacity = max(64, needed, 2 * (matrix.shape[0] if matrix is not None else 0))
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            if matrix is not None:
+                grown[:count] = matrix[:count]
+            matrix = self._vectors[cluster] = grown
+        matrix[count:needed] = vectors
+        self._counts[cluster] = needed
+        self._labels.setdefault(cluster, []).extend(labels)
+        if self._texts is not None:
+            self._texts.setdefault(cluster, []).extend(texts)
+
+    def matriz(self, cluster):
+        matrix = self._vectors.get(cluster)
+        return matrix[:self._counts[cluster]] if matrix is not None else None
+
+    def carregar(self, personas):
+        """Indexa as personas já existentes (sem filtrar), embedando em lote."""
+        texts = [p.get("narrative_persona", "") for p in personas]
+        self._ajustar_idf(texts)
+        vectors = self.embedder.embed(texts)
+        by_cluster = {}
+        for i, persona in enumerate(personas):
+            by_cluster.setdefault(persona.get("Cluster"), []).append(i)
+        for cluster, idx in by_cluster.items():
+            self._adicionar(cluster, vectors[idx], [personas[i].get("name") for i in idx], [texts[i] for i in idx])
+
+    def avaliar_lote(self, personas):
+        """
+        Decide, para cada persona nova, se ela entra no índice. Compara com as já
+        aceitas do cluster e com as anteriores do próprio lote.
+        Retorna uma lista de (aceita, similaridade máxima, nome da mais parecida).
+        """
+        if not personas:
+            return []
+        texts = [p.get("narrative_persona", "") for p in personas]
+        self._ajustar_idf(texts)
+        vectors = self.embedder.embed(texts)
+
+        results = [None] * len(personas)
+        by_cluster = {}
+        for i, persona in enumerate(personas):
+            by_cluster.setdefault(persona.get("Cluster"), []).append(i)
+
+        for cluster, idx in by_cluster.items():
+            batch = vectors[idx]
+            existing = self.matriz(cluster)
+            if existing is not None and len(existing):
+                sims = batch @ existing.T
+                best = sims.argmax(axis=1)
+                best_sim = sims[np.arange(len(idx)), best]
+            else:
+                best = np.full(len(idx), -1)
+                best_sim = np.zeros(len(idx), dtype=np.float32)
+            intra = batch @ batch.T
+
+            accepted = []
+            for k, i in enumerate(idx):
+                sim, nearest = float(best_sim[k]), (self._labels[cluster][best[k]] if best[k] >= 0 else None)
+                if accepted:
+                    j = max(accepted, key=lambda a: intra[k, a])
+                    if intra[k, j] > sim:
+                        sim, nearest = float(intra[k, j]), personas[idx[j]].get("name")
+                ok = sim < self.threshold
+                if ok:
+                    accepted.append(k)
+                self._recent.setdefault(cluster, deque(maxlen=SATURATION_WINDOW)).append(ok)
+                results[i] = (ok, sim, nearest)
+
+            if accepted:
+                self._adicionar(cluster, batch[accepted], [personas[idx[k]].get("name") for k in accepted],
+                                [texts[idx[k]] for k in accepted])
+        return results
+
+    def avaliar(self, persona):
+        return self.avaliar_lote([persona])[0]
+
+    def saturado(self, cluster):
+        recent = self._recent.get(cluster)
+        if not recent or len(recent) < SATURATION_WINDOW:
+            return False
+        return recent.count(False) / len(recent) >= SATURATION_REJECT_RATE
+
+    def estatisticas(self):
+        """Diversidade por cluster: similaridade média entre pares, vizinho mais próximo e clones."""
+        stats = {}
+        for cluster in self._vectors:
+            matrix = self.matriz(cluster)
+            n = len(matrix)
+            row = {"n": n, "mean_similarity": None, "diversity": None, "max_similarity": None,
+                   "mean_nearest_similarity": None, "near_duplicate_pairs": 0}
+            if n >= 2:
+                # Para vetores unitários: soma dos pares = |soma dos vetores|² - n
+                total = matrix.sum(axis=0, dtype=np.float64)
+                mean_sim = (float(total @ total) - n) / (n * (n - 1))
+                nearest, pairs = np.empty(n, dtype=np.float32), 0
+                for start in range(0, n, 1024):
+                    sims = matrix[start:start + 1024] @ matrix.T
+                    rows = np.arange(sims.shape[0])
+                    sims[rows, start + rows] = -1.0  # ignora a própria persona
+                    nearest[start:start + sims.shape[0]] = sims.max(axis=1)
+                    pairs += int((sims >= self.threshold).sum())
+                row.update(mean_similarity=mean_sim, diversity=1.0 - mean_sim,
+                           max_similarity=float(nearest.max()),
+                           mean_nearest_similarity=float(nearest.mean()),
+                           near_duplicate_pairs=pairs // 2)
+            recent = self._recent.get(cluster)
+            row["recent_reject_rate"] = recent.count(False) / len(recent) if recent else None
+            row["saturated"] = self.saturado(cluster)
+            stats[cluster] = row
+        return stats
+
+
+def pares_duplicados(personas, index):
+    """Pares (i, j, similaridade) de personas do mesmo cluster acima do limite."""
+    by_cluster = {}
+    for i, persona in enumerate(personas):
+        by_cluster.setdefault(persona.get("Cluster"), []).append(i)
+    vectors = index.embedder.embed([p.get("narrative_persona", "") for p in personas])
+    pairs = []
+    for idx in by_cluster.values():
+        sims = vectors[idx] @ vectors[idx].T
+        a, b = np.nonzero(np.triu(sims >= index.threshold, k=1))
+        pairs.extend((idx[i], idx[j], float(sims[i, j])) for i, j in zip(a, b))
+    return sorted(pairs, key=lambda p: -p[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de diversidade e quase-duplicatas das personas.")
+    parser.add_argument("--personas", default=PERSONAS_FILE, help="Arquivo JSON de personas.")
+    parser.add_argument("--threshold", type=float, default=None, help="Similaridade de cosseno para considerar clone.")
+    parser.add_argument("--tfidf", action="store_true", help="Usa TF-IDF mesmo com o modelo local disponível.")
+    parser.add_argument("--write-dedup", default=None, help="Grava aqui o arquivo sem as quase-duplicatas.")
+    args = parser.parse_args()
+
+    with open(args.personas, "r", encoding="utf-8") as f:
+        personas = json.load(f)
+
+    index = DiversityIndex(criar_embedder(use_local_model=not args.tfidf), threshold=args.threshold)
+    results = index.avaliar_lote(personas)
+    kept = [p for p, (ok, _, _) in zip(personas, results) if ok]
+
+    print(f"\nEmbeddings: {index.embedder.kind} | limite de similaridade: {index.threshold:.2f}\n")
+    print(f"{'cluster':<28}{'n':>6}{'diversidade':>13}{'sim média':>11}{'vizinho':>9}{'clones':>8}")
+    for cluster, s in index.estatisticas().items():
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"{str(cluster):<28}{s['n']:>6}{fmt(s['diversity']):>13}{fmt(s['mean_similarity']):>11}"
+              f"{fmt(s['mean_nearest_similarity']):>9}{s['near_duplicate_pairs']:>8}")
+
+    pairs = pares_duplicados(personas, index)
+    if pairs:
+        print("\nQuase-duplicatas:")
+        for i, j, sim in pairs[:20]:
+            print(f"  {sim:.3f}  #{i} {personas[i].get('name')!r}  ~  #{j} {personas[j].get('name')!r}")
+    print(f"\n{len(personas) - len(kept)} de {len(personas)} personas seriam removidas.")
+
+    if args.write_dedup:
+        with open(args.write_dedup, "w", encoding="utf-8") as f:
+            json.dump(kept, f, indent=4, ensure_ascii=False)
+        logging.info(f"{len(kept)} personas gravadas em '{args.write_dedup}'.")
+
+
+if __name__ == "__main__":
+    main()
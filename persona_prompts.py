@@ -0,0 +1,222 @@
+"""
+System instructions das personas, compiladas uma vez por persona.
+
+O PromptCompiler monta o texto da system instruction (com o estilo de cada
+app, em SYSTEM_INSTRUCTIONS) na primeira vez que a persona aparece e guarda o resultado com o hash do
+conteúdo, reaproveitado por todas as sessões e turnos: o modelo do pool é
+encontrado pela chave já calculada e o cache de respostas usa o mesmo hash.
+
+Quando o modelo suporta (modelos base do Gemini, não os endpoints fine-tuned)
+e o prompt passa do mínimo de tokens do Vertex AI, o ContextCache cria um
+CachedContent no servidor com a system instruction, e os turnos seguintes
+só pagam pelos tokens novos. Caso contrário (ou se a criação falhar), usa o
+GenerativeModel do pool local com a system instruction pré-montada. Os prompts
+de SYSTEM_INSTRUCTIONS têm de 300 a 600 tokens, então hoje o ContextCache sempre cai
+no pool local: o cache do servidor só entra em uso com prompts maiores.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from chat_history import estimar_tokens
+from vertex_pool import chave_persona, get_model_pool
+
+
+# Mínimo de tokens aceito pelo cache de contexto do Vertex AI (abaixo disso o
+# CachedContent.create falha com InvalidArgument, por isso não adianta baixar)
+CONTEXT_CACHE_MIN_TOKENS = 4096
+CONTEXT_CACHE_TTL_SECONDS = 3600
+# Depois de um erro transitório ao criar o CachedContent, espera isso antes de tentar de novo
+CONTEXT_CACHE_RETRY_SECONDS = 60
+
+
+def id_persona(persona) -> str:
+    """ID estável da persona: o campo "id" ou o hash do conteúdo (não depende da posição no arquivo)."""
+    if persona.get("id"):
+        return str(persona["id"])
+    raw = json.dumps(persona, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def system_instruction_chat(persona):
+    """System instruction do app.py: o modelo no papel da persona."""
+    return f"""
+                You are NOT an AI assistant. You ARE the person described in the 'Persona Profile' below.
+                Your task is to answer from the first-person perspective ("I...") of this character.
+                Base your answer on their life story, values, and personality. Be consistent and stay in character.
+
+                Persona Profile:
+                - Name: {persona.get('name', 'N/A')}
+                - Age: {persona.get('age', 'N/A')}
+                - Department: {persona.get('department', 'N/A')}
+                - Life Story & Personality: {persona.get('narrative_persona', 'No details available.')}
+                """
+
+
+def system_instruction_natural(persona):
+    """System instruction do personas_app.py: no papel da persona, com tom mais natural e conversado."""
+    return f"""
+                You are NOT an AI assistant. You ARE the person described in the 'Persona Profile' below.
+
+                --- YOUR TASK ---
+                1. Answer in the first-person ("I...", "my...", "I think...").
+                2. Base your answer *only* on the persona's life story, values, and personality.
+                3. Be consistent and stay in character at all times.
+
+                --- TONE AND STYLE (MOST IMPORTANT) ---
+                - **Professional:** Maintain a respectful, calm, and articulate tone appropriate for your role and age.
+                - **Natural (Less Robotic):** Your speech should sound human, fluid, and conversational, not like a robot or a list of facts.
+                  - Use common contractions (e.g., "I'm", "don't", "it's") and natural language.
+                  - Use conversational fillers (e.g., "Well...", "You know...", "Actually...", "I mean...").
+                  - Embody the persona's personality in your response; don't just recite facts from their profile.
+                  - Avoid overly formal, stilted language or sounding like an encyclopedia.
+
+                --- PERSONA PROFILE ---
+                - Name: {persona.get('name', 'N/A')}
+                - Age: {persona.get('age', 'N/A')}
+                - Department: {persona.get('department', 'N/A')}
+                - Life Story & Personality: {persona.get('narrative_persona', 'No details available.')}
+                """
+
+
+# Estilos de system instruction (o app escolhe o seu; o persona_service.py aceita qualquer um)
+SYSTEM_INSTRUCTIONS = {
+    "chat": system_instruction_chat,
+    "natural": system_instruction_natural,
+}
+
+
+class PromptPersona:
+    """System instruction pronta de uma persona."""
+
+    __slots__ = ("persona_id", "text", "key", "tokens")
+
+    def __init__(self, persona_id, text):
+        self.persona_id = persona_id
+        self.text = text
+        self.key = chave_persona(text)
+        self.tokens = estimar_tokens(text)
+
+
+class PromptCompiler:
+    """Monta e guarda a system instruction de cada persona (thread-safe)."""
+
+    def __init__(self, montar):
+        self._montar = montar
+        self._prompts = {}
+        self._lock = threading.Lock()
+
+    def compilar(self, persona) -> PromptPersona:
+        # Personas do PersonaStore já vêm com o "id": só as outras pagam o hash do conteúdo
+        persona_id = str(persona["id"]) if persona.get("id") else id_persona(persona)
+        with self._lock:
+            prompt = self._prompts.get(persona_id)
+        if prompt is None:
+            prompt = PromptPersona(persona_id, self._montar(persona))
+            with self._lock:
+                prompt = self._prompts.setdefault(persona_id, prompt)
+        return prompt
+
+    def __len__(self):
+        with self._lock:
+            return len(self._prompts)
+
+
+def _suporta_cache_de_contexto(model_name):
+    # Endpoints fine-tuned (projects/.../endpoints/...) não aceitam CachedContent
+    return "/endpoints/" not in model_name
+
+
+class ContextCache:
+    """
+    Modelos por (modelo, persona): do cache de contexto do servidor quando possível,
+    senão do pool local. O CachedContent é recriado antes de expirar.
+    """
+
+    def __init__(self, pool=None, min_tokens=CONTEXT_CACHE_MIN_TOKENS, ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+                 enabled=True):
+        self.pool = pool if pool is not None else get_model_pool()
+        self.min_tokens = min_tokens
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._models = {}  # (modelo, chave do prompt) -> (modelo do cache, criado em)
+        self._unsupported = set()
+        self._retry_at = {}  # (modelo, chave do prompt) -> quando tentar criar de novo após um erro transitório
+        self._creating = {}  # (modelo, chave do prompt) -> lock da criação (um CachedContent por chave)
+        self._lock = threading.Lock()
+        self.server_hits = 0
+        self.local_hits = 0
+
+    def _criar(self, model_name, prompt):
+        import datetime
+        from vertexai.preview import caching
+        from vertexai.preview.generative_models import GenerativeModel
+
+        cached = caching.CachedContent.create(
+            model_name=model_name,
+            system_instruction=prompt.text,
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+            display_name=f"persona-{prompt.key}",
+        )
+        logging.info(f"Cache de contexto criado para a persona {prompt.persona_id} em '{model_name}' ({prompt.tokens} tokens).")
+        return GenerativeModel.from_cached_content(cached_content=cached)
+
+    def _expirado(self, entry):
+        # Recria com folga antes do TTL do servidor
+        return entry is None or time.monotonic() - entry[1] > self.ttl_seconds * 0.9
+
+    def _modelo_do_servidor(self, model_name, prompt, key):
+        """Modelo do cache de contexto (criado uma única vez por chave, mesmo com turnos simultâneos) ou None."""
+        with self._lock:
+            entry = self._models.get(key)
+            if not self._expirado(entry):
+                return entry[0]
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        with creating:
+            with self._lock:
+                entry = self._models.get(key)
+                if not self._expirado(entry):
+                    return entry[0]
+                if key in self._unsupported or time.monotonic() < self._retry_at.get(key, 0.0):
+                    return None
+            try:
+                model = self._criar(model_name, prompt)
+            except Exception as e:
+                from google.api_core import exceptions as api_exceptions
+
+                with self._lock:
+                    if isinstance(e, (api_exceptions.InvalidArgument, api_exceptions.NotFound)):
+                        # O modelo não aceita cache de contexto: não adianta tentar de novo
+                        self._unsupported.add(key)
+                    else:
+                        self._retry_at[key] = time.monotonic() + CONTEXT_CACHE_RETRY_SECONDS
+                logging.warning(f"Cache de contexto indisponível para '{model_name}', usando o prompt local: {e}")
+                return None
+            with self._lock:
+                self._models[key] = (model, time.monotonic())
+                self._retry_at.pop(key, None)
+            return model
+
+    def modelo(self, model_name, prompt):
+        key = (model_name, prompt.key)
+        if (self.enabled and prompt.tokens >= self.min_tokens and _suporta_cache_de_contexto(model_name)
+                and key not in self._unsupported):
+            model = self._modelo_do_servidor(model_name, prompt, key)
+            if model is not None:
+                self.server_hits += 1
+                return model
+
+        self.local_hits += 1
+        return self.pool.get(model_name, prompt.text, persona_key=prompt.key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "server_models": len(self._models),
+                "unsupported": len(self._unsupported),
+                "server_hits": self.server_hits,
+                "local_hits": self.local_hits,
+            }
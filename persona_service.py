@@ -0,0 +1,504 @@
+"""
+Serviço HTTP (ASGI, asyncio) de geração das personas.
+
+Tira as chamadas ao modelo de dentro do script do Streamlit: o app passa a ser
+só a interface (persona_api.py) e este processo atende todas as sessões com um
+único ResilientClient (pool de modelos, cache de contexto, circuit breakers),
+limitando quantas chamadas cada endpoint recebe ao mesmo tempo. Como tudo é
+asyncio (generate_content_async em streaming), um processo aguenta centenas de
+conversas simultâneas sem uma thread por conversa.
+
+Rotas:
+    GET  /health                    estado dos circuitos, sessões, limites e caches (pool de modelos, contexto)
+    GET  /metrics                   métricas no formato Prometheus (telemetry.py)
+    GET  /metrics/summary           resumo por (endpoint, persona) em JSON, para a página de admin
+    GET  /personas?cluster=&department=&age_min=&age_max=&text=&limit=&offset=
+    GET  /personas/filters          valores dos filtros (clusters, departamentos, idades)
+    GET  /personas/{id}
+    POST /chat    {"persona_id", "messages": [{"role", "content"}], "offset"?, "session_id"?, "style"?, "generation"?}
+    POST /batch   {"persona_ids": [...], "prompt", "style"?, "generation"?}
+
+No /chat, "offset" é a posição da primeira mensagem enviada na conversa: o app
+manda só o que ainda tem em memória (HistoricoSessao) e o histórico da sessão
+segue contando as mensagens desde o início.
+
+/chat e /batch respondem em Server-Sent Events: "chunk" ({"text"}), "done"
+({"model", "fallback", "cached"}) ou "error" ({"error"}); no /batch cada
+evento leva também o "index" da persona.
+
+Para rodar (requer uvicorn):
+    python persona_service.py --port 8000
+    python persona_service.py --port 8000 --stub-url http://127.0.0.1:8808   # contra o fake_vertex.py
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import os
+import sqlite3
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_history import HistoryManager, JanelaMensagens, criar_sumarizador, para_conteudo_vertex
+from endpoints import PROJECT_ID, REGION, endpoint_do_cluster
+from persona_prompts import ContextCache, PromptCompiler, SYSTEM_INSTRUCTIONS
+from persona_store import DEFAULT_DB_PATH, PERSONAS_FILE, PersonaStore
+from resilient_client import DEFAULT_FALLBACK_MODEL, ResilientClient
+from response_cache import ResponseCache, chave_resposta, usar_cache
+from telemetry import registry
+
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_STYLE = "chat"
+DEFAULT_GENERATION_VALUES = dict(temperature=0.8, max_output_tokens=2048, top_k=50)
+# Parâmetros de geração que o cliente pode mandar no pedido
+GENERATION_FIELDS = {"temperature", "max_output_tokens", "top_k", "top_p", "presence_penalty", "frequency_penalty"}
+
+# Chamadas simultâneas por endpoint (as demais esperam na fila do processo)
+ENDPOINT_CONCURRENCY = int(os.environ.get("PERSONAS_ENDPOINT_CONCURRENCY", 64))
+# Históricos de conversa mantidos em memória (LRU por session_id)
+MAX_SESSIONS = 10000
+MAX_BATCH_PERSONAS = 50
+MAX_BODY_BYTES = 1024 * 1024
+# Threads para o que ainda é bloqueante (SQLite, resumo do histórico, criação do cache de contexto)
+BLOCKING_WORKERS = 64
+
+
+class RequisicaoInvalida(Exception):
+    """Pedido mal formado: vira uma resposta 4xx com a mensagem."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class EndpointLimiter:
+    """Um semáforo por endpoint: no máximo 'limit' chamadas em andamento para cada um."""
+
+    def __init__(self, limit=ENDPOINT_CONCURRENCY):
+        self.limit = limit
+        self._semaphores = {}
+        self.in_flight = {}
+        self.waiting = {}
+
+    @contextlib.asynccontextmanager
+    async def limite(self, endpoint):
+        semaphore = self._semaphores.setdefault(endpoint, asyncio.Semaphore(self.limit))
+        self.waiting[endpoint] = self.waiting.get(endpoint, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[endpoint] -= 1
+        self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+        try:
+            yield
+        finally:
+            self.in_flight[endpoint] -= 1
+            semaphore.release()
+
+    def estado(self) -> dict:
+        return {endpoint: {"in_flight": self.in_flight.get(endpoint, 0), "waiting": self.waiting.get(endpoint, 0)}
+                for endpoint in self._semaphores}
+
+
+# --- HTTP (ASGI) ---
+
+async def _ler_corpo(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ConnectionResetError("Cliente desconectou")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise RequisicaoInvalida("Corpo do pedido muito grande.", status=413)
+        if not message.get("more_body"):
+            break
+    if not body:
+        return {}
+    try:
+        body = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequisicaoInvalida(f"JSON inválido: {e}")
+    if not isinstance(body, dict):
+        raise RequisicaoInvalida("O corpo do pedido deve ser um objeto JSON.")
+    return body
+
+
+async def _responder(send, status, payload, content_type="application/json"):
+    if content_type == "application/json":
+        payload = json.dumps(payload, ensure_ascii=False)
+    body = payload.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class EventStream:
+    """Resposta em Server-Sent Events."""
+
+    def __init__(self, send):
+        self._send = send
+
+    async def abrir(self):
+        await self._send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no")],
+        })
+
+    async def evento(self, kind, data):
+        payload = f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        await self._send({"type": "http.response.body", "body": payload.encode("utf-8"), "more_body": True})
+
+    async def fechar(self):
+        await self._send({"type": "http.response.body", "body": b""})
+
+
+async def _esperar_desconexao(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _inteiro(query, name, default=None):
+    value = query.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RequisicaoInvalida(f"'{name}' deve ser um inteiro.")
+
+
+def _texto_do_chunk(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks finais podem vir sem texto (apenas metadados)
+        return ""
+
+
+# --- SERVIÇO ---
+
+class PersonaService:
+    """Aplicação ASGI. Recebe o catálogo e o cliente prontos, para poder ser testada com fakes."""
+
+    def __init__(self, store, client, response_cache=None, endpoint_concurrency=ENDPOINT_CONCURRENCY,
+                 max_sessions=MAX_SESSIONS, endpoint_for=endpoint_do_cluster):
+        self.store = store
+        self.client = client
+        self.response_cache = response_cache
+        self.limiter = EndpointLimiter(endpoint_concurrency)
+        self.max_sessions = max_sessions
+        self.endpoint_for = endpoint_for
+        self.compilers = {style: PromptCompiler(montar) for style, montar in SYSTEM_INSTRUCTIONS.items()}
+        self._sessions = OrderedDict()
+
+    # --- ASGI ---
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        query = dict(urllib.parse.parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        try:
+            if method == "GET" and path == "/health":
+                await _responder(send, 200, self.saude())
+            elif method == "GET" and path == "/metrics":
+                await _responder(send, 200, registry.prometheus_text(), "text/plain; version=0.0.4")
+            elif method == "GET" and path == "/metrics/summary":
+                await _responder(send, 200, registry.resumo())
+            elif method == "GET" and path == "/personas":
+                await _responder(send, 200, await self.listar(query))
+            elif method == "GET" and path == "/personas/filters":
+                await _responder(send, 200, await self.filtros())
+            elif method == "GET" and path.startswith("/personas/"):
+                persona = await asyncio.to_thread(self.store.get, urllib.parse.unquote(path[len("/personas/"):]))
+                if persona is None:
+                    raise RequisicaoInvalida("Persona não encontrada.", status=404)
+                await _responder(send, 200, persona)
+            elif method == "POST" and path == "/chat":
+                await self.chat(await _ler_corpo(receive), receive, send)
+            elif method == "POST" and path == "/batch":
+                await self.batch(await _ler_corpo(receive), receive, send)
+            else:
+                await _responder(send, 404, {"error": f"Rota não encontrada: {method} {path}"})
+        except RequisicaoInvalida as e:
+            await _responder(send, e.status, {"error": str(e)})
+        except ConnectionResetError:
+            pass
+        except sqlite3.Error as e:
+            logging.error(f"Erro no catálogo de personas: {e}")
+            await _responder(send, 500, {"error": str(e)})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # As chamadas bloqueantes que sobram vão para um pool maior que o padrão do asyncio
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="persona-service")
+                )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- PERSONAS ---
+
+    def saude(self) -> dict:
+        return {
+            "status": "ok",
+            "personas": len(self.store),
+            "sessions": len(self._sessions),
+            "circuits": self.client.estado(),
+            "in_flight": self.limiter.estado(),
+            "caches": registry.caches(),
+        }
+
+    async def listar(self, query):
+        filters = dict(
+            cluster=query.get("cluster") or None,
+            department=query.get("department") or None,
+            age_min=_inteiro(query, "age_min"),
+            age_max=_inteiro(query, "age_max"),
+            text=query.get("text") or None,
+            limit=min(_inteiro(query, "limit", 20), 200),
+            offset=_inteiro(query, "offset", 0),
+        )
+        rows, total = await asyncio.to_thread(self.store.buscar, **filters)
+        return {"items": rows, "total": total}
+
+    async def filtros(self):
+        def ler():
+            age_min, age_max = self.store.faixa_idade()
+            return {
+                "Cluster": self.store.valores("Cluster"),
+                "department": self.store.valores("department"),
+                "age": [age_min, age_max],
+                "count": len(self.store),
+            }
+        return await asyncio.to_thread(ler)
+
+    # --- GERAÇÃO ---
+
+    def _historico(self, session_id):
+        """HistoryManager da sessão (LRU); sem session_id o histórico não é resumido entre turnos."""
+        if not session_id:
+            return HistoryManager()
+        history = self._sessions.get(session_id)
+        if history is None:
+            history = self._sessions[session_id] = HistoryManager()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return history
+
+    def _preparar(self, body):
+        """Valida estilo e parâmetros de geração do pedido."""
+        style = body.get("style") or DEFAULT_STYLE
+        if style not in self.compilers:
+            raise RequisicaoInvalida(f"Estilo desconhecido: {style!r} (use um de {sorted(self.compilers)}).")
+        generation = body.get("generation") or DEFAULT_GENERATION_VALUES
+        if not isinstance(generation, dict) or set(generation) - GENERATION_FIELDS:
+            raise RequisicaoInvalida(f"'generation' aceita apenas {sorted(GENERATION_FIELDS)}.")
+        return style, dict(generation)
+
+    async def gerar(self, persona, messages, style, generation, session_id=None):
+        """
+        Responde à última mensagem (do usuário) como a persona. Gera ("chunk", texto)
+        e termina com ("done", {"model", "fallback", "cached"}); erros são levantados.
+        """
+        name = persona.get("name")
+        prompt = self.compilers[style].compilar(persona)
+        endpoint_path = self.endpoint_for(persona.get("Cluster"))
+        model_path = endpoint_path or self.client.fallback_model
+        if model_path is None:
+            raise RequisicaoInvalida(f"Sem endpoint para o cluster '{persona.get('Cluster')}' e sem fallback.", status=503)
+
+        if session_id:
+            # Histórico dentro do orçamento de tokens (turnos antigos viram um resumo feito pelo endpoint)
+            def montar_historico():
+                summarizer = criar_sumarizador(self.client.modelo(model_path, prompt), endpoint=model_path, persona=name)
+                return self._historico(session_id).build_contents(messages, summarizer=summarizer)
+            contents = await asyncio.to_thread(montar_historico)
+        else:
+            contents = para_conteudo_vertex(messages)
+
+        cache_key = None
+        if self.response_cache is not None and usar_cache(persona):
+            cache_key = chave_resposta(model_path, prompt.key, contents, generation)
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                yield "chunk", cached
+                yield "done", {"model": model_path, "fallback": False, "cached": True}
+                return
+
+        async with self.limiter.limite(model_path):
+            model_used, responses = await self.client.generate_async(
+                endpoint_path, prompt, contents, generation_config=generation, persona=name
+            )
+            parts = []
+            try:
+                async for chunk in responses:
+                    text = _texto_do_chunk(chunk)
+                    if text:
+                        parts.append(text)
+                        yield "chunk", text
+            finally:
+                await responses.aclose()
+
+        answer = "".join(parts).strip()
+        # Respostas do fallback não entram no cache do endpoint fine-tuned
+        if cache_key is not None and answer and model_used == model_path:
+            await asyncio.to_thread(self.response_cache.set, cache_key, answer)
+        yield "done", {"model": model_used, "fallback": model_used != model_path, "cached": False}
+
+    async def _com_desconexao(self, receive, work):
+        """Roda 'work' até terminar ou o cliente desconectar (aí a geração é cancelada)."""
+        watcher = asyncio.ensure_future(_esperar_desconexao(receive))
+        task = asyncio.ensure_future(work)
+        try:
+            await asyncio.wait({watcher, task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pending in (watcher, task):
+                pending.cancel()
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+    async def chat(self, body, receive, send):
+        messages = body.get("messages")
+        if (not isinstance(messages, list) or not messages
+                or not all(isinstance(m, dict) and {"role", "content"} <= set(m) for m in messages)):
+            raise RequisicaoInvalida("'messages' deve ser uma lista de {'role', 'content'}.")
+        if messages[-1]["role"] != "user":
+            raise RequisicaoInvalida("A última mensagem deve ser do usuário.")
+        offset = body.get("offset") or 0
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise RequisicaoInvalida("'offset' deve ser um inteiro >= 0.")
+        messages = JanelaMensagens(messages, primeiro=offset)
+        style, generation = self._preparar(body)
+        persona = await asyncio.to_thread(self.store.get, str(body.get("persona_id")))
+        if persona is None:
+            raise RequisicaoInvalida("Persona não encontrada.", status=404)
+
+        stream = EventStream(send)
+        await stream.abrir()
+
+        async def responder():
+            try:
+                async for kind, data in self.gerar(persona, messages, style, generation, body.get("session_id")):
+                    await stream.evento(kind, {"text": data} if kind == "chunk" else data)
+            except Exception as e:
+                logging.error(f"[{persona.get('name')}] Erro na geração: {e}")
+                await stream.evento("error", {"error": f"{e.__class__.__name__}: {e}"})
+
+        await self._com_desconexao(receive, responder())
+        await stream.fechar()
+
+    async def batch(self, body, receive, send):
+        persona_ids = body.get("persona_ids")
+        prompt = body.get("prompt")
+        if not isinstance(persona_ids, list) or not persona_ids or len(persona_ids) > MAX_BATCH_PERSONAS:
+            raise RequisicaoInvalida(f"'persona_ids' deve ter de 1 a {MAX_BATCH_PERSONAS} IDs.")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise RequisicaoInvalida("'prompt' deve ser um texto não vazio.")
+        style, generation = self._preparar(body)
+        personas = await asyncio.to_thread(lambda: [self.store.get(str(pid)) for pid in persona_ids])
+
+        stream = EventStream(send)
+        await stream.abrir()
+        events = asyncio.Queue()
+        messages = [{"role": "user", "content": prompt}]
+
+        async def responder(index, persona):
+            try:
+                if persona is None:
+                    raise RequisicaoInvalida("Persona não encontrada.", status=404)
+                async for kind, data in self.gerar(persona, messages, style, generation):
+                    await events.put((kind, {"index": index, **({"text": data} if kind == "chunk" else data)}))
+            except Exception as e:
+                await events.put(("error", {"index": index, "error": f"{e.__class__.__name__}: {e}"}))
+
+        async def encaminhar():
+            # Todas as personas respondem ao mesmo tempo; os eventos saem na ordem em que chegam
+            tasks = [asyncio.ensure_future(responder(i, p)) for i, p in enumerate(personas)]
+            try:
+                pending = len(tasks)
+                while pending:
+                    kind, data = await events.get()
+                    if kind != "chunk":
+                        pending -= 1
+                    await stream.evento(kind, data)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        await self._com_desconexao(receive, encaminhar())
+        await stream.fechar()
+
+
+def criar_app(stub_url=None, db_path=DEFAULT_DB_PATH, personas_file=PERSONAS_FILE,
+              fallback_model=DEFAULT_FALLBACK_MODEL, endpoint_concurrency=ENDPOINT_CONCURRENCY,
+              response_cache=True, context_cache=True):
+    """Monta o serviço com o Vertex AI de verdade ou, com 'stub_url', com um servidor fake (fake_vertex.py)."""
+    if stub_url:
+        from fake_vertex_client import FakeVertexModel
+        from vertex_pool import ModelPool
+
+        client = ResilientClient(
+            fallback_model=fallback_model,
+            pool=ModelPool(factory=functools.partial(FakeVertexModel, base_url=stub_url)),
+        )
+    else:
+        import vertexai
+
+        vertexai.init(project=PROJECT_ID, location=REGION)
+        client = ResilientClient(fallback_model=fallback_model, context_cache=ContextCache(enabled=context_cache))
+
+    return PersonaService(
+        store=PersonaStore(db_path=db_path, source=personas_file),
+        client=client,
+        response_cache=ResponseCache() if response_cache else None,
+        endpoint_concurrency=endpoint_concurrency,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP (ASGI + SSE) de conversa com as personas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-url", default=None, help="URL de um servidor fake (ex.: fake_vertex.py) no lugar do Vertex AI.")
+    parser.add_argument("--personas", default=PERSONAS_FILE, help="Arquivo JSON de personas.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Catálogo SQLite das personas.")
+    parser.add_argument("--fallback-model", default=DEFAULT_FALLBACK_MODEL, help="Modelo base de fallback ('' desliga).")
+    parser.add_argument("--endpoint-concurrency", type=int, default=ENDPOINT_CONCURRENCY,
+                        help="Chamadas simultâneas por endpoint.")
+    parser.add_argument("--no-response-cache", action="store_true", help="Não usa o cache de respostas.")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = criar_app(
+        stub_url=args.stub_url, db_path=args.db, personas_file=args.personas,
+        fallback_model=args.fallback_model or None, endpoint_concurrency=args.endpoint_concurrency,
+        response_cache=not args.no_response_cache,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Catálogo de personas em SQLite, com busca e filtros.
+
+O JSON gerado pelo generate_personas.py continua sendo a fonte: o arquivo é
+espelhado no banco sempre que muda (tamanho/mtime diferentes). Cada persona
+ganha um ID estável (o campo "id", se existir, ou o hash do conteúdo), então
+nomes repetidos deixam de ser um problema. As consultas usam índices em
+Cluster, department e age e busca de texto (FTS5) na narrative_persona, e o app
+só lê a página que está na tela: o custo não cresce com o tamanho do catálogo.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from persona_prompts import id_persona
+
+
+PERSONAS_FILE = "json/personas_gemini.json"
+DEFAULT_DB_PATH = "cache/personas.sqlite"
+
+_COLUMNS = ("persona_id", "name", "Cluster", "department", "age", "narrative_persona")
+
+
+def _fts_disponivel(db):
+    try:
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts_check USING fts5(x)")
+        db.execute("DROP TABLE temp._fts_check")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _consulta_fts(text):
+    """Transforma o texto digitado em uma consulta FTS5 (todas as palavras, como prefixo)."""
+    words = [w.replace('"', "") for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words if w)
+
+
+class PersonaStore:
+    """Repositório de personas (thread-safe, uma conexão compartilhada pelo processo)."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, source=PERSONAS_FILE):
+        self.source = source
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.fts = _fts_disponivel(self._db)
+
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS personas ("
+            " rowid INTEGER PRIMARY KEY, persona_id TEXT NOT NULL UNIQUE, position INTEGER NOT NULL,"
+            " name TEXT, Cluster TEXT, department TEXT, age INTEGER, narrative_persona TEXT,"
+            " data TEXT NOT NULL)"
+        )
+        for column in ("Cluster", "department", "age"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_personas_{column.lower()} ON personas({column})")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if self.fts:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS personas_fts USING fts5("
+                " name, narrative_persona, content='personas', content_rowid='rowid')"
+            )
+        self._db.commit()
+        if source:
+            self.sincronizar()
+
+    # --- IMPORTAÇÃO ---
+
+    def sincronizar(self, force=False):
+        """Espelha o arquivo JSON no banco se ele mudou desde a última importação."""
+        if not os.path.exists(self.source):
+            logging.warning(f"Arquivo de personas '{self.source}' não encontrado.")
+            return False
+        stat = os.stat(self.source)
+        signature = f"{os.path.abspath(self.source)}:{stat.st_size}:{stat.st_mtime_ns}"
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        if not force and row is not None and row[0] == signature:
+            return False
+
+        with open(self.source, "r", encoding="utf-8") as f:
+            personas = json.load(f)
+        self.importar(personas)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (signature,))
+            self._db.commit()
+        logging.info(f"{len(personas)} personas importadas de '{self.source}'.")
+        return True
+
+    def importar(self, personas):
+        """Substitui o catálogo pelas personas dadas (mantém a ordem do arquivo)."""
+        rows = []
+        for position, persona in enumerate(personas):
+            age = persona.get("age")
+            rows.append((
+                id_persona(persona), position, persona.get("name"),
+                persona.get("Cluster"), persona.get("department"),
+                age if isinstance(age, int) else None, persona.get("narrative_persona"),
+                json.dumps(persona, ensure_ascii=False),
+            ))
+        with self._lock:
+            self._db.execute("DELETE FROM personas")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO personas (persona_id, position, name, Cluster, department, age,"
+                " narrative_persona, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            if self.fts:
+                self._db.execute("INSERT INTO personas_fts(personas_fts) VALUES ('rebuild')")
+            self._db.commit()
+
+    # --- CONSULTAS ---
+
+    def get(self, persona_id):
+        """Persona completa (dict, com o campo 'id') ou None."""
+        with self._lock:
+            row = self._db.execute("SELECT persona_id, data FROM personas WHERE persona_id = ?",
+                                   (persona_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row["persona_id"], **json.loads(row["data"])}
+
+    def _filtros(self, cluster=None, department=None, age_min=None, age_max=None, text=None):
+        where, params = [], []
+        if cluster:
+            where.append("p.Cluster = ?")
+            params.append(cluster)
+        if department:
+            where.append("p.department = ?")
+            params.append(department)
+        if age_min is not None:
+            where.append("p.age >= ?")
+            params.append(age_min)
+        if age_max is not None:
+            where.append("p.age <= ?")
+            params.append(age_max)
+        if text and text.strip():
+            if self.fts:
+                where.append("p.rowid IN (SELECT rowid FROM personas_fts WHERE personas_fts MATCH ?)")
+                params.append(_consulta_fts(text))
+            else:
+                where.append("(p.narrative_persona LIKE ? OR p.name LIKE ?)")
+                params.extend([f"%{text.strip()}%"] * 2)
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def buscar(self, cluster=None, department=None, age_min=None, age_max=None, text=None, limit=20, offset=0):
+        """
+        Uma página de personas (sem a narrativa completa) e o total que atende aos filtros.
+        Retorna (lista de dicts, total).
+        """
+        where, params = self._filtros(cluster, department, age_min, age_max, text)
+        columns = ", ".join(f"p.{c}" for c in _COLUMNS if c != "narrative_persona")
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM personas p{where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {columns} FROM personas p{where} ORDER BY p.position LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def valores(self, column):
+        """Valores distintos de Cluster ou department (para os filtros da tela)."""
+        if column not in ("Cluster", "department"):
+            raise ValueError(f"Coluna sem filtro: {column}")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT DISTINCT {column} FROM personas WHERE {column} IS NOT NULL ORDER BY {column}"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def faixa_idade(self):
+        with self._lock:
+            return tuple(self._db.execute("SELECT MIN(age), MAX(age) FROM personas").fetchone())
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM personas").fetchone()[0]
@@ -1,11 +1,20 @@
 import streamlit as st
 import json
-import vertexai
-from vertexai.generative_models import GenerativeModel, GenerationConfig
 import os 
 import logging 
-from google.oauth2 import service_account 
-from google.auth import exceptions as auth_exceptions
+import math
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from chat_history import HistoryManager, HistoricoSessao, TranscriptStore, criar_sumarizador
+from response_cache import ResponseCache, chave_resposta, usar_cache
+from telemetry import registry, iniciar_servidor_metricas
+from panel import montar_tarefa, perguntar_ao_painel, CHUNK, DONE
+from resilient_client import ResilientClient, DEFAULT_FALLBACK_MODEL
+from persona_prompts import PromptCompiler, ContextCache, SYSTEM_INSTRUCTIONS
+from persona_store import PersonaStore
+from persona_api import PersonaApi, ApiError
+from endpoints import PROJECT_ID, REGION, endpoint_do_cluster
 
 
 
@@ -19,7 +28,11 @@ def setup_authentication():
     Tenta, em ordem:
     1. Chave JSON (para Streamlit Community Cloud)
     2. ADC (para execução local)
+    Roda na thread de aquecimento do SDK: erros viram exceções (mostradas no primeiro turno de chat).
     """
+    from google.auth import exceptions as auth_exceptions
+    from google.oauth2 import service_account
+
     credentials = None
     
     # Método 1: Chave JSON (para Streamlit Community Cloud)
@@ -38,8 +51,7 @@ def setup_authentication():
         logging.info("Secrets.toml não encontrado, continuando para ADC local.")
     except Exception as e:
         # Outro erro ao carregar as credenciais
-        st.error(f"Erro ao carregar credenciais JSON do Streamlit Secrets: {e}")
-        st.stop()
+        raise RuntimeError(f"Erro ao carregar credenciais JSON do Streamlit Secrets: {e}") from e
 
     # Método 2: Local (Application Default Credentials)
     logging.info("Configurando para Application Default Credentials (local)...")
@@ -48,197 +60,585 @@ def setup_authentication():
         from google.auth import default
         default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
         logging.info("Credenciais ADC locais encontradas.")
-    except auth_exceptions.DefaultCredentialsError:
-        st.error("Autenticação local não encontrada. Rode 'gcloud auth application-default login' no seu terminal.")
-        st.stop()
+    except auth_exceptions.DefaultCredentialsError as e:
+        raise RuntimeError("Autenticação local não encontrada. Rode 'gcloud auth application-default login' no seu terminal.") from e
     
     # Retorna None, pois o vertexai.init() encontrará o ADC sozinho
     return None
 
 
 
-# --- Constantes do Projeto ---
-PROJECT_ID = "syntheticpersonasfinetuning"
-PROJECT_NUMBER = "541997184461"
-REGION = "us-central1"
+# Catálogo de personas: o JSON é espelhado em um SQLite com índices e busca de texto
+PERSONAS_FILE = "json/personas_gemini.json"
+PERSONA_DB_PATH = "cache/personas.sqlite"
+PERSONA_PAGE_SIZE = 20
 
+# Orçamento de tokens do histórico enviado a cada turno
+HISTORY_TOKEN_BUDGET = 6000
+HISTORY_KEEP_LAST_TURNS = 6
 
-ENDPOINT_MAP = {
-    "Security_Seeker": "6954726605520371712" # Exemplo: ID da "Eleanor"
-}
+# Estado por sessão limitado: as mensagens ficam num buffer circular e as mais antigas
+# vão para a transcrição em SQLite; a sessão guarda só o ID da persona
+SESSION_MAX_MESSAGES = 64
+TRANSCRIPT_PATH = "cache/transcripts.sqlite"
+PERSONA_CACHE_SIZE = 512
 
+# Cache de respostas para perguntas repetidas (memória + SQLite)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_PATH = "cache/responses.sqlite"
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600
 
-# Pega as credenciais (será as credenciais JSON no Streamlit, ou None localmente)
-vertex_credentials = setup_authentication()
+# Telemetria das chamadas ao endpoint (arquivo rotativo + /metrics opcional no formato Prometheus)
+METRICS_CALLS_FILE = "metrics/calls.jsonl"
+METRICS_PORT = os.environ.get("PERSONAS_METRICS_PORT")
 
-# Inicializa o Vertex AI
-try:
-    if "vertex_init" not in st.session_state:
-        
-       
-        # Passa as credenciais explicitamente se elas vieram do Streamlit Secrets
-        if vertex_credentials:
-            vertexai.init(project=PROJECT_ID, location=REGION, credentials=vertex_credentials)
-        else:
-            # Deixa o init() encontrar as credenciais locais (ADC)
-            vertexai.init(project=PROJECT_ID, location=REGION)
-     
-        
-        st.session_state.vertex_init = True
-        logging.info("Vertex AI inicializado com sucesso.")
+# Parâmetros de geração das respostas das personas (chat e painel)
+GENERATION_VALUES = dict(
+    temperature=0.85, 
+    max_output_tokens=2048,
+    #top_k=60,
+    top_p = 0.95,
+    presence_penalty = 0.5
+)
+
+# Modo painel: quantas colunas por linha na comparação lado a lado
+PANEL_MAX_COLUMNS = 4
+# Rodadas do painel mantidas na sessão (as mais antigas saem da tela)
+PANEL_MAX_ROUNDS = 20
+
+# Cliente resiliente: prazo e retries por chamada, hedge no p95 e fallback para um modelo base
+# (PERSONAS_FALLBACK_MODEL="" desliga o fallback)
+FALLBACK_MODEL = os.environ.get("PERSONAS_FALLBACK_MODEL", DEFAULT_FALLBACK_MODEL) or None
+CALL_DEADLINE_SECONDS = 60
+CALL_MAX_RETRIES = 3
+HEDGE_ENABLED = True
+
+# System instructions compiladas uma vez por persona; cache de contexto no servidor quando suportado
+CONTEXT_CACHE_ENABLED = True
+
+# Serviço de geração (persona_service.py): com PERSONAS_API_URL o app só desenha a tela, e catálogo,
+# histórico, cache e chamadas ao modelo ficam no serviço (compartilhado por todas as sessões)
+PERSONAS_API_URL = os.environ.get("PERSONAS_API_URL")
+# Estilo da system instruction deste app (persona_prompts.SYSTEM_INSTRUCTIONS)
+PROMPT_STYLE = "natural"
+
+
+def _inicializar_vertexai():
+    """
+    Importa o SDK, autentica e inicializa o Vertex AI. Roda uma vez por processo,
+    numa thread (aquecer_vertexai), enquanto a tela de seleção já aparece para o usuário.
+    """
+    import vertexai
+
+    # Pega as credenciais (será as credenciais JSON no Streamlit, ou None localmente)
+    vertex_credentials = setup_authentication()
+
+    # Passa as credenciais explicitamente se elas vieram do Streamlit Secrets
+    if vertex_credentials:
+        vertexai.init(project=PROJECT_ID, location=REGION, credentials=vertex_credentials)
+    else:
+        # Deixa o init() encontrar as credenciais locais (ADC)
+        vertexai.init(project=PROJECT_ID, location=REGION)
+
+    logging.info("Vertex AI inicializado com sucesso.")
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def aquecer_vertexai():
+    """
+    Começa a carregar o SDK do Vertex AI (leva segundos) numa thread, uma vez por processo.
+    Retorna o Future; quem precisa do modelo espera por ele em inicializar_vertexai().
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vertexai-init")
+    future = executor.submit(_inicializar_vertexai)
+    executor.shutdown(wait=False)
+    return future
+
+
+def inicializar_vertexai():
+    """Espera o aquecimento do SDK; se ele falhou, levanta o erro e a próxima chamada tenta de novo."""
+    try:
+        return aquecer_vertexai().result()
+    except Exception:
+        aquecer_vertexai.clear()
+        raise
 
-except Exception as e:
-    st.error(f"Erro ao inicializar Vertex AI: {e}")
-    st.session_state.vertex_init = False
-    st.stop()
 
+# O SDK do Vertex AI carrega em segundo plano: a tela de seleção aparece sem esperar por ele
+# e o primeiro turno de chat (ou pergunta ao painel) espera só o que faltar.
+# No modo serviço quem fala com o Vertex AI é o persona_service.py
+if not PERSONAS_API_URL:
+    aquecer_vertexai()
 
 
 
-def carregar_personas(filename="json/personas_gemini.json"):
-    """Carrega o arquivo JSON das personas."""
+
+@st.cache_resource(show_spinner=False)
+def get_persona_store():
+    """Catálogo de personas (SQLite) compartilhado pelo processo."""
+    return PersonaStore(db_path=PERSONA_DB_PATH, source=PERSONAS_FILE)
+
+
+def carregar_personas():
+    """Abre o catálogo de personas, reimportando o JSON apenas se ele mudou."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.error(f"Arquivo de personas não encontrado em '{filename}'. Verifique o caminho.")
-        return []
-    except json.JSONDecodeError:
-        st.error(f"Erro ao decodificar JSON de '{filename}'. O arquivo é válido?")
-        return []
+        store = get_persona_store()
+        store.sincronizar()
+        return store
+    except (OSError, ValueError, sqlite3.Error) as e:
+        st.error(f"Erro ao carregar as personas de '{PERSONAS_FILE}': {e}")
+        return None
+
+
+def stream_texto_resposta(responses):
+    """
+    Repassa os pedaços de texto de uma resposta em streaming do Vertex AI
+    e registra a finish_reason quando o stream termina.
+    """
+    finish_reason = None
+    usage = None
+    for chunk in responses:
+        if getattr(chunk, "usage_metadata", None):
+            usage = chunk.usage_metadata
+        try:
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                finish_reason = chunk.candidates[0].finish_reason
+        except Exception as e:
+            logging.warning(f"Não foi possível obter o finish_reason do chunk: {e}")
+
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks finais podem vir sem texto (apenas metadados)
+            continue
+        if text:
+            yield text
+
+    if finish_reason is not None:
+        logging.info(f"Resposta gerada. Finish Reason: {finish_reason.name}")
+        if finish_reason.name == "MAX_TOKENS":
+            logging.warning("A RESPOSTA FOI CORTADA! 'max_output_tokens' ainda é muito baixo.")
+    else:
+        logging.warning("Não foi possível obter o finish_reason da resposta.")
+
+    if usage is not None:
+        logging.info(
+            f"Tokens do turno: prompt={usage.prompt_token_count}, "
+            f"resposta={usage.candidates_token_count}"
+        )
+
+
+def caminho_endpoint_persona(persona):
+    """Caminho completo do endpoint fine-tuned do cluster da persona (ou None)."""
+    return endpoint_do_cluster(persona.get('Cluster', 'N/A'))
+
+
+# System instruction no estilo deste app (o mesmo texto usado pelo persona_service.py)
+montar_system_instruction = SYSTEM_INSTRUCTIONS[PROMPT_STYLE]
+
+
+def colunas_painel(n):
+    """Cria n colunas lado a lado, quebrando em linhas de PANEL_MAX_COLUMNS."""
+    columns = []
+    for _ in range(0, n, PANEL_MAX_COLUMNS):
+        columns.extend(st.columns(min(PANEL_MAX_COLUMNS, n)))
+    return columns[:n]
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_telemetria():
+    """Ativa a gravação das métricas uma única vez por processo."""
+    registry.ativar_arquivo(METRICS_CALLS_FILE)
+    if METRICS_PORT:
+        iniciar_servidor_metricas(int(METRICS_PORT))
+    return registry
+
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """Cliente resiliente compartilhado por todas as sessões (circuit breakers por endpoint)."""
+    return ResilientClient(
+        fallback_model=FALLBACK_MODEL,
+        deadline_s=CALL_DEADLINE_SECONDS,
+        max_retries=CALL_MAX_RETRIES,
+        hedge=HEDGE_ENABLED,
+        context_cache=ContextCache(enabled=CONTEXT_CACHE_ENABLED)
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_prompt_compiler():
+    """System instructions já montadas de cada persona, compartilhadas pelo processo."""
+    return PromptCompiler(montar_system_instruction)
+
+
+@st.cache_resource(show_spinner=False)
+def get_api():
+    """Cliente do persona_service.py compartilhado pelo processo (None sem PERSONAS_API_URL)."""
+    return PersonaApi(PERSONAS_API_URL) if PERSONAS_API_URL else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Cache de respostas compartilhado por todas as sessões do processo."""
+    return ResponseCache(db_path=RESPONSE_CACHE_PATH, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_transcript_store():
+    """Transcrição das conversas (mensagens que saíram do buffer das sessões), compartilhada pelo processo."""
+    return TranscriptStore(db_path=TRANSCRIPT_PATH)
+
+
+@st.cache_resource(show_spinner=False, max_entries=PERSONA_CACHE_SIZE)
+def obter_persona(_store, persona_id):
+    """Persona pelo ID, compartilhada (só leitura) entre as sessões: a sessão guarda só o ID."""
+    return _store.get(persona_id)
+
+
+def nova_conversa():
+    """Começa uma conversa vazia: novo chat_id, buffer de mensagens novo e histórico zerado."""
+    st.session_state.chat_id = uuid.uuid4().hex  # identifica o histórico da conversa no serviço
+    st.session_state.messages = HistoricoSessao(
+        capacity=SESSION_MAX_MESSAGES,
+        transcript=get_transcript_store(),
+        session_id=st.session_state.chat_id
+    )
+    if "history" in st.session_state:
+        st.session_state.history.reset()
 
 
 # --- LÓGICA DO APLICATIVO STREAMLIT (FRONTEND) ---
 
+iniciar_telemetria()
+
 st.set_page_config(page_title="Persona Chatbot (Vertex AI)", page_icon="👤")
 
-if st.session_state.get("vertex_init", False):
-    personas = carregar_personas()
+api = get_api()
+if api is not None:
+    store = api.store
+    try:
+        len(store)
+    except ApiError as e:
+        st.error(f"Erro ao carregar as personas do serviço: {e}")
+        st.stop()
 else:
-    personas = []
-    st.warning("Vertex AI falhou ao inicializar. Não é possível carregar personas.")
-    st.stop() 
-
-if "selected_persona" not in st.session_state:
-    st.session_state.selected_persona = None
+    store = carregar_personas()
+
+if "persona_id" not in st.session_state:
+    st.session_state.persona_id = None
+if "history" not in st.session_state:
+    st.session_state.history = HistoryManager(
+        token_budget=HISTORY_TOKEN_BUDGET,
+        keep_last_turns=HISTORY_KEEP_LAST_TURNS
+    )
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    nova_conversa()
+if "last_error" not in st.session_state:
+    st.session_state.last_error = None
+if "persona_page" not in st.session_state:
+    st.session_state.persona_page = 0
+if "persona_filters" not in st.session_state:
+    st.session_state.persona_filters = None
+if "panel_personas" not in st.session_state:
+    st.session_state.panel_personas = []  # IDs das personas do modo painel
+if "panel_rounds" not in st.session_state:
+    st.session_state.panel_rounds = []
+
+# --- MODO PAINEL (mesma pergunta para várias personas) ---
+if st.session_state.panel_personas:
+    panel = [p for p in (obter_persona(store, i) for i in st.session_state.panel_personas) if p is not None]
+    st.title("Persona Panel 👥")
+    st.caption("Each question goes to every persona below at the same time.")
+
+    if st.button("← Back to Selection"):
+        st.session_state.panel_personas = []
+        st.session_state.panel_rounds = []
+        st.rerun()
+
+    for panel_round in st.session_state.panel_rounds:
+        with st.chat_message("user"):
+            st.markdown(panel_round["prompt"])
+        for column, p, answer in zip(colunas_painel(len(panel)), panel, panel_round["answers"]):
+            with column:
+                st.markdown(f"**{p.get('name', 'N/A')}**")
+                st.markdown(answer if answer is not None else "_No answer._")
+
+    if prompt := st.chat_input("What is your question for the panel?"):
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        placeholders = []
+        for column, p in zip(colunas_painel(len(panel)), panel):
+            with column:
+                st.markdown(f"**{p.get('name', 'N/A')}**")
+                st.caption(p.get('Cluster', 'N/A'))
+                placeholders.append(st.empty())
+
+        answers = [None] * len(panel)
+        cache_keys = {}
+        if api is not None:
+            # O serviço escolhe o endpoint, usa o cache e faz o fallback de cada persona
+            posicoes = list(range(len(panel)))
+            events = api.painel([p["id"] for p in panel], prompt, style=PROMPT_STYLE, generation=GENERATION_VALUES)
+        else:
+            try:
+                inicializar_vertexai()
+            except Exception as e:
+                st.error(f"Erro ao inicializar Vertex AI: {e}")
+                st.stop()
+
+            # Monta as chamadas na thread principal; respostas em cache não vão ao endpoint
+            tarefas, posicoes = [], []
+            response_cache = get_response_cache() if RESPONSE_CACHE_ENABLED else None
+            for i, p in enumerate(panel):
+                endpoint_path = caminho_endpoint_persona(p)
+                model_path = endpoint_path or FALLBACK_MODEL
+                if model_path is None:
+                    placeholders[i].error(f"Endpoint not found for Cluster: '{p.get('Cluster', 'N/A')}'.")
+                    continue
+                try:
+                    system_instruction = get_prompt_compiler().compilar(p)
+                    tarefa = montar_tarefa(p, endpoint_path, system_instruction, GENERATION_VALUES, prompt)
+                except Exception as e:
+                    placeholders[i].error(f"Error preparing the Vertex AI call: {e}")
+                    continue
+                if response_cache is not None and usar_cache(p):
+                    cache_keys[i] = chave_resposta(model_path, system_instruction.key, tarefa["contents"], GENERATION_VALUES)
+                    cached = response_cache.get(cache_keys[i])
+                    if cached is not None:
+                        answers[i] = cached
+                        placeholders[i].markdown(cached)
+                        continue
+                tarefas.append(tarefa)
+                posicoes.append(i)
+            events = perguntar_ao_painel(tarefas, get_client())
+
+        # Todas as personas respondem em paralelo; cada chunk vai para a coluna da sua persona
+        partial = {i: "" for i in posicoes}
+        for index, kind, payload in events:
+            i = posicoes[index]
+            if kind == CHUNK:
+                partial[i] += payload
+                placeholders[i].markdown(partial[i] + "▌")
+            elif kind == DONE:
+                # payload = modelo que respondeu (o endpoint da persona ou o fallback)
+                answers[i] = partial[i].strip()
+                placeholders[i].markdown(answers[i])
+                if i in cache_keys and answers[i] and payload == (caminho_endpoint_persona(panel[i]) or FALLBACK_MODEL):
+                    response_cache.set(cache_keys[i], answers[i])
+            else:
+                placeholders[i].error(f"Error calling Vertex AI endpoint: {payload}")
+
+        st.session_state.panel_rounds.append({"prompt": prompt, "answers": answers})
+        del st.session_state.panel_rounds[:-PANEL_MAX_ROUNDS]
 
 # --- TELA DE SELEÇÃO DE PERSONA ---
-if st.session_state.selected_persona is None:
+elif st.session_state.persona_id is None:
     st.title("Welcome to Persona Chat 🤖 (Vertex AI)")
     st.write("Select a persona to start chatting.")
 
-    if not personas:
+    if store is None or not len(store):
         st.warning("Nenhuma persona carregada. Não é possível continuar.")
     else:
-        persona_names = [p.get('name', f'Unnamed Persona {i}') for i, p in enumerate(personas)]
+        # Filtros viram consultas indexadas no SQLite; só a página atual é lida
+        col_cluster, col_department = st.columns(2)
+        cluster = col_cluster.selectbox("Cluster", ["All"] + store.valores("Cluster"))
+        department = col_department.selectbox("Department", ["All"] + store.valores("department"))
+        age_low, age_high = store.faixa_idade()
+        age_min = age_max = None
+        if age_low is not None and age_low < age_high:
+            age_min, age_max = st.slider("Age", age_low, age_high, (age_low, age_high))
+        search = st.text_input("Search life stories", placeholder="e.g. stability, startup, family")
+
+        filters = dict(
+            cluster=None if cluster == "All" else cluster,
+            department=None if department == "All" else department,
+            age_min=age_min,
+            age_max=age_max,
+            text=search,
+        )
+        if st.session_state.persona_filters != filters:
+            st.session_state.persona_filters = filters
+            st.session_state.persona_page = 0
+
+        page_rows, total = store.buscar(
+            **filters, limit=PERSONA_PAGE_SIZE, offset=st.session_state.persona_page * PERSONA_PAGE_SIZE
+        )
+        page_count = max(1, math.ceil(total / PERSONA_PAGE_SIZE))
+        rows_by_id = {row["persona_id"]: row for row in page_rows}
+
+        def rotulo_persona(persona_id):
+            row = rows_by_id[persona_id]
+            return f"{row['name']} · {row['age']} · {row['department']} ({row['Cluster']})"
+
+        if not page_rows:
+            st.info("No persona matches these filters.")
+        else:
+            # As opções são os IDs, então nomes repetidos não se confundem
+            with st.form("persona_selector"):
+                selected_id = st.selectbox("Choose a Persona:", list(rows_by_id), format_func=rotulo_persona)
+                submitted = st.form_submit_button("Talk to this Persona")
+
+                if submitted and selected_id:
+                    st.session_state.persona_id = selected_id
+                    nova_conversa()
+                    st.rerun()
+
+            col_previous, col_page, col_next = st.columns([1, 2, 1])
+            if col_previous.button("← Previous", disabled=st.session_state.persona_page == 0):
+                st.session_state.persona_page -= 1
+                st.rerun()
+            col_page.caption(f"Page {st.session_state.persona_page + 1} of {page_count} · {total} personas")
+            if col_next.button("Next →", disabled=st.session_state.persona_page + 1 >= page_count):
+                st.session_state.persona_page += 1
+                st.rerun()
 
-        with st.form("persona_selector"):
-            selected_name = st.selectbox("Choose a Persona:", persona_names)
-            submitted = st.form_submit_button("Talk to this Persona")
+            st.divider()
+            st.subheader("Panel mode")
+            st.write("Ask the same question to several personas at once and compare their answers side by side.")
 
-            if submitted and selected_name:
-                selected_index = persona_names.index(selected_name)
-                st.session_state.selected_persona = personas[selected_index]
-                st.session_state.messages = [] 
-                st.rerun()
+            with st.form("panel_selector"):
+                panel_ids = st.multiselect("Choose the personas:", list(rows_by_id), format_func=rotulo_persona)
+                panel_submitted = st.form_submit_button("Ask this Panel")
+
+                if panel_submitted and panel_ids:
+                    st.session_state.panel_personas = panel_ids
+                    st.session_state.panel_rounds = []
+                    st.rerun()
 
 # --- TELA DE CHAT ---
 else: 
-    persona = st.session_state.selected_persona
+    persona = obter_persona(store, st.session_state.persona_id)
+    if persona is None:
+        # A persona saiu do catálogo desde a seleção
+        st.session_state.persona_id = None
+        st.rerun()
     st.title(f"Talking to {persona.get('name', 'Selected Persona')}")
     
     persona_dept = persona.get('department', 'N/A')
     st.caption(f"Persona from the **{persona_dept}** department.")
     
     persona_cluster_name = persona.get('Cluster','N/A')
-    endpoint_number = ENDPOINT_MAP.get(persona_cluster_name)
-    
-    if endpoint_number:
-        DYNAMIC_ENDPOINT_PATH = f"projects/{PROJECT_NUMBER}/locations/{REGION}/endpoints/{endpoint_number}"
+    DYNAMIC_ENDPOINT_PATH = caminho_endpoint_persona(persona)
+
+    if api is not None:
+        logging.info(f"Chatting with '{persona.get('name')}' through the persona service at {PERSONAS_API_URL}")
+    elif DYNAMIC_ENDPOINT_PATH:
         logging.info(f"Chatting with '{persona.get('name')}', using model: {DYNAMIC_ENDPOINT_PATH}")
+    elif FALLBACK_MODEL:
+        st.caption(f"No fine-tuned endpoint for **{persona_cluster_name}** yet: answers come from the base model `{FALLBACK_MODEL}`.")
     else:
-        st.error(f"Endpoint not found for Cluster: '{persona_cluster_name}'. Verify ENDPOINT_MAP on code.")
+        st.error(f"Endpoint not found for Cluster: '{persona_cluster_name}'. Verify ENDPOINT_MAP in endpoints.py.")
         st.stop()
+    MODEL_PATH = DYNAMIC_ENDPOINT_PATH or FALLBACK_MODEL
 
     if st.button("← Back to Selection"):
-        st.session_state.selected_persona = None
-        st.session_state.messages = []
+        st.session_state.persona_id = None
+        nova_conversa()
+        st.session_state.last_error = None
         st.rerun()
 
+    if st.session_state.messages.primeiro:
+        st.caption(f"{st.session_state.messages.primeiro} earlier messages are not shown.")
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
-    if prompt := st.chat_input("What is your question?"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        with st.spinner("Thinking..."):
+    # Uma pergunta que falhou continua no histórico e pode ser reenviada
+    retry = False
+    retry_box = st.empty()
+    unanswered = bool(st.session_state.messages) and st.session_state.messages[-1]["role"] == "user"
+    if unanswered and st.session_state.last_error:
+        with retry_box.container():
+            st.error(f"Error calling Vertex AI endpoint: {st.session_state.last_error}")
+            retry = st.button("🔁 Retry")
+
+    prompt = st.chat_input("What is your question?")
+    if prompt or retry:
+        retry_box.empty()
+        st.session_state.last_error = None
+        if prompt:
+            if unanswered:
+                # Troca a pergunta sem resposta pela nova
+                st.session_state.messages.pop()
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+        # Renderiza a resposta em streaming, conforme os chunks chegam
+        with st.chat_message("assistant"):
             try:
-                system_instruction_profile = f"""
-                You are NOT an AI assistant. You ARE the person described in the 'Persona Profile' below.
-
-                --- YOUR TASK ---
-                1. Answer in the first-person ("I...", "my...", "I think...").
-                2. Base your answer *only* on the persona's life story, values, and personality.
-                3. Be consistent and stay in character at all times.
-
-                --- TONE AND STYLE (MOST IMPORTANT) ---
-                - **Professional:** Maintain a respectful, calm, and articulate tone appropriate for your role and age.
-                - **Natural (Less Robotic):** Your speech should sound human, fluid, and conversational, not like a robot or a list of facts.
-                  - Use common contractions (e.g., "I'm", "don't", "it's") and natural language.
-                  - Use conversational fillers (e.g., "Well...", "You know...", "Actually...", "I mean...").
-                  - Embody the persona's personality in your response; don't just recite facts from their profile.
-                  - Avoid overly formal, stilted language or sounding like an encyclopedia.
-
-                --- PERSONA PROFILE ---
-                - Name: {persona.get('name', 'N/A')}
-                - Age: {persona.get('age', 'N/A')}
-                - Department: {persona.get('department', 'N/A')}
-                - Life Story & Personality: {persona.get('narrative_persona', 'No details available.')}
-                """
-
-                model = GenerativeModel(
-                    model_name=DYNAMIC_ENDPOINT_PATH, 
-                    system_instruction=system_instruction_profile
-                )
+                if api is not None:
+                    # Histórico, cache, retries e fallback ficam no serviço; aqui só chegam os pedaços de texto
+                    resposta = api.chat(
+                        persona["id"],
+                        st.session_state.messages.dicts(),
+                        offset=st.session_state.messages.primeiro,
+                        session_id=st.session_state.chat_id,
+                        style=PROMPT_STYLE,
+                        generation=GENERATION_VALUES
+                    )
+                    response_text = st.write_stream(resposta).strip()
+                    if resposta.fallback:
+                        st.caption(f"Answered by the fallback model `{resposta.model}`.")
+                else:
+                    # Espera o SDK (carregado em segundo plano desde a primeira tela)
+                    inicializar_vertexai()
+                    from vertexai.generative_models import GenerationConfig
+
+                    # System instruction pré-compilada (texto + hash), sem remontar a cada turno
+                    persona_prompt = get_prompt_compiler().compilar(persona)
+
+                    # Reaproveita o modelo do pool do processo (sem recriar o cliente a cada turno)
+                    model = get_client().modelo(MODEL_PATH, persona_prompt)
                 
-                generation_config = GenerationConfig(
-                    temperature=0.85, 
-                    max_output_tokens=2048,
-                    #top_k=60,
-                    top_p = 0.95,
-                    presence_penalty = 0.5
-                )
-
-                vertex_history = []
-                for msg in st.session_state.messages[:-1]:
-                    role = "user" if msg["role"] == "user" else "model"
-                    vertex_history.append({"role": role, "parts": [{"text": msg["content"]}]})
-                
-                vertex_history.append({"role": "user", "parts": [{"text": prompt}]})
-
+                    generation_values = dict(GENERATION_VALUES)
+                    generation_config = GenerationConfig(**generation_values)
+
+                    # Histórico dentro do orçamento de tokens (turnos antigos viram um resumo)
+                    vertex_history = st.session_state.history.build_contents(
+                        st.session_state.messages,
+                        summarizer=criar_sumarizador(model, endpoint=MODEL_PATH, persona=persona.get('name'))
+                    )
+
+                    # Perguntas repetidas são respondidas pelo cache, sem gastar cota do endpoint
+                    response_cache = get_response_cache() if RESPONSE_CACHE_ENABLED and usar_cache(persona) else None
+                    cache_key = None
+                    response_text = None
+                    if response_cache is not None:
+                        cache_key = chave_resposta(
+                            MODEL_PATH, persona_prompt.key, vertex_history, generation_values
+                        )
+                        response_text = response_cache.get(cache_key)
+
+                    if response_text is not None:
+                        logging.info(f"Resposta encontrada no cache. {response_cache.stats()}")
+                        st.markdown(response_text)
+                    else:
+                        # Retries, hedge e fallback ficam a cargo do cliente resiliente
+                        model_used, responses = get_client().generate(
+                            DYNAMIC_ENDPOINT_PATH,
+                            persona_prompt,
+                            vertex_history,
+                            generation_config=generation_config,
+                            persona=persona.get('name'),
+                            stream=True
+                        )
+
+                        response_text = st.write_stream(stream_texto_resposta(responses)).strip()
+                        if model_used != MODEL_PATH:
+                            st.caption(f"Answered by the fallback model `{model_used}`.")
+                        # Respostas do fallback não entram no cache do endpoint fine-tuned
+                        if response_cache is not None and response_text and model_used == MODEL_PATH:
+                            response_cache.set(cache_key, response_text)
 
-                response = model.generate_content(
-                    vertex_history,
-                    generation_config=generation_config
-                )
-                
-                try:
-                    finish_reason = response.candidates[0].finish_reason
-                    logging.info(f"Resposta gerada. Finish Reason: {finish_reason.name}")
-                    if finish_reason.name == "MAX_TOKENS":
-                        logging.warning("A RESPOSTA FOI CORTADA! 'max_output_tokens' ainda é muito baixo.")
-                except Exception as e:
-                    logging.warning(f"Não foi possível obter o finish_reason da resposta: {e}")
-
-                response_text = response.text.strip()
                 st.session_state.messages.append({"role": "assistant", "content": response_text})
-                st.rerun()
 
             except Exception as e:
-                st.error(f"Error calling Vertex AI endpoint: {e}")
-                st.session_state.messages.pop()
\ No newline at end of file
+                logging.error(f"Erro ao chamar o endpoint: {e}")
+                st.session_state.last_error = str(e)
+
+        if st.session_state.last_error:
+            st.rerun()
\ No newline at end of file
@@ -0,0 +1,419 @@
+"""
+Cliente resiliente para os endpoints das personas.
+
+Em volta do generate_content (já instrumentado pelo telemetry.py):
+    - prazo por chamada e novas tentativas com backoff exponencial + jitter
+      em erros de cota/disponibilidade (429/503);
+    - requisição "hedged" opcional: se a primeira tentativa não começar a
+      responder até o p95 do TTFT do endpoint, uma segunda é disparada e vale
+      a que chegar antes;
+    - circuit breaker por endpoint: depois de N falhas seguidas o endpoint fica
+      aberto por um tempo e as chamadas vão direto para o fallback;
+    - fallback para um modelo base com a system instruction da persona quando o
+      endpoint fine-tuned do cluster não existe ou não está saudável.
+
+generate() é para threads (Streamlit, painel, CLIs); generate_async() é a mesma
+política com asyncio (generate_content_async), usada pelo persona_service.py.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as api_exceptions
+
+from persona_prompts import PromptPersona
+from telemetry import generate_content_async_instrumentado, generate_content_instrumentado, registry
+from vertex_pool import get_model_pool
+
+
+# Erros de cota/disponibilidade que valem uma nova tentativa
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    TimeoutError,
+)
+
+DEFAULT_FALLBACK_MODEL = "gemini-2.0-flash-001"
+DEFAULT_DEADLINE_SECONDS = 60.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY_SECONDS = 0.5
+
+# O hedge usa o p95 do TTFT do endpoint assim que houver amostras suficientes
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_AFTER_SECONDS = 8.0
+
+
+class EndpointIndisponivel(Exception):
+    """Nem o endpoint da persona nem o fallback podem ser chamados agora."""
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold falhas seguidas) -> open -> (reset_timeout) -> half-open.
+    Em half-open passa uma chamada de teste por vez: se der certo o circuito fecha,
+    se falhar volta a abrir.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half-open"
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def falha(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+def _descartar(future):
+    """Fecha o stream da tentativa que perdeu a corrida do hedge."""
+    try:
+        _, rest = future.result()
+    except Exception:
+        return
+    if rest is not None and hasattr(rest, "close"):
+        rest.close()
+
+
+def _descartar_async(task):
+    """Fecha o stream de uma tentativa assíncrona que perdeu a corrida do hedge."""
+    if task.cancelled() or task.exception() is not None:
+        return
+    _, rest = task.result()
+    if rest is not None:
+        asyncio.ensure_future(rest.aclose())
+
+
+class ResilientClient:
+    """
+    Cliente compartilhado pelo processo (thread-safe). generate() devolve
+    (modelo usado, resposta); com stream=True a resposta é um iterador de chunks.
+    """
+
+    def __init__(self, fallback_model=DEFAULT_FALLBACK_MODEL, deadline_s=DEFAULT_DEADLINE_SECONDS,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay_s=DEFAULT_BASE_DELAY_SECONDS,
+                 hedge=True, hedge_after_s=None, failure_threshold=5, reset_timeout_s=30.0,
+                 pool=None, context_cache=None, max_workers=32):
+        self.fallback_model = fallback_model
+        self.deadline_s = deadline_s
+        self.max_retries = max_retries
+        self.base_delay_s = base_delay_s
+        self.hedge = hedge
+        self.hedge_after_s = hedge_after_s
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.pool = pool if pool is not None else get_model_pool()
+        self.context_cache = context_cache
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vertex-call")
+        registry.registrar_cache("model_pool", self.pool.stats)
+        if context_cache is not None:
+            registry.registrar_cache("context_cache", context_cache.stats)
+
+    def breaker(self, endpoint) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout_s)
+            return self._breakers[endpoint]
+
+    def estado(self) -> dict:
+        """Estado do circuito de cada endpoint já chamado (para logs/admin)."""
+        with self._lock:
+            return {endpoint: b.state for endpoint, b in self._breakers.items()}
+
+    def modelo(self, model_name, system_instruction):
+        """Modelo para a persona: aceita o texto da system instruction ou um PromptPersona já compilado."""
+        if isinstance(system_instruction, PromptPersona):
+            if self.context_cache is not None:
+                return self.context_cache.modelo(model_name, system_instruction)
+            return self.pool.get(model_name, system_instruction.text, persona_key=system_instruction.key)
+        return self.pool.get(model_name, system_instruction)
+
+    def _hedge_after(self, endpoint):
+        if self.hedge_after_s is not None:
+            return self.hedge_after_s
+        p95 = registry.quantil(endpoint, "ttft", 0.95, min_count=HEDGE_MIN_SAMPLES)
+        return p95 if p95 is not None and p95 != float("inf") else HEDGE_DEFAULT_AFTER_SECONDS
+
+    def _abrir(self, model, endpoint, contents, generation_config, persona, attempt, stream):
+        """Uma tentativa: devolve (primeiro chunk, resto do stream) ou (resposta, None)."""
+        result = generate_content_instrumentado(
+            model, contents, endpoint=endpoint, persona=persona, retries=attempt,
+            stream=stream, generation_config=generation_config
+        )
+        if not stream:
+            return result, None
+        return next(result, None), result
+
+    def _tentativa(self, model, endpoint, contents, generation_config, persona, attempt, stream, deadline):
+        """Dispara a tentativa (e o hedge, se ela demorar) e fica com a que responder primeiro até o deadline."""
+        args = (model, endpoint, contents, generation_config, persona, attempt, stream)
+        start = time.monotonic()
+        hedge_at = start + self._hedge_after(endpoint) if self.hedge else None
+        futures = [self._executor.submit(self._abrir, *args)]
+        error = None
+
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    logging.info(f"[{persona}] Sem resposta de '{endpoint}' após {hedge_at - start:.1f}s, enviando hedge.")
+                    futures.append(self._executor.submit(self._abrir, *args))
+                    hedge_at = None
+                continue
+
+            for future in done:
+                futures.remove(future)
+                try:
+                    winner = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for other in futures:
+                    other.add_done_callback(_descartar)
+                return winner
+
+            # A tentativa falhou antes do hedge: não vale a pena esperar por ele
+            if error is not None and hedge_at is not None:
+                break
+
+        for other in futures:
+            other.add_done_callback(_descartar)
+        if error is not None and not futures:
+            raise error
+        raise TimeoutError(f"Sem resposta de '{endpoint}' em {self.deadline_s:.0f}s")
+
+    def _chamar(self, model, endpoint, contents, generation_config, persona, stream):
+        # Um prazo só para todas as tentativas: cada uma recebe apenas o tempo que sobrou
+        deadline = time.monotonic() + self.deadline_s
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._tentativa(model, endpoint, contents, generation_config, persona, attempt, stream, deadline)
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, self.base_delay_s * 2 ** attempt)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                logging.warning(f"[{persona}] {e.__class__.__name__} em '{endpoint}', tentando de novo em {delay:.1f}s...")
+                time.sleep(delay)
+
+    def _stream_com_prazo(self, first, rest, endpoint):
+        deadline = time.monotonic() + self.deadline_s
+        if first is not None:
+            yield first
+        if rest is None:
+            return
+        try:
+            for chunk in rest:
+                yield chunk
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Resposta de '{endpoint}' passou do prazo de {self.deadline_s:.0f}s")
+        finally:
+            rest.close()
+
+    def _candidatos(self, endpoint_path):
+        """Endpoint da persona e depois o fallback, na ordem em que são tentados."""
+        candidates = [endpoint_path] if endpoint_path else []
+        if self.fallback_model and self.fallback_model != endpoint_path:
+            candidates.append(self.fallback_model)
+        return candidates
+
+    def _permitir(self, model_name, persona):
+        """
+        Consulta o circuito só na hora de tentar o modelo: em half-open, permitir()
+        reserva a chamada de teste, que precisa terminar em sucesso() ou falha().
+        """
+        if self.breaker(model_name).permitir():
+            return True
+        logging.warning(f"[{persona}] Circuito aberto para '{model_name}'.")
+        return False
+
+    def _indisponivel(self, endpoint_path, persona):
+        return EndpointIndisponivel(f"Nenhum modelo disponível para '{persona}' (endpoint: {endpoint_path}).")
+
+    def generate(self, endpoint_path, system_instruction, contents, generation_config=None, persona=None, stream=False):
+        """
+        Tenta o endpoint fine-tuned (se existir e o circuito estiver fechado) e,
+        se não der, o modelo base de fallback com a mesma system instruction.
+        """
+        error = None
+        for model_name in self._candidatos(endpoint_path):
+            if not self._permitir(model_name, persona):
+                continue
+            try:
+                model = self.modelo(model_name, system_instruction)
+                first, rest = self._chamar(model, model_name, contents, generation_config, persona, stream)
+            except api_exceptions.InvalidArgument:
+                # Erro no pedido, não no endpoint: o fallback falharia do mesmo jeito
+                self.breaker(model_name).sucesso()
+                raise
+            except Exception as e:
+                error = e
+                self.breaker(model_name).falha()
+                logging.warning(f"[{persona}] Falha em '{model_name}': {e}")
+                continue
+
+            self.breaker(model_name).sucesso()
+            if model_name != endpoint_path:
+                logging.info(f"[{persona}] Respondido pelo fallback '{model_name}'.")
+            if not stream:
+                return model_name, first
+            return model_name, self._stream_com_prazo(first, rest, model_name)
+
+        raise error if error is not None else self._indisponivel(endpoint_path, persona)
+
+    # --- VERSÃO ASYNCIO ---
+
+    async def _abrir_async(self, model, endpoint, contents, generation_config, persona, attempt):
+        """Uma tentativa em streaming: devolve (primeiro chunk, resto do stream)."""
+        responses = await generate_content_async_instrumentado(
+            model, contents, endpoint=endpoint, persona=persona, retries=attempt,
+            stream=True, generation_config=generation_config
+        )
+        return await anext(responses, None), responses
+
+    async def _tentativa_async(self, model, endpoint, contents, generation_config, persona, attempt, deadline):
+        """Mesmo hedge do _tentativa, com tasks do asyncio no lugar das threads."""
+        args = (model, endpoint, contents, generation_config, persona, attempt)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        hedge_at = start + self._hedge_after(endpoint) if self.hedge else None
+        tasks = {asyncio.ensure_future(self._abrir_async(*args))}
+        error = None
+
+        try:
+            while tasks:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if hedge_at is not None and loop.time() >= hedge_at:
+                        logging.info(f"[{persona}] Sem resposta de '{endpoint}' após {hedge_at - start:.1f}s, enviando hedge.")
+                        tasks.add(asyncio.ensure_future(self._abrir_async(*args)))
+                        hedge_at = None
+                    continue
+
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        _descartar_async(task)
+                if winner is not None:
+                    return winner
+
+                # A tentativa falhou antes do hedge: não vale a pena esperar por ele
+                if error is not None and hedge_at is not None:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(_descartar_async)
+
+        if error is not None and not tasks:
+            raise error
+        raise TimeoutError(f"Sem resposta de '{endpoint}' em {self.deadline_s:.0f}s")
+
+    async def _chamar_async(self, model, endpoint, contents, generation_config, persona):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_s
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._tentativa_async(model, endpoint, contents, generation_config, persona, attempt, deadline)
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, self.base_delay_s * 2 ** attempt)
+                if attempt == self.max_retries or loop.time() + delay >= deadline:
+                    raise
+                logging.warning(f"[{persona}] {e.__class__.__name__} em '{endpoint}', tentando de novo em {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def _stream_async_com_prazo(self, first, rest, endpoint):
+        deadline = asyncio.get_running_loop().time() + self.deadline_s
+        try:
+            if first is not None:
+                yield first
+            async for chunk in rest:
+                yield chunk
+                if asyncio.get_running_loop().time() > deadline:
+                    raise TimeoutError(f"Resposta de '{endpoint}' passou do prazo de {self.deadline_s:.0f}s")
+        finally:
+            await rest.aclose()
+
+    async def generate_async(self, endpoint_path, system_instruction, contents, generation_config=None, persona=None):
+        """
+        generate(stream=True) para asyncio: devolve (modelo usado, iterador assíncrono de chunks).
+        Não ocupa uma thread por chamada, então um processo aguenta centenas de conversas.
+        """
+        error = None
+        for model_name in self._candidatos(endpoint_path):
+            if not self._permitir(model_name, persona):
+                continue
+            try:
+                # O cache de contexto pode criar o CachedContent (chamada bloqueante) na primeira vez
+                model = await asyncio.to_thread(self.modelo, model_name, system_instruction)
+                first, rest = await self._chamar_async(model, model_name, contents, generation_config, persona)
+            except api_exceptions.InvalidArgument:
+                self.breaker(model_name).sucesso()
+                raise
+            except Exception as e:
+                error = e
+                self.breaker(model_name).falha()
+                logging.warning(f"[{persona}] Falha em '{model_name}': {e}")
+                continue
+            except BaseException:
+                # Cancelada (cliente desconectou): libera a chamada de teste do half-open
+                self.breaker(model_name).falha()
+                raise
+
+            self.breaker(model_name).sucesso()
+            if model_name != endpoint_path:
+                logging.info(f"[{persona}] Respondido pelo fallback '{model_name}'.")
+            return model_name, self._stream_async_com_prazo(first, rest, model_name)
+
+        raise error if error is not None else self._indisponivel(endpoint_path, persona)
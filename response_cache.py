@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_DB_PATH = "cache/responses.sqlite"
+DEFAULT_MEMORY_ITEMS = 256
+DEFAULT_DISK_ITEMS = 5000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def normalizar_texto(text: str) -> str:
+    """Normaliza o texto para que pequenas variações não gerem chaves diferentes."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def chave_resposta(endpoint_path, system_instruction, contents, generation_config: dict) -> str:
+    """
+    Gera a chave do cache a partir do endpoint, do hash da system instruction,
+    do histórico + pergunta normalizados e dos valores do GenerationConfig.
+    """
+    history = [
+        [item["role"], [normalizar_texto(part.get("text", "")) for part in item["parts"]]]
+        for item in contents
+    ]
+    payload = {
+        "endpoint": endpoint_path,
+        "system": hashlib.sha256(system_instruction.encode("utf-8")).hexdigest(),
+        "history": history,
+        "config": generation_config,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache de respostas em dois níveis: LRU em memória e SQLite em disco.
+
+    As entradas expiram após 'ttl_seconds'. O nível em memória guarda no máximo
+    'max_memory_items' respostas e o disco no máximo 'max_disk_items' (as mais
+    antigas são removidas primeiro). Pode ser usado por várias threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_memory_items=DEFAULT_MEMORY_ITEMS,
+                 max_disk_items=DEFAULT_DISK_ITEMS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at)")
+            self._db.commit()
+
+    def _expirado(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Retorna a resposta guardada ou None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if not self._expirado(created_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    response, created_at = row
+                    if not self._expirado(created_at):
+                        self._guardar_memoria(key, response, created_at)
+                        self.disk_hits += 1
+                        return response
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key, response):
+        created_at = time.time()
+        with self._lock:
+            self._guardar_memoria(key, response, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, created_at)
+                )
+                # Mantém o arquivo dentro do limite, removendo as entradas mais antigas
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_items,)
+                )
+                self._db.commit()
+
+    def _guardar_memoria(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Retorna os contadores de acerto do cache."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+            }
+
+
+def usar_cache(persona: dict) -> bool:
+    """
+    Indica se a persona pode usar o cache de respostas.
+    Personas com "response_cache": false no JSON sempre chamam o endpoint
+    (útil quando se quer respostas variadas com temperatura alta).
+    """
+    return persona.get("response_cache", True) is not False
@@ -0,0 +1,292 @@
+"""
+Simulação do questionário (Q1–Q28) em lote com as personas sintéticas.
+
+Cada par persona × pergunta vai para o endpoint do cluster da persona, no
+mesmo formato usado no fine-tuning (perfil do cluster + "Question: ..."), com
+a persona como system instruction. As chamadas rodam em paralelo (thread pool
++ limite de requisições por segundo) e cada resposta é lida de volta para o
+valor da pergunta (nota 1–6, valor em US$, alternativa ou ranking).
+
+O progresso fica em um checkpoint SQLite, uma linha por par respondido: se o
+processo cair, basta rodar o mesmo comando de novo que apenas os pares que
+faltam são enviados. No final, os resultados viram uma tabela no formato do
+df_fine_tuning.xlsx (person, Question, answer, Q_label, Kmeans_pca), em
+Parquet ou CSV.
+
+Exemplos:
+    python simulate_survey.py --workers 8 --rps 5 --output dados/survey_results.parquet
+    python simulate_survey.py --questions Q1 Q20 Q24 --base-model gemini-2.0-flash-001
+    python simulate_survey.py --stub-url http://127.0.0.1:8808 --output dados/survey_results.csv
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from cluster_profiles import CLUSTER_PROFILES, CLUSTER_NUMBERS, nome_arquivo_cluster
+from endpoints import caminho_endpoint, endpoint_do_cluster
+from evaluate_endpoints import HttpBackend, RateLimiter, VertexBackend
+from persona_prompts import id_persona
+from survey import carregar_perguntas, eh_numerica, extrair_resposta
+
+
+logging.basicConfig(level=logging.INFO)
+
+PERSONAS_FILE = "json/personas_gemini.json"
+OUTPUT_FILE = "dados/survey_results.parquet"
+QUESTION_SEPARATOR = "\n\nQuestion: "
+
+SYSTEM_INSTRUCTION = """
+You are NOT an AI assistant. You ARE the person described below, answering a workplace survey.
+Answer in the first person, the way this person would, and always start with the answer itself
+(the number on the scale, the amount in US$, the option or the ranking).
+
+- Name: {name}
+- Age: {age}
+- Department: {department}
+- Life Story & Personality: {narrative_persona}
+"""
+
+RESULT_COLUMNS = ["person", "Question", "answer", "Q_label", "Kmeans_pca",
+                  "persona_id", "Cluster", "answer_value", "reply"]
+
+
+def montar_system_instruction(persona):
+    return SYSTEM_INSTRUCTION.format(
+        name=persona.get("name", "N/A"),
+        age=persona.get("age", "N/A"),
+        department=persona.get("department", "N/A"),
+        narrative_persona=persona.get("narrative_persona", "No details available."),
+    )
+
+
+# --- CHECKPOINT ---
+
+class Checkpoint:
+    """
+    Resultados já obtidos, em SQLite. Cada par (persona, pergunta) entra uma vez;
+    as gravações são agrupadas e confirmadas a cada 'commit_every' respostas.
+    """
+
+    def __init__(self, db_path, commit_every=50):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " persona_id TEXT NOT NULL, Q_label TEXT NOT NULL, person TEXT, Cluster TEXT,"
+            " Kmeans_pca INTEGER, Question TEXT, reply TEXT, answer TEXT, answer_value REAL,"
+            " created_at REAL NOT NULL, PRIMARY KEY (persona_id, Q_label))"
+        )
+        self._conn.commit()
+
+    def concluidos(self):
+        with self._lock:
+            return set(self._conn.execute("SELECT persona_id, Q_label FROM results"))
+
+    def registrar(self, row):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (persona_id, Q_label, person, Cluster, Kmeans_pca, Question,"
+                " reply, answer, answer_value, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row["persona_id"], row["Q_label"], row["person"], row["Cluster"], row["Kmeans_pca"],
+                 row["Question"], row["reply"], row["answer"], row["answer_value"], time.time())
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def dataframe(self):
+        with self._lock:
+            return pd.read_sql_query(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results", self._conn)
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+# --- EXECUÇÃO ---
+
+def montar_fila(personas, questions, done, base_model=None, allow_missing_endpoints=False):
+    """Gera os pares (persona × pergunta) que ainda faltam, já com o endpoint e o prompt."""
+    skipped_clusters = set()
+    for persona in personas:
+        cluster = persona.get("Cluster")
+        if cluster not in CLUSTER_PROFILES:
+            if cluster not in skipped_clusters:
+                logging.warning(f"Cluster desconhecido '{cluster}'. Pulando as personas dele.")
+                skipped_clusters.add(cluster)
+            continue
+
+        endpoint_path = endpoint_do_cluster(cluster) or base_model
+        if endpoint_path is None:
+            if not allow_missing_endpoints:
+                if cluster not in skipped_clusters:
+                    logging.warning(f"Sem endpoint para o cluster '{cluster}' (use --base-model). Pulando.")
+                    skipped_clusters.add(cluster)
+                continue
+            # Com o backend HTTP (fake) qualquer caminho serve
+            endpoint_path = caminho_endpoint(nome_arquivo_cluster(cluster))
+
+        persona_id = id_persona(persona)
+        system_instruction = montar_system_instruction(persona)
+        for question in questions:
+            if (persona_id, question["Q_label"]) in done:
+                continue
+            yield {
+                "persona": persona,
+                "persona_id": persona_id,
+                "endpoint": endpoint_path,
+                "system_instruction": system_instruction,
+                "question": question,
+                "contents": [{"role": "user", "parts": [
+                    {"text": f"{CLUSTER_PROFILES[cluster]}{QUESTION_SEPARATOR}{question['Question']}"}
+                ]}],
+            }
+
+
+def _linha_resultado(item, reply):
+    persona, question = item["persona"], item["question"]
+    value = extrair_resposta(question["type"], reply)
+    if eh_numerica(question["type"]):
+        answer = None if value is None else f"{value:g}"
+        answer_value = value
+    else:
+        answer = reply.strip()
+        answer_value = None
+    return {
+        "persona_id": item["persona_id"],
+        "person": persona.get("name"),
+        "Cluster": persona["Cluster"],
+        "Kmeans_pca": CLUSTER_NUMBERS[persona["Cluster"]],
+        "Q_label": question["Q_label"],
+        "Question": question["Question"],
+        "reply": reply,
+        "answer": answer,
+        "answer_value": answer_value,
+    }
+
+
+def simular(personas, questions, backend, checkpoint, workers=8, rps=None, max_retries=5, base_delay=1.0,
+            base_model=None, allow_missing_endpoints=False):
+    """Envia todos os pares que faltam no checkpoint. Retorna a contagem de respondidos/erros."""
+    done = checkpoint.concluidos()
+    if done:
+        logging.info(f"Retomando: {len(done)} respostas já estão no checkpoint.")
+
+    limiter = RateLimiter(rps)
+    in_flight = threading.BoundedSemaphore(workers * 4)
+    stop = threading.Event()
+    counts = Counter()
+    counts_lock = threading.Lock()
+
+    def executar(item):
+        try:
+            for attempt in range(max_retries + 1):
+                if stop.is_set():
+                    return
+                limiter.acquire()
+                try:
+                    reply = backend.generate(item["endpoint"], item["contents"],
+                                             system_instruction=item["system_instruction"],
+                                             persona=f"{item['persona'].get('name')} (survey)")
+                    break
+                except Exception as e:
+                    if attempt == max_retries:
+                        logging.warning(f"[{item['persona_id']} {item['question']['Q_label']}] Desistindo: {e}")
+                        with counts_lock:
+                            counts["errors"] += 1
+                        return
+                    time.sleep(random.uniform(0, base_delay * 2 ** attempt))
+
+            row = _linha_resultado(item, reply)
+            checkpoint.registrar(row)
+            with counts_lock:
+                counts["answered"] += 1
+                counts["unparsed"] += int(row["answer"] is None)
+                if counts["answered"] % 500 == 0:
+                    logging.info(f"{counts['answered']} respostas novas ({counts['errors']} erros).")
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for item in montar_fila(personas, questions, done, base_model, allow_missing_endpoints):
+                in_flight.acquire()
+                pool.submit(executar, item)
+        except KeyboardInterrupt:
+            logging.warning("Interrompido: aguardando as chamadas em andamento e salvando o checkpoint...")
+            stop.set()
+    checkpoint.flush()
+
+    logging.info(f"Simulação finalizada: {counts['answered']} respostas novas, "
+                 f"{counts['unparsed']} não lidas, {counts['errors']} com erro.")
+    return counts
+
+
+def exportar_resultados(checkpoint, output_file):
+    """Grava todos os resultados do checkpoint em Parquet ou CSV (pela extensão do arquivo)."""
+    results = checkpoint.dataframe()
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    if output_file.endswith(".csv"):
+        results.to_csv(output_file, index=False)
+    else:
+        results["Q_label"] = results["Q_label"].astype("category")
+        results["Cluster"] = results["Cluster"].astype("category")
+        results.to_parquet(output_file, index=False, compression="zstd")
+    logging.info(f"{len(results)} respostas gravadas em '{output_file}'.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roda o questionário Q1–Q28 com as personas sintéticas.")
+    parser.add_argument("--personas", default=PERSONAS_FILE, help="Arquivo JSON de personas.")
+    parser.add_argument("--questions", nargs="+", default=None, help="Perguntas a enviar (ex.: Q1 Q20). Padrão: todas.")
+    parser.add_argument("--workers", type=int, default=8, help="Chamadas simultâneas.")
+    parser.add_argument("--rps", type=float, default=None, help="Limite de requisições por segundo.")
+    parser.add_argument("--temperature", type=float, default=0.8, help="Temperatura das respostas das personas.")
+    parser.add_argument("--max-retries", type=int, default=5, help="Tentativas extras por chamada com erro.")
+    parser.add_argument("--base-model", default=None,
+                        help="Modelo base (ex.: gemini-2.0-flash-001) para clusters sem endpoint fine-tuned.")
+    parser.add_argument("--stub-url", default=None, help="URL de um servidor fake (ex.: fake_vertex.py) no lugar do Vertex AI.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Tabela de resultados (.parquet ou .csv).")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint SQLite (padrão: <output>.checkpoint.sqlite).")
+    args = parser.parse_args()
+
+    with open(args.personas, "r", encoding="utf-8") as f:
+        personas = json.load(f)
+    questions = carregar_perguntas()
+    if args.questions:
+        questions = [q for q in questions if q["Q_label"] in set(args.questions)]
+
+    backend = HttpBackend(args.stub_url) if args.stub_url else VertexBackend(temperature=args.temperature)
+    checkpoint = Checkpoint(args.checkpoint or f"{os.path.splitext(args.output)[0]}.checkpoint.sqlite")
+    try:
+        simular(personas, questions, backend, checkpoint, workers=args.workers, rps=args.rps,
+                max_retries=args.max_retries, base_model=args.base_model,
+                allow_missing_endpoints=bool(args.stub_url))
+        exportar_resultados(checkpoint, args.output)
+    finally:
+        checkpoint.close()
+
+
+if __name__ == "__main__":
+    main()
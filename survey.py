@@ -0,0 +1,68 @@
+"""
+Perguntas do questionário (Q1–Q28) e leitura das respostas das personas.
+
+As perguntas ficam em json/survey_questions.json (mesmo texto da coluna
+'Question' do df_fine_tuning.xlsx), com o tipo de cada uma:
+    scale     -> nota de 1 a 6
+    monetary  -> valor em US$ (Q20–Q23)
+    choice    -> alternativa em texto (Q24, Q25)
+    ranking   -> lista ordenada de tópicos (Q26)
+"""
+import json
+import re
+
+
+QUESTIONS_FILE = "json/survey_questions.json"
+
+_SCALE_RE = re.compile(r"\b([1-6])\b")
+_MONEY_RE = re.compile(r"US\$\s*([\d,]+(?:\.\d+)?)")
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def carregar_perguntas(filename=QUESTIONS_FILE):
+    """Carrega a lista de perguntas do questionário."""
+    with open(filename, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def perguntas_por_texto(questions):
+    """Mapa texto da pergunta -> pergunta (para identificar o Q_label nos JSONL)."""
+    return {q["Question"]: q for q in questions}
+
+
+def _numero(text):
+    return float(text.replace(",", ""))
+
+
+def extrair_resposta(question_type, text):
+    """
+    Converte a resposta em texto para o valor da pergunta.
+    Retorna int/float para 'scale'/'monetary', texto normalizado para
+    'choice'/'ranking', ou None se não for possível interpretar.
+    """
+    if text is None:
+        return None
+    text = str(text).strip()
+
+    if question_type == "scale":
+        match = _SCALE_RE.search(text)
+        return int(match.group(1)) if match else None
+
+    if question_type == "monetary":
+        match = _MONEY_RE.search(text) or _NUMBER_RE.search(text)
+        if not match:
+            return None
+        value = _numero(match.group(1) if match.re is _MONEY_RE else match.group(0))
+        return int(value) if value.is_integer() else value
+
+    if question_type == "ranking":
+        # Compara apenas o tópico colocado em primeiro lugar
+        first = text.split(",")[0]
+        return first.strip(" .-").casefold() or None
+
+    # choice
+    return text.strip(" .").casefold() or None
+
+
+def eh_numerica(question_type):
+    return question_type in ("scale", "monetary")
@@ -0,0 +1,366 @@
+"""
+Instrumentação das chamadas ao generate_content.
+
+Cada chamada registra tempo total, tempo até o primeiro token (TTFT), tokens
+de prompt/resposta (usage_metadata), finish_reason, retries e erros. Os dados
+ficam em histogramas em memória por (endpoint, persona) e podem ser:
+    - gravados chamada a chamada em um arquivo JSONL rotativo (metrics/calls.jsonl);
+    - expostos no formato texto do Prometheus (prometheus_text / iniciar_servidor_metricas);
+    - vistos na página de admin do Streamlit (pages/admin_metrics.py).
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+
+# Limites dos buckets (em segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+METRICS_DIR = "metrics"
+CALLS_FILE = "calls.jsonl"
+
+
+class Histogram:
+    """Histograma com buckets fixos (cumulativos na exportação, como no Prometheus)."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimativa do quantil pelo limite superior do bucket (suficiente para p50/p95)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.wall_time = Histogram(LATENCY_BUCKETS)
+        self.ttft = Histogram(LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.candidate_tokens = Histogram(TOKEN_BUCKETS)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.finish_reasons = defaultdict(int)
+
+
+class MetricsRegistry:
+    """Registro de métricas do processo (compartilhado entre sessões, thread-safe)."""
+
+    def __init__(self, calls_file=None):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(_EndpointStats)
+        self._caches = {}  # nome -> função que devolve os contadores (pool de modelos, cache de contexto)
+        self._file_logger = None
+        if calls_file:
+            self.ativar_arquivo(calls_file)
+
+    def ativar_arquivo(self, calls_file, max_bytes=5 * 1024 * 1024, backup_count=5):
+        """Grava cada chamada como uma linha JSON em um arquivo rotativo."""
+        os.makedirs(os.path.dirname(calls_file) or ".", exist_ok=True)
+        logger = logging.getLogger("persona_metrics")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if not logger.handlers:
+            handler = RotatingFileHandler(calls_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        self._file_logger = logger
+
+    def registrar(self, event):
+        key = (event["endpoint"], event["persona"])
+        with self._lock:
+            stats = self._stats[key]
+            stats.calls += 1
+            stats.retries += event["retries"]
+            if event["error"]:
+                stats.errors += 1
+            else:
+                stats.wall_time.observe(event["wall_time_s"])
+                if event["ttft_s"] is not None:
+                    stats.ttft.observe(event["ttft_s"])
+                if event["prompt_tokens"] is not None:
+                    stats.prompt_tokens.observe(event["prompt_tokens"])
+                if event["candidate_tokens"] is not None:
+                    stats.candidate_tokens.observe(event["candidate_tokens"])
+                stats.finish_reasons[event["finish_reason"] or "UNKNOWN"] += 1
+
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(event, ensure_ascii=False))
+
+    def resumo(self):
+        """Lista com um resumo por (endpoint, persona), para tabelas/admin."""
+        with self._lock:
+            rows = []
+            for (endpoint, persona), s in self._stats.items():
+                rows.append({
+                    "endpoint": endpoint,
+                    "persona": persona,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "error_rate": s.errors / s.calls if s.calls else 0.0,
+                    "retries": s.retries,
+                    "wall_p50_s": s.wall_time.quantile(0.5),
+                    "wall_p95_s": s.wall_time.quantile(0.95),
+                    "ttft_p50_s": s.ttft.quantile(0.5),
+                    "ttft_p95_s": s.ttft.quantile(0.95),
+                    "avg_prompt_tokens": s.prompt_tokens.sum / s.prompt_tokens.count if s.prompt_tokens.count else None,
+                    "avg_candidate_tokens": s.candidate_tokens.sum / s.candidate_tokens.count if s.candidate_tokens.count else None,
+                    "finish_reasons": dict(s.finish_reasons),
+                })
+            return rows
+
+    def quantil(self, endpoint, attr="ttft", q=0.95, min_count=1):
+        """
+        Quantil de um histograma ('wall_time', 'ttft', ...) somando todas as personas
+        do endpoint. Retorna None se ainda houver menos de 'min_count' amostras.
+        """
+        merged = None
+        with self._lock:
+            for (ep, _), s in self._stats.items():
+                if ep != endpoint:
+                    continue
+                hist = getattr(s, attr)
+                if merged is None:
+                    merged = Histogram(hist.buckets)
+                merged.merge(hist)
+        if merged is None or merged.count < min_count:
+            return None
+        return merged.quantile(q)
+
+    def prometheus_text(self):
+        """Exporta as métricas no formato texto do Prometheus."""
+        lines = []
+        with self._lock:
+            items = list(self._stats.items())
+
+            def labels(endpoint, persona, extra=""):
+                persona = persona.replace('"', '\\"')
+                return f'endpoint="{endpoint}",persona="{persona}"{extra}'
+
+            for metric, attr in (("persona_generate_wall_seconds", "wall_time"),
+                                 ("persona_generate_ttft_seconds", "ttft"),
+                                 ("persona_generate_prompt_tokens", "prompt_tokens"),
+                                 ("persona_generate_candidate_tokens", "candidate_tokens")):
+                lines.append(f"# TYPE {metric} histogram")
+                for (endpoint, persona), s in items:
+                    hist = getattr(s, attr)
+                    for bound, total in hist.cumulative():
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        bucket_labels = labels(endpoint, persona, f',le="{le}"')
+                        lines.append(f"{metric}_bucket{{{bucket_labels}}} {total}")
+                    lines.append(f"{metric}_sum{{{labels(endpoint, persona)}}} {hist.sum:g}")
+                    lines.append(f"{metric}_count{{{labels(endpoint, persona)}}} {hist.count}")
+
+            for metric, attr in (("persona_generate_calls_total", "calls"),
+                                 ("persona_generate_errors_total", "errors"),
+                                 ("persona_generate_retries_total", "retries")):
+                lines.append(f"# TYPE {metric} counter")
+                for (endpoint, persona), s in items:
+                    lines.append(f"{metric}{{{labels(endpoint, persona)}}} {getattr(s, attr)}")
+
+            lines.append("# TYPE persona_generate_finish_reason_total counter")
+            for (endpoint, persona), s in items:
+                for reason, count in s.finish_reasons.items():
+                    reason_labels = labels(endpoint, persona, f',reason="{reason}"')
+                    lines.append(f"persona_generate_finish_reason_total{{{reason_labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def registrar_cache(self, name, stats):
+        """Registra os contadores de um cache do processo ('stats' é chamada a cada leitura)."""
+        with self._lock:
+            self._caches[name] = stats
+
+    def caches(self):
+        """Contadores atuais de cada cache registrado (hits, misses, evictions...)."""
+        with self._lock:
+            caches = dict(self._caches)
+        return {name: stats() for name, stats in caches.items()}
+
+    def limpar(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# Registro único do processo
+registry = MetricsRegistry()
+
+
+class CallRecord:
+    """Acompanha uma chamada em andamento até ela terminar (com ou sem erro)."""
+
+    def __init__(self, endpoint, persona, retries=0, stream=False, metrics=None):
+        self.metrics = metrics or registry
+        self.endpoint = endpoint
+        self.persona = persona or "-"
+        self.retries = retries
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.usage = None
+        self.finish_reason = None
+        self.finished = False
+
+    def registrar_chunk(self, chunk):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        if getattr(chunk, "usage_metadata", None):
+            self.usage = chunk.usage_metadata
+        try:
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                self.finish_reason = chunk.candidates[0].finish_reason.name
+        except Exception:
+            pass
+
+    def finalizar(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        end = time.perf_counter()
+        self.metrics.registrar({
+            "ts": time.time(),
+            "endpoint": self.endpoint,
+            "persona": self.persona,
+            "stream": self.stream,
+            "wall_time_s": end - self.start,
+            "ttft_s": (self.first_token_at - self.start) if self.first_token_at else None,
+            "prompt_tokens": getattr(self.usage, "prompt_token_count", None),
+            "candidate_tokens": getattr(self.usage, "candidates_token_count", None),
+            "finish_reason": self.finish_reason,
+            "retries": self.retries,
+            "error": f"{error.__class__.__name__}: {error}" if error else None,
+        })
+
+
+def _stream_instrumentado(responses, call):
+    try:
+        for chunk in responses:
+            call.registrar_chunk(chunk)
+            yield chunk
+    except Exception as e:
+        call.finalizar(error=e)
+        raise
+    finally:
+        # Também fecha o registro se quem consome o stream parar no meio
+        call.finalizar()
+
+
+def generate_content_instrumentado(model, contents, endpoint, persona=None, retries=0, stream=False, **kwargs):
+    """
+    Chama model.generate_content registrando as métricas da chamada.
+    Com stream=True devolve um iterador que registra o TTFT no primeiro chunk.
+    """
+    call = CallRecord(endpoint, persona, retries=retries, stream=stream)
+    try:
+        result = model.generate_content(contents, stream=stream, **kwargs)
+    except Exception as e:
+        call.finalizar(error=e)
+        raise
+
+    if stream:
+        return _stream_instrumentado(result, call)
+
+    call.registrar_chunk(result)
+    call.finalizar()
+    return result
+
+
+async def _stream_async_instrumentado(responses, call):
+    try:
+        async for chunk in responses:
+            call.registrar_chunk(chunk)
+            yield chunk
+    except Exception as e:
+        call.finalizar(error=e)
+        raise
+    finally:
+        call.finalizar()
+
+
+async def generate_content_async_instrumentado(model, contents, endpoint, persona=None, retries=0, stream=False, **kwargs):
+    """Versão assíncrona (generate_content_async) do generate_content_instrumentado."""
+    call = CallRecord(endpoint, persona, retries=retries, stream=stream)
+    try:
+        if stream:
+            result = await model.generate_content_async(contents, stream=True, **kwargs)
+        else:
+            result = await model.generate_content_async(contents, **kwargs)
+    except Exception as e:
+        call.finalizar(error=e)
+        raise
+
+    if stream:
+        return _stream_async_instrumentado(result, call)
+
+    call.registrar_chunk(result)
+    call.finalizar()
+    return result
+
+
+# --- EXPORTAÇÃO PROMETHEUS (OPCIONAL) ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        payload = registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def iniciar_servidor_metricas(port=9464, host="0.0.0.0"):
+    """Sobe (uma vez por processo) um endpoint /metrics em uma thread de fundo."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+        return _server
@@ -0,0 +1,86 @@
+import logging
+
+from chat_history import HistoricoSessao, HistoryManager, JanelaMensagens, TranscriptStore
+
+
+def conversa(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": "word " * 40} for i in range(n)]
+
+
+def test_falha_do_resumo_nao_descarta_turnos():
+    def falha(summary, messages):
+        raise RuntimeError("endpoint indisponível")
+
+    history = HistoryManager(token_budget=50, keep_last_turns=6)
+    messages = conversa(21)
+
+    contents = history.build_contents(messages, summarizer=falha)
+    # O pedido fica dentro da janela recente, mas nada é dado como resumido
+    assert len(contents) == 13
+    assert history.summarized_count == 0
+
+    resumidas = []
+    history.build_contents(messages, summarizer=lambda summary, msgs: resumidas.extend(msgs) or "resumo")
+    # No turno seguinte, as mensagens que ficaram de fora entram no resumo
+    assert resumidas == messages[:8]
+    assert history.summarized_count == 8
+
+
+def test_historico_no_servico_segue_resumindo_depois_do_buffer_cheio():
+    def resumir(summary, messages):
+        return f"{summary} +{len(messages)}"
+
+    # No app, o HistoryManager recebe o próprio HistoricoSessao; o serviço recebe
+    # só o buffer (dicts) e a posição da primeira mensagem
+    messages = HistoricoSessao(capacity=16)
+    local = HistoryManager(token_budget=200, keep_last_turns=3, summary_step=2)
+    servico = HistoryManager(token_budget=200, keep_last_turns=3, summary_step=2)
+
+    for turn in range(60):
+        messages.append({"role": "user", "content": f"pergunta {turn} " + "word " * 30})
+        esperado = local.build_contents(messages, summarizer=resumir)
+        janela = JanelaMensagens(messages.dicts(), primeiro=messages.primeiro)
+        assert servico.build_contents(janela, summarizer=resumir) == esperado
+        messages.append({"role": "assistant", "content": f"resposta {turn} " + "word " * 30})
+
+    assert messages.primeiro > 0
+    assert servico.summarized_count == local.summarized_count > messages.primeiro
+    assert servico.summary == local.summary
+
+
+def test_turnos_que_sairam_do_buffer_sem_resumo_vem_do_transcript():
+    resumidas = []
+
+    def resumir(summary, messages):
+        if len(resumidas) == 0 and turno < 20:
+            raise RuntimeError("endpoint indisponível")
+        resumidas.extend(msg["content"] for msg in messages)
+        return "resumo"
+
+    messages = HistoricoSessao(capacity=16, transcript=TranscriptStore(":memory:"), session_id="s")
+    history = HistoryManager(token_budget=10_000, keep_last_turns=3, summary_step=2)
+    for turno in range(30):
+        messages.append({"role": "user", "content": f"pergunta {turno}"})
+        history.build_contents(messages, summarizer=resumir)
+        messages.append({"role": "assistant", "content": f"resposta {turno}"})
+
+    # Com o resumo falhando, as primeiras mensagens saíram do buffer; nenhuma se perde
+    assert messages.primeiro > 0
+    todas = [f"{tipo} {turno}" for turno in range(30) for tipo in ("pergunta", "resposta")]
+    assert resumidas == todas[:history.summarized_count]
+
+
+def test_turnos_perdidos_sem_transcript_geram_aviso(caplog):
+    def falha(summary, messages):
+        raise RuntimeError("endpoint indisponível")
+
+    messages = HistoricoSessao(capacity=16)
+    history = HistoryManager(token_budget=10_000, keep_last_turns=3, summary_step=2)
+    for turno in range(10):
+        messages.append({"role": "user", "content": f"pergunta {turno}"})
+        with caplog.at_level(logging.WARNING):
+            history.build_contents(messages, summarizer=falha)
+        messages.append({"role": "assistant", "content": f"resposta {turno}"})
+
+    assert 0 < history.summarized_count <= messages.primeiro
+    assert "saíram do buffer sem entrar no resumo" in caplog.text
@@ -0,0 +1,92 @@
+import json
+
+import pandas as pd
+
+import fine_tuning_dataset as ftd
+import pytest
+
+from compact_dataset import (carregar_compacto, completar_pessoas, montar_compacto, normalizar_espacos,
+                             salvar_compacto)
+from export_fine_tuning import compactar, dividir_pessoas, exportar_jsonl, nome_arquivo, pasta_compacta
+from cluster_profiles import CLUSTER_PROFILES, CLUSTER_NUMBERS
+
+
+def dataset_exemplo():
+    return pd.DataFrame({
+        "Kmeans_pca": [CLUSTER_NUMBERS["Security_Seeker"]] * 2,
+        "person": ["p1", "p2"],
+        "Q_label": ["Q1", "Q20"],
+        "Question": ["How do you see risk?", 'Invest "now"?'],
+        "answer": pd.Series([5, 1500], dtype=object),
+        "expanded_answer": ["5 shows high affinity for this characteristic.", "Invested US$1500, ok"],
+    })
+
+
+def test_write_jsonl_file_sai_do_formato_compacto(tmp_path):
+    dataset = dataset_exemplo()
+    profile = normalizar_espacos(CLUSTER_PROFILES["Security_Seeker"])
+    ftd.write_jsonl_file(CLUSTER_PROFILES["Security_Seeker"], dataset, tmp_path / "new.jsonl")
+    ftd.write_jsonl_file_iterrows(profile, dataset, tmp_path / "old.jsonl")
+    assert (tmp_path / "new.jsonl").read_bytes() == (tmp_path / "old.jsonl").read_bytes()
+
+
+def test_jsonl_exportado_do_compacto_gravado(tmp_path):
+    profiles, records = montar_compacto(dataset_exemplo())
+    salvar_compacto(profiles, records, tmp_path / "compact_validation")
+    manifest = exportar_jsonl(str(tmp_path), str(tmp_path / "json"), clusters=["Security_Seeker"], max_workers=1)
+
+    file_name = nome_arquivo("validation", "Security_Seeker")
+    assert [entry["rows"] for entry in manifest["files"]] == [2]
+    lines = [json.loads(line) for line in open(tmp_path / "json" / file_name, encoding="utf-8")]
+    assert lines[1]["contents"][0]["parts"][0]["text"].endswith('\n\nQuestion: Invest "now"?')
+    assert lines[1]["contents"][1]["parts"][0]["text"] == "Invested US$1500, ok"
+    assert len(carregar_compacto(tmp_path / "compact_validation")[1]) == 2
+
+
+def dataset_pessoas(people, cluster="Security_Seeker"):
+    rows = []
+    for i, person in enumerate(people):
+        for q in ("Q1", "Q2"):
+            # Ordem das perguntas varia por pessoa, como na planilha
+            rows.append({"Kmeans_pca": CLUSTER_NUMBERS[cluster], "person": person, "Q_label": q,
+                         "Question": f"Question {q}?", "answer": str(1 + i % 6),
+                         "expanded_answer": f"{1 + i % 6} for {q}"})
+        if i % 2:
+            rows[-2:] = rows[-2:][::-1]
+    return pd.DataFrame(rows)
+
+
+def test_completar_pessoas_de_registros_importados():
+    dataset = dataset_pessoas(["p0", "p1", "p2", "p3"])
+    _, records = montar_compacto(dataset[dataset["person"].isin(["p1", "p3"])])
+    imported = records.assign(person=pd.NA, answer=pd.NA)
+
+    completed = completar_pessoas(imported, dataset)
+    assert completed["person"].tolist() == ["p1", "p1", "p3", "p3"]
+    assert completed["answer"].tolist() == records["answer"].tolist()
+
+    with pytest.raises(ValueError):
+        # Pessoa com parte das respostas: o bloco não fecha
+        completar_pessoas(imported.iloc[:3], dataset)
+
+
+def test_divisao_guardada_prevalece_sobre_o_hash(tmp_path):
+    people = [f"p{i}" for i in range(40)]
+    train, validation = dividir_pessoas(people, seed=1)
+    # Referência: a divisão ao contrário, só para as 20 primeiras pessoas
+    anteriores = {p: "validation" if p in train else "train" for p in people[:20]}
+    new_train, new_validation = dividir_pessoas(people, seed=1, anteriores=anteriores)
+    assert {p for p in people[:20] if p in new_train} == {p for p in people[:20] if p in validation}
+    assert {p for p in people[20:] if p in new_train} == {p for p in people[20:] if p in train}
+
+    reference = tmp_path / "dados"
+    dataset = dataset_pessoas(people[:20])
+    for split, members in (("train", new_train), ("validation", new_validation)):
+        salvar_compacto(*montar_compacto(dataset[dataset["person"].isin(members)]), pasta_compacta(split, reference))
+
+    with pytest.raises(FileExistsError):
+        compactar(dataset_pessoas(people), reference, reference_dir=reference)
+    export = tmp_path / "export"
+    assert compactar(dataset_pessoas(people), export, seed=1, reference_dir=reference) == 20
+    _, exported = carregar_compacto(pasta_compacta("validation", export))
+    assert set(exported["person"]) == new_validation
@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+import evaluate_endpoints
+from evaluate_endpoints import Metricas, avaliar
+from survey import carregar_perguntas
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_mae_separado_por_tipo_de_pergunta():
+    metrics = Metricas()
+    metrics.registrar("A", "Q1", "scale", 5, 3, 0.1)
+    metrics.registrar("A", "Q20", "monetary", 1000, 1500, 0.1)
+    resumo = metrics.resumo(("A", "*"))
+    assert resumo["mae_scale"] == 2
+    assert resumo["mae_monetary"] == 500
+    assert metrics.resumo(("*", "Q1"))["mae_monetary"] is None
+
+
+class BackendFixo:
+    def generate(self, endpoint_path, contents):
+        return "5"
+
+
+def test_erro_ao_pontuar_nao_some(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    question = carregar_perguntas()[0]
+    path = tmp_path / "validation_cluster_security_seeker_gemini.jsonl"
+    record = {"contents": [
+        {"role": "user", "parts": [{"text": f"Profile\n\nQuestion: {question['Question']}"}]},
+        {"role": "model", "parts": [{"text": "5 indicates a clear tendency."}]},
+    ]}
+    path.write_text(json.dumps(record) + "\n", encoding="utf-8")
+
+    metrics, _ = avaliar([str(path)], BackendFixo(), workers=1, allow_missing_endpoints=True)
+    assert metrics.resumo(("Security_Seeker", "*"))["accuracy"] == 1
+
+    def quebrar(question_type, text):
+        raise KeyError(question_type)
+
+    monkeypatch.setattr(evaluate_endpoints, "extrair_resposta", quebrar)
+    with pytest.raises(KeyError):
+        avaliar([str(path)], BackendFixo(), workers=1, allow_missing_endpoints=True)
@@ -0,0 +1,35 @@
+import pandas as pd
+
+import fine_tuning_dataset as ftd
+
+
+def test_faixas_iguais_as_do_notebook():
+    rows = []
+    for question_id, (_, max_value, _, _) in ftd.MONETARY_BUCKETS.items():
+        edges = {99, 100, 299, 300, 499, 500, 599, 600, 700, 701, 899, 900, 999, 1499, 1800, 1999}
+        for value in sorted(set(range(0, max_value + 1, 50)) | {v for v in edges if v <= max_value}):
+            rows.append((question_id, value))
+    rows += [(question_id, value) for question_id in ("Q1", "Q27") for value in range(1, 7)]
+    dataset = pd.DataFrame(rows, columns=["Q_label", "answer"]).astype({"answer": object})
+
+    expanded = ftd.expandir_respostas(dataset)
+    reference = ftd.expandir_respostas_apply(dataset)
+    for (question_id, value), new, old in zip(rows, expanded, reference):
+        assert ftd.faixa_da_resposta(question_id, new) is not None
+        assert ftd.faixa_da_resposta(question_id, new) == ftd.faixa_da_resposta(question_id, old), (question_id, value)
+        if question_id in ftd.MONETARY_BUCKETS:
+            assert new.split(",")[0] == old.split(",")[0] == f"{ftd.MONETARY_BUCKETS[question_id][0]} US${value}"
+
+
+def test_q20_usa_valores_exatos_do_notebook():
+    dataset = pd.DataFrame({"Q_label": ["Q20"] * 3, "answer": pd.Series([1500, 1800, 2000], dtype=object)})
+    buckets = [ftd.faixa_da_resposta("Q20", text) for text in ftd.expandir_respostas(dataset)]
+    # 1800 não está em nenhuma lista do notebook e cai em "fully invest", como 2000
+    assert buckets == [3, 4, 4]
+
+
+def test_fora_da_escala_vira_none():
+    dataset = pd.DataFrame({"Q_label": ["Q1", "Q20", "Q24"], "answer": pd.Series([7, 2500, "texto"], dtype=object)})
+    expanded = ftd.expandir_respostas(dataset)
+    assert expanded.isna().tolist() == ftd.expandir_respostas_apply(dataset).isna().tolist() == [True, True, False]
+    assert expanded.iloc[2] == "texto"
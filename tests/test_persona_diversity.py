@@ -0,0 +1,39 @@
+import numpy as np
+
+import persona_diversity
+from persona_diversity import DiversityIndex, HashingTfidfEmbedder
+
+WORDS = ("family career startup budget travel savings deadline office market health "
+         "learning weekend manager project stability team garden music soccer cooking").split()
+
+
+def personas(n, cluster="Security_Seeker", seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"Cluster": cluster, "name": f"p{seed}-{i}",
+             "narrative_persona": " ".join(rng.choice(WORDS, size=30))} for i in range(n)]
+
+
+def test_idf_fica_fixo_depois_de_carregar(monkeypatch):
+    monkeypatch.setattr(persona_diversity, "IDF_MIN_DOCS", 10)
+    index = DiversityIndex(HashingTfidfEmbedder(), threshold=0.99)
+    index.carregar(personas(20))
+    assert index.idf_fixo
+    doc_freq, stored = index.embedder.doc_freq.copy(), index.matriz("Security_Seeker").copy()
+
+    index.avaliar_lote(personas(5, seed=1))
+    # O IDF não muda, então os vetores antigos continuam comparáveis com os novos
+    np.testing.assert_array_equal(index.embedder.doc_freq, doc_freq)
+    np.testing.assert_array_equal(index.matriz("Security_Seeker")[:20], stored)
+
+
+def test_indice_pequeno_e_reembedado_quando_o_idf_muda():
+    index = DiversityIndex(HashingTfidfEmbedder(), threshold=0.99)
+    batches = [personas(3, seed=s) for s in range(3)]
+    for batch in batches:
+        for persona in batch:
+            index.avaliar(persona)
+    assert not index.idf_fixo
+
+    # Todos os vetores guardados estão no IDF atual
+    texts = [p["narrative_persona"] for batch in batches for p in batch]
+    np.testing.assert_allclose(index.matriz("Security_Seeker"), index.embedder.embed(texts), atol=1e-6)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+api_exceptions = pytest.importorskip("google.api_core.exceptions")
+
+import persona_prompts
+from persona_prompts import ContextCache, PromptCompiler, PromptPersona
+
+MODEL = "gemini-2.0-flash-001"
+
+
+class PoolFalso:
+    def get(self, endpoint_path, system_instruction, persona_key=None):
+        return ("local", endpoint_path)
+
+
+class CacheFalso(ContextCache):
+    def __init__(self, erros=(), atraso=0.0):
+        super().__init__(pool=PoolFalso(), min_tokens=0)
+        self.erros = list(erros)
+        self.atraso = atraso
+        self.criados = 0
+
+    def _criar(self, model_name, prompt):
+        time.sleep(self.atraso)
+        if self.erros:
+            raise self.erros.pop(0)
+        self.criados += 1
+        return ("servidor", model_name)
+
+
+def prompt():
+    return PromptPersona("p1", "You ARE the persona.")
+
+
+def test_compilar_usa_o_id_da_persona_sem_hash(monkeypatch):
+    monkeypatch.setattr(persona_prompts, "id_persona", lambda persona: pytest.fail("não deveria calcular o hash"))
+    compiler = PromptCompiler(lambda persona: f"You ARE {persona['name']}.")
+    first = compiler.compilar({"id": "abc", "name": "Ana"})
+    assert compiler.compilar({"id": "abc", "name": "Ana"}) is first
+    assert first.persona_id == "abc"
+
+
+def test_erro_transitorio_nao_desliga_o_cache_da_persona(monkeypatch):
+    monkeypatch.setattr(persona_prompts, "CONTEXT_CACHE_RETRY_SECONDS", 0)
+    cache = CacheFalso(erros=[api_exceptions.ServiceUnavailable("503")])
+    assert cache.modelo(MODEL, prompt()) == ("local", MODEL)
+    assert cache.modelo(MODEL, prompt()) == ("servidor", MODEL)
+    assert cache.stats()["unsupported"] == 0
+
+
+def test_modelo_sem_suporte_fica_no_prompt_local():
+    cache = CacheFalso(erros=[api_exceptions.InvalidArgument("sem cache de contexto")])
+    assert cache.modelo(MODEL, prompt()) == ("local", MODEL)
+    assert cache.modelo(MODEL, prompt()) == ("local", MODEL)
+    assert cache.stats()["unsupported"] == 1
+
+
+def test_primeiros_turnos_simultaneos_criam_um_unico_cached_content():
+    cache = CacheFalso(atraso=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.modelo(MODEL, prompt()))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.criados == 1
+    assert results == [("servidor", MODEL)] * 8
@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("google.api_core")
+
+from persona_service import RequisicaoInvalida, _ler_corpo
+
+
+def ler(body):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return asyncio.run(_ler_corpo(receive))
+
+
+def test_corpo_json_objeto():
+    assert ler(json.dumps({"persona_id": "7"}).encode()) == {"persona_id": "7"}
+    assert ler(b"") == {}
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'"texto"', b"3", b"null", b"{"])
+def test_corpo_que_nao_e_objeto_vira_400(body):
+    with pytest.raises(RequisicaoInvalida) as e:
+        ler(body)
+    assert e.value.status == 400
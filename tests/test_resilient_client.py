@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("google.api_core")
+
+from resilient_client import ResilientClient
+
+
+class ModeloFalso:
+    def __init__(self):
+        self.falhar = False
+        self.chamadas = 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.chamadas += 1
+        if self.falhar:
+            raise RuntimeError("endpoint fora do ar")
+        return iter(["olá"]) if stream else "olá"
+
+
+class PoolFalso:
+    def __init__(self, **models):
+        self.models = models
+
+    def get(self, endpoint_path, system_instruction, persona_key=None):
+        return self.models[endpoint_path]
+
+    def stats(self):
+        return {"size": len(self.models)}
+
+
+def criar_cliente(pool):
+    return ResilientClient(fallback_model="fb", max_retries=0, hedge=False, failure_threshold=1,
+                           reset_timeout_s=0.05, pool=pool, max_workers=2)
+
+
+def test_fallback_em_half_open_nao_fica_preso_quando_o_endpoint_responde():
+    pool = PoolFalso(ep=ModeloFalso(), fb=ModeloFalso())
+    client = criar_cliente(pool)
+
+    # Abre o circuito do fallback (cluster sem endpoint: só o fallback é tentado)
+    pool.models["fb"].falhar = True
+    with pytest.raises(RuntimeError):
+        client.generate(None, "persona", "oi")
+    assert client.estado()["fb"] == "open"
+
+    # Passado o reset_timeout, o endpoint da persona responde sem precisar do fallback
+    time.sleep(0.06)
+    pool.models["fb"].falhar = False
+    assert client.generate("ep", "persona", "oi") == ("ep", "olá")
+    assert pool.models["fb"].chamadas == 1
+
+    # O fallback continua disponível: a chamada de teste do half-open passa e fecha o circuito
+    assert client.generate(None, "persona", "oi") == ("fb", "olá")
+    assert client.estado()["fb"] == "closed"
+
+
+class ModeloLento:
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        await asyncio.sleep(10)
+
+
+def test_cancelar_a_chamada_de_teste_libera_o_half_open():
+    client = criar_cliente(PoolFalso(fb=ModeloFalso(), lento=ModeloLento()))
+    client.breaker("lento").falha()
+    time.sleep(0.06)
+
+    async def cancelar_durante_o_teste():
+        task = asyncio.ensure_future(client.generate_async("lento", "persona", "oi"))
+        await asyncio.sleep(0.05)
+        assert client.estado()["lento"] == "half-open"
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelar_durante_o_teste())
+    # A chamada cancelada conta como falha: o circuito volta a abrir e, passado o
+    # reset_timeout, aceita uma nova chamada de teste
+    assert client.estado()["lento"] == "open"
+    time.sleep(0.06)
+    assert client.breaker("lento").permitir()
+
+
+class ModeloTravado:
+    def __init__(self):
+        self.chamadas = 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.chamadas += 1
+        time.sleep(0.5)
+        return "olá"
+
+
+def test_deadline_vale_para_todas_as_tentativas():
+    modelo = ModeloTravado()
+    client = ResilientClient(fallback_model="fb", deadline_s=0.2, max_retries=3, base_delay_s=0.0, hedge=False,
+                             pool=PoolFalso(fb=modelo), max_workers=4)
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.generate(None, "persona", "oi")
+    # Antes cada nova tentativa ganhava outro prazo inteiro (4 x 0.2s)
+    assert time.monotonic() - start < 0.4
+    assert modelo.chamadas == 1
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+
+# Quantidade máxima de modelos mantidos em memória por processo
+DEFAULT_POOL_SIZE = 32
+
+
+def criar_generative_model(model_name, system_instruction=None):
+    """
+    GenerativeModel do SDK. O import fica aqui dentro porque o SDK do Vertex AI
+    leva segundos para carregar e quem só monta telas (seleção de persona) não precisa dele.
+    """
+    from vertexai.generative_models import GenerativeModel
+
+    return GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+
+
+def chave_persona(system_instruction: str) -> str:
+    """Gera uma chave estável para a persona a partir da system instruction."""
+    return hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:16]
+
+
+class ModelPool:
+    """
+    Pool de GenerativeModel compartilhado entre sessões e reruns do Streamlit.
+
+    Os modelos são indexados por (caminho do endpoint, persona). Quando o pool
+    atinge 'max_size', o modelo usado há mais tempo é descartado (LRU).
+    Todas as operações são protegidas por um lock, pois o Streamlit atende
+    cada sessão em uma thread diferente.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, factory=criar_generative_model):
+        self.max_size = max_size
+        self._factory = factory
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, endpoint_path: str, system_instruction: str, persona_key: str = None):
+        """Retorna o modelo do pool, criando-o apenas se ainda não existir."""
+        key = (endpoint_path, persona_key or chave_persona(system_instruction))
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+
+            self.misses += 1
+            model = self._factory(
+                model_name=endpoint_path,
+                system_instruction=system_instruction
+            )
+            self._models[key] = model
+
+            if len(self._models) > self.max_size:
+                old_key, _ = self._models.popitem(last=False)
+                self.evictions += 1
+                logging.info(f"Pool de modelos cheio, removendo {old_key}.")
+
+            return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        """Retorna os contadores de uso do pool."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+
+# Instância única por processo, reutilizada por todas as sessões
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool(max_size=DEFAULT_POOL_SIZE) -> ModelPool:
+    """Retorna o pool de modelos do processo (criado na primeira chamada)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool(max_size=max_size)
+        return _pool